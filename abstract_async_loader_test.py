@@ -0,0 +1,176 @@
+import asyncio
+import time
+from abc import abstractmethod
+from abstract_loader_test import AbstractLoaderTest, QueryTimeoutError
+from load_stats import LoadStats
+
+
+class AbstractAsyncLoaderTest(AbstractLoaderTest):
+    """
+    Variant of AbstractLoaderTest driven by a single asyncio event loop instead of a thread pool.
+    Subclasses implement `async execute_query`, and create their async connection pools in `setup`,
+    which runs inside the event loop before the first test.
+    """
+
+    def __init__(self, tps, duration, timeout, max_concurrency=None, **kwargs):
+        """
+        :param max_concurrency: Maximum number of operations in flight (defaults to pool_size)
+        """
+        super().__init__(tps, duration, timeout, **kwargs)
+        self.max_concurrency = max_concurrency or self.pool_size
+        self.loop = asyncio.new_event_loop()
+        self._setup_done = False
+
+    @abstractmethod
+    async def execute_query(self):
+        """
+        Abstract coroutine to execute the test operation.
+        """
+        pass
+
+    async def setup(self):
+        """Creates resources bound to the event loop, such as async connection pools."""
+        pass
+
+    async def teardown(self):
+        """Releases the resources created in setup."""
+        pass
+
+    def run_load(self):
+        run_until_complete = self.loop.run_until_complete
+        if self.profiler is not None:
+            # everything runs on the event loop's thread, so one profile covers the whole harness
+            run_until_complete = self.profiler.wrap(run_until_complete)
+        return run_until_complete(self._run_load_async())
+
+    def warmup(self):
+        self.loop.run_until_complete(self._warmup_async())
+
+    async def _warmup_async(self):
+        if not self._setup_done:
+            await self.setup()
+            self._setup_done = True
+        if self.connection_pool is not None:
+            await self.connection_pool.warmup()
+
+    def _record_pool_wait(self, seconds):
+        if self._accepting_results:
+            self._async_stats.pool_wait.record(seconds)
+
+    def close_all(self):
+        if self._setup_done:
+            self.loop.run_until_complete(self.teardown())
+            self._setup_done = False
+        self.loop.close()
+
+    async def _run_load_async(self):
+        await self._warmup_async()
+        self._start_run()
+        self._async_stats = LoadStats()
+        self._worker_stats.append(self._async_stats)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self.schedule == "burst":
+            await self._run_burst_async()
+        else:
+            await self._run_open_loop_async()
+
+        unfinished = 0
+        if self._pending:
+            done, not_done = await asyncio.wait(set(self._pending), timeout=self.timeout)
+            self._accepting_results = False
+            for task in not_done:
+                task.cancel()
+            unfinished = len(not_done)
+        self._accepting_results = False
+        self._collect_stats(unfinished)
+        return self.stats
+
+    def _submit_async(self, scheduled, query=None):
+        task = self.loop.create_task(self._execute_scheduled_async(scheduled, query))
+        self.total_queries += 1
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+
+    async def _run_burst_async(self):
+        for i in range(self.duration):
+            batch_start = time.perf_counter()
+            batch = [self._submit_async(batch_start) for _ in range(self.tps)]
+            await asyncio.wait(batch, timeout=self.timeout)
+
+            batch_elapsed = time.perf_counter() - batch_start
+            if batch_elapsed < 1.0:
+                await asyncio.sleep(1.0 - batch_elapsed)
+
+    async def _run_open_loop_async(self):
+        for offset, query in self._arrivals():
+            scheduled = self._test_start + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._submit_async(scheduled, query)
+
+    async def _execute_scheduled_async(self, scheduled, query=None):
+        if self._is_write():
+            return await self._execute_write_async(scheduled)
+        async with self._semaphore:
+            late = self._is_late(scheduled)
+            if query is None:
+                query = self._draw_queries()
+            search_filter = self._draw_filter()
+            discarded = False
+            result = None
+            error = None
+            cache_hit = None
+            started = time.perf_counter()
+            try:
+                cached = self._cache_lookup(query, search_filter)
+                if cached is None:
+                    result = await self._invoke(query, search_filter)
+                    self._cache_store(query, search_filter, result)
+                else:
+                    cache_hit, result = cached
+                outcome = "success"
+            except asyncio.CancelledError:
+                raise
+            except QueryTimeoutError as e:
+                outcome = "timeouts"
+                discarded = e.connection_discarded
+                error = type(e).__name__
+            except Exception as e:
+                outcome = "errors"
+                error = type(e).__name__
+            completed = time.perf_counter()
+        if self._accepting_results:
+            stats = self._async_stats
+            final_outcome = self._record_outcome(stats, scheduled, started, completed, outcome, late, discarded,
+                                                 search_filter, cache_hit)
+            received = self._record_search(stats, query, result, outcome, search_filter, cache_hit)
+            if self.result_sink is not None:
+                rows = None if result is None else self._result_rows(query, result)
+                self._sink_result("search", query, scheduled, started, completed, final_outcome, error, rows, late,
+                                  received)
+
+    async def _execute_write_async(self, scheduled):
+        async with self._semaphore:
+            late = self._is_late(scheduled)
+            rows = self.write_rows.next_batch()
+            error = None
+            started = time.perf_counter()
+            try:
+                await self.execute_write(rows)
+                outcome = "success"
+            except asyncio.CancelledError:
+                raise
+            except QueryTimeoutError as e:
+                outcome = "timeouts"
+                error = type(e).__name__
+            except Exception as e:
+                outcome = "errors"
+                error = type(e).__name__
+            completed = time.perf_counter()
+        if self._accepting_results:
+            final_outcome = self._record_write(self._async_stats, scheduled, started, completed, outcome, late,
+                                               len(rows))
+            if self.result_sink is not None:
+                self._sink_result("write", None, scheduled, started, completed, final_outcome, error, len(rows), late)
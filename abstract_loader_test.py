@@ -1,75 +1,790 @@
+import math
 import time
+import array
 import threading
 import logging
 import random
 import string
 import datetime
+import itertools
+from collections.abc import Mapping
 from abc import ABC, abstractmethod
 from concurrent.futures import ThreadPoolExecutor, wait
+from load_stats import LoadStats
+from query_set import EmbeddingCache, QuerySet
+from ground_truth import GroundTruth
+from result_sink import ResultSink
+from metrics_server import MetricsServer
+from write_workload import SyntheticRows
+from run_history import record_run
+from client_profiler import CpuMonitor, ClientProfiler
+from trace_replay import QueryTrace, format_timestamp
+from filtered_workload import make_filter, filter_label, attribute_values
+from query_cache import QueryCache
+
+
+class QueryTimeoutError(Exception):
+    """
+    Raised by execute_query when the driver or the database aborted a query because it exceeded the timeout.
+    """
+
+    def __init__(self, message, connection_discarded=False):
+        """
+        :param connection_discarded: True if the connection could not be reused and was dropped from its pool
+        """
+        super().__init__(message)
+        self.connection_discarded = connection_discarded
 
 
 class AbstractLoaderTest(ABC):
-    def __init__(self, tps, duration, timeout):
+    SCHEDULES = ("burst", "constant", "poisson", "trace")
+    VECTOR_BINDINGS = ("binary", "text")
+    # what the "binary" binding runs as in backends whose driver cannot send binary parameters, None if it can
+    BINARY_BINDING_FALLBACK = None
+    FETCH_MODES = ("ids", "distance", "text")
+
+    def __init__(self, tps, duration, timeout, schedule="burst", late_threshold=0.005, seed=None,
+                 query_file=None, query_order="rotate", embedding_cache_dir=".embedding_cache",
+                 ground_truth_dir=None, recall_k=4, distance_metric="cosine", search_params=None,
+                 vector_binding="binary", result_file=None, metrics_port=None, write_ratio=0.0, write_batch_size=100,
+                 history_db=None, run_label=None, profile=None, cpu_sample_interval=0.5, search_batch_size=1,
+                 trace_file=None, trace_speedup=1.0, trace_start=None, trace_end=None, trace_window=60,
+                 trace_shard=0, trace_shards=1, filter_selectivities=None, filter_attribute="bucket", query_cache=None,
+                 cache_threshold=0.95, cache_max_entries=10000, cache_max_bytes=64 * 1024 * 1024, cache_ttl=None,
+                 fetch_mode="text", pool_size=None):
         """
         :param tps: Number of operations per second
         :param duration: Test execution time in seconds
-        :param timeout: Timeout value (in seconds) for each batch
+        :param timeout: Timeout value (in seconds) for each batch, also enforced per query by the backends' drivers
+        :param schedule: "burst" fires tps operations at the top of each second,
+                         "constant" spaces them evenly and "poisson" uses exponential inter-arrival times
+                         ("trace", set by trace_file, replays the timing of a trace)
+        :param late_threshold: Seconds a send may lag behind its scheduled time before it is counted as late
+        :param seed: Random seed for the poisson schedule and the random query order
+        :param query_file: Optional file of queries (.txt, one per line, or .jsonl) to draw query vectors from
+        :param query_order: "rotate" or "random" order in which queries are drawn from query_file
+        :param embedding_cache_dir: Directory of the on-disk embedding cache
+        :param ground_truth_dir: Directory of a vector export of the searched table (see ground_truth.py);
+                                 with a query_file, recall@k of every query is measured against its exact top-k
+        :param recall_k: k of recall@k
+        :param distance_metric: "cosine", "l2" or "ip", the metric the backend's index searches by
+        :param search_params: Backend-specific search-time parameters, see apply_search_params
+        :param vector_binding: "binary" binds query vectors in the driver's native binary format,
+                               "text" as a vector literal parsed by the database, see encode_vector
+        :param result_file: Optional .jsonl or .parquet file receiving one record per operation (see ResultSink)
+        :param metrics_port: Optional port of a live OpenMetrics endpoint (see MetricsServer), 0 for any free port
+        :param write_ratio: Fraction of the scheduled operations that bulk-insert write_batch_size rows
+                            (see execute_write) instead of searching
+        :param write_batch_size: Rows inserted by each write operation
+        :param history_db: Optional SQLite file of the run history (see run_history.py); run_test saves every run
+        :param run_label: Label of the run in the history, grouping repeated runs of the same setup
+        :param profile: Optional profiler of the harness itself, "cprofile" or "sampling" (see ClientProfiler)
+        :param cpu_sample_interval: Seconds between two samples of the client's CPU use
+        :param search_batch_size: Query vectors searched per operation; above 1 every operation draws that many
+                                  queries and calls execute_batch (tps then counts calls, not vectors)
+        :param trace_file: Optional JSONL trace of timestamped queries (see QueryTrace) replayed instead of a schedule;
+                           the replay stops at the end of the trace or after duration seconds, whichever comes first,
+                           and tps only sizes the worker pool
+        :param trace_speedup: Replay speed-up factor of the trace's original inter-arrival times
+        :param trace_start: Optional timestamp of the trace (epoch seconds or ISO-8601) at which the replay starts
+        :param trace_end: Optional timestamp of the trace at which the replay stops
+        :param trace_window: Seconds of trace time per window of the per-window latency report
+        :param trace_shard: Share of the trace replayed by this tester when trace_shards load workers replay it
+                            together (set per worker by multiprocess_runner.py and distributed_runner.py)
+        :param trace_shards: Number of load workers replaying the trace; each replays every trace_shards-th query
+        :param filter_selectivities: Optional fractions of rows (e.g. [0.001, 0.01, 0.1, 0.5]) matched by the metadata
+                                     filters added to the searches, one filter per operation in rotation (1 searches
+                                     unfiltered); QPS, latency and recall are also reported per filter
+        :param filter_attribute: Attribute the filters test (see filtered_workload.py), "bucket" (range predicates)
+                                 or "category" (equality predicates)
+        :param query_cache: Optional client-side result cache in front of execute_query (see QueryCache), "exact"
+                            (same query text) or "semantic" (also query vectors within cache_threshold cosine
+                            similarity); hits skip the backend, and hit rate and hit vs miss latency are reported
+        :param cache_threshold: Minimum cosine similarity of a semantic cache hit
+        :param cache_max_entries: Maximum number of cached results
+        :param cache_max_bytes: Memory cap of the cache in approximate bytes
+        :param cache_ttl: Optional seconds after which a cached result expires
+        :param fetch_mode: Columns a search returns with each neighbour's id (see fetch_columns): "ids" only,
+                           "distance" or "text"; the bytes received are reported per query, so comparing modes
+                           separates the cost of the search from the cost of moving its payload
+        :param pool_size: Worker threads of the executor and connections of the backend's pool (defaults to tps * 2);
+                          size it from the expected concurrency (see concurrency_for) when tps is only an upper bound
         """
+        if trace_file:
+            schedule = "trace"
+            if query_file:
+                raise ValueError("trace_file replaces query_file, give only one of them")
+            if write_ratio:
+                raise ValueError("trace replay sends the trace's queries and no writes")
+        elif schedule == "trace":
+            raise ValueError("The trace schedule needs a trace_file")
+        if schedule not in self.SCHEDULES:
+            raise ValueError(f"Unknown schedule '{schedule}', expected one of {self.SCHEDULES}")
+        if vector_binding not in self.VECTOR_BINDINGS:
+            raise ValueError(f"Unknown vector binding '{vector_binding}', expected one of {self.VECTOR_BINDINGS}")
+        if fetch_mode not in self.FETCH_MODES:
+            raise ValueError(f"Unknown fetch mode '{fetch_mode}', expected one of {self.FETCH_MODES}")
         self.tps = tps
         self.duration = duration
         self.timeout = timeout
+        # fixed for the lifetime of the tester: saturation searches and sweeps change tps between runs
+        self.pool_size = pool_size or tps * 2
+        self.schedule = schedule
+        self.trace_file = trace_file
+        self.late_threshold = late_threshold
+        self.seed = seed
         self.total_queries = 0
         self.success_count = 0
         self.error_count = 0
+        self.late_count = 0
+        self.elapsed = None
+        self.stats = LoadStats()
         self.lock = threading.Lock()
+        self._local = threading.local()
+        self.search_params = dict(search_params or {})
+        self.search_params_version = 0
+        self.vector_binding = vector_binding
+        self.fetch_mode = fetch_mode
+        # query index (None for the WORD vector) -> (encoded vector, bytes on the wire)
+        self._encoded_vectors = {}
+        self._binding_sizes = None
+        self.result_sink = ResultSink(result_file) if result_file else None
+        self._run_number = 0
+        self._accepting_results = False
+        self._worker_stats = []
+        self._pending = set()
+        # InstrumentedPool of the backend, warmed up before every run
+        self.connection_pool = None
+        self.metrics_server = MetricsServer(self, metrics_port).start() if metrics_port is not None else None
+        if not 0.0 <= write_ratio <= 1.0:
+            raise ValueError(f"write_ratio must be between 0 and 1, got {write_ratio}")
+        self.write_ratio = write_ratio
+        self.write_batch_size = write_batch_size
+        self.filter_selectivities = list(filter_selectivities or [])
+        self.filter_attribute = filter_attribute
+        # SearchFilter (None for an unfiltered search) of every selectivity, used in rotation
+        self.search_filters = [make_filter(filter_attribute, s) for s in self.filter_selectivities]
+        self._filter_counter = itertools.count()
+        # emptied at the start of every run
+        self.query_cache = None
+        if query_cache:
+            self.query_cache = QueryCache(query_cache, cache_threshold, cache_max_entries, cache_max_bytes, cache_ttl)
+        self.set_search_batch_size(search_batch_size)
+        # SyntheticRows, created on the first run once the backend has embedded its query vectors
+        self.write_rows = None
+        self._write_random = random.Random(seed)
+        self.history_db = history_db
+        self.cpu_monitor = CpuMonitor(cpu_sample_interval)
+        self.profiler = ClientProfiler(profile) if profile else None
+        self.run_label = run_label
+        self.embedding_cache_dir = embedding_cache_dir
+        self.query_file = query_file
+        self.query_order = query_order
+        self.query_set = None
+        if query_file:
+            self.query_set = QuerySet.load(query_file, self.embed_batch, self.embedding_model(),
+                                           embedding_cache_dir, query_order, seed)
+        self.distance_metric = distance_metric
+        self.recall_k = recall_k
+        self.ground_truth = None
+        if ground_truth_dir and self.query_set is not None:
+            self.ground_truth = GroundTruth.load_or_compute(self.query_set, ground_truth_dir, recall_k, distance_metric)
+        # filter name -> GroundTruth restricted to the rows matching the filter
+        self.filter_ground_truth = {}
+        if self.ground_truth is not None:
+            for search_filter in self.search_filters:
+                if search_filter is not None:
+                    self.filter_ground_truth[search_filter.name] = GroundTruth.load_or_compute(
+                        self.query_set, ground_truth_dir, recall_k, distance_metric, search_filter)
+        self.trace = None
+        if trace_file:
+            self.trace = QueryTrace.load(trace_file, self.embed_batch, self.embedding_model(), embedding_cache_dir,
+                                         trace_speedup, trace_start, trace_end, trace_window, trace_shard,
+                                         trace_shards)
+            # the last send of the replay falls into its final second
+            self.duration = min(duration, int(self.trace.replay_seconds) + 1)
+
+    def set_search_batch_size(self, search_batch_size):
+        """
+        Sets the query vectors searched per operation, failing on the features that only send single searches.
+        Called by the constructor and by BatchSizeSweep between its runs.
+        """
+        if search_batch_size < 1:
+            raise ValueError(f"search_batch_size must be at least 1, got {search_batch_size}")
+        if search_batch_size != 1:
+            if self.trace_file:
+                raise ValueError("Trace replay sends the trace's queries one by one, search_batch_size must be 1")
+            if self.filter_selectivities:
+                raise ValueError("Filtered searches are sent one query vector at a time, search_batch_size must be 1")
+            if self.query_cache is not None:
+                raise ValueError("The query cache answers single searches, search_batch_size must be 1")
+        self.search_batch_size = search_batch_size
+
+    def embed_batch(self, texts):
+        """
+        Embeds a batch of texts with the backend's embedding model and returns one vector per text.
+        Backends override this (and embedding_model) to support query files and the embedding cache.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not provide an embedding model")
+
+    def embedding_model(self):
+        """Identifies the embedding model, and any option changing its output, in the embedding cache."""
+        return type(self).__name__
+
+    def embed_words(self, words):
+        """Embeds texts through the on-disk embedding cache; returns one float32 vector per text."""
+        matrix, rows = EmbeddingCache(self.embedding_cache_dir, self.embedding_model()).embed(words, self.embed_batch)
+        return [matrix[row] for row in rows]
 
     @abstractmethod
     def execute_query(self):
         """
         Abstract method to execute the test operation.
         This method can be overridden for non-database purposes as well.
+        When a query_file is given, it is called as execute_query(query) with the Query drawn for the operation.
+        In a filtered workload it is called as execute_query(query, search_filter) with the SearchFilter
+        (or None) to add to the search.
         """
         pass
 
+    def apply_search_params(self, params):
+        """
+        Sets the search-time parameters used by subsequent queries, e.g. {"hnsw.ef_search": 40} for pgvector,
+        {"target_accuracy": 90, "index": "hnsw"} for Oracle or {"ef": 64} for Milvus.
+        Backends apply session-level settings once per pooled connection, the first time it is used afterwards.
+        """
+        self.search_params = dict(params)
+        self.search_params_version += 1
+
+    def encode_vector(self, vector, binding):
+        """
+        Converts a query vector into the parameter bound to the search statement for the given binding.
+        Backends override this; the result is computed once per query and reused by encoded_vector.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not encode query vectors")
+
+    def encoded_vector(self, query=None):
+        """Returns the encoded vector of query (or of the WORD vector), encoding it on first use only."""
+        key = None if query is None else query.index
+        cached = self._encoded_vectors.get(key)
+        if cached is None:
+            vector = self.embedding_vector if query is None else query.vector
+            if self._binding_sizes is None:
+                self._binding_sizes = {b: payload_size(self.encode_vector(vector, b)) for b in self.VECTOR_BINDINGS}
+            encoded = self.encode_vector(vector, self.vector_binding)
+            cached = self._encoded_vectors[key] = (encoded, payload_size(encoded))
+        return cached[0]
+
+    def vector_bytes(self, query=None):
+        """Bytes of the encoded vector sent with query, 0 if the backend did not go through encoded_vector."""
+        cached = self._encoded_vectors.get(None if query is None else query.index)
+        return cached[1] if cached else 0
+
+    def execute_batch(self, queries):
+        """
+        Searches several query vectors in one call (or round trip) and returns one execute_query-style
+        result per query, in order. queries holds the drawn Query objects, or None for the WORD vector.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support batched searches")
+
+    def execute_write(self, rows):
+        """
+        Bulk-inserts a batch of WriteRow(id, text, vector) with the driver's bulk path,
+        used by the mixed read/write workload (write_ratio > 0).
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support writes")
+
+    def write_attributes(self, rows):
+        """
+        Filter attribute values (bucket, category) of a batch of WriteRows, computed the way bulk_loader.py
+        does, so that rows written during a filtered run match the filters like the loaded ones.
+        None when no filter is searched: the table may then lack the attribute columns.
+        """
+        if all(search_filter is None for search_filter in self.search_filters):
+            return None
+        return attribute_values([row.vector for row in rows])
+
+    def result_ids(self, result):
+        """
+        Extracts the ids of the returned neighbours from an execute_query result, nearest first.
+        By default the result is a list of rows whose first column is the id.
+        """
+        return [row[0] for row in result]
+
+    def result_rows(self, result):
+        """Number of rows (neighbours) in an execute_query result, recorded in the result file."""
+        return len(self.result_ids(result))
+
+    def result_bytes(self, result):
+        """Approximate payload bytes of an execute_query result as received from the backend."""
+        return result_payload_size(result)
+
+    def fetch_columns(self, id_column, distance, text):
+        """
+        Select list of a search in the fetch mode: the id, followed by the distance expression ("distance")
+        or the text column ("text"). Results keep the id in their first column whatever the mode.
+        """
+        if self.fetch_mode == "distance":
+            return f"{id_column}, {distance}"
+        if self.fetch_mode == "text":
+            return f"{id_column}, {text}"
+        return id_column
+
+    def iter_vectors(self, batch_size=1000):
+        """
+        Yields (ids, vectors) batches of the searched table, used to export it for ground-truth computation.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support exporting vectors")
+
+    def _next_query(self):
+        return None if self.query_set is None else self.query_set.next_query()
+
+    def _draw_queries(self):
+        """The query of one operation, or the list of search_batch_size queries of a batched operation."""
+        if self.search_batch_size == 1:
+            return self._next_query()
+        return [self._next_query() for _ in range(self.search_batch_size)]
+
+    def _draw_filter(self):
+        """The SearchFilter of the next operation of a filtered workload, None if unfiltered."""
+        if not self.search_filters:
+            return None
+        return self.search_filters[next(self._filter_counter) % len(self.search_filters)]
+
+    def _invoke(self, query, search_filter=None):
+        """
+        Calls execute_query, passing the drawn query if a query set is in use (and the filter in a filtered
+        workload), or execute_batch for a batch.
+        """
+        if isinstance(query, list):
+            return self.execute_batch(query)
+        if self.search_filters:
+            return self.execute_query(query, search_filter)
+        if query is None:
+            return self.execute_query()
+        return self.execute_query(query)
+
+    def _query_vector(self, query):
+        return self.embedding_vector if query is None else query.vector
+
+    def _cache_lookup(self, query, search_filter):
+        """Returns (hit kind, cached result) if the query cache answers the search, None if the backend must."""
+        if self.query_cache is None:
+            return None
+        return self.query_cache.lookup(query, self._query_vector(query), search_filter)
+
+    def _cache_store(self, query, search_filter, result):
+        if self.query_cache is not None:
+            self.query_cache.store(query, self._query_vector(query), result, search_filter)
+
+    def _record_search(self, stats, query, result, outcome, search_filter=None, cache_hit=None):
+        """
+        Counts the query vectors of a (possibly batched) search and records the recall of each.
+        :param cache_hit: "exact" or "semantic" if the query cache answered the search, which then sent nothing
+        :return: Result bytes received from the backend, None if nothing was
+        """
+        queries, results = (query, result) if isinstance(query, list) else ([query], [result])
+        if cache_hit is None:
+            stats.counters["vector_bytes"] += sum(self.vector_bytes(q) for q in queries)
+        if outcome != "success":
+            return None
+        stats.counters["queries"] += len(queries)
+        for q, r in zip(queries, results):
+            self._record_recall(stats, q, r, search_filter, cache_hit)
+        if cache_hit is not None:
+            return None
+        received = sum(self.result_bytes(r) for r in results)
+        stats.counters["result_bytes"] += received
+        stats.counters["fetched"] += len(queries)
+        return received
+
+    def _result_rows(self, query, result):
+        if isinstance(query, list):
+            return sum(self.result_rows(r) for r in result)
+        return self.result_rows(result)
+
+    def _record_recall(self, stats, query, result, search_filter=None, cache_hit=None):
+        if self.ground_truth is None or query is None:
+            return
+        ground_truth = self.ground_truth if search_filter is None else self.filter_ground_truth[search_filter.name]
+        recall = ground_truth.recall(query.index, self.result_ids(result))
+        if recall is not None:
+            stats.record_recall(recall)
+            if self.search_filters:
+                stats.record_filter_recall(filter_label(search_filter), _selectivity(search_filter), recall)
+            if self.query_cache is not None:
+                # a semantic hit returns the neighbours of another query, which shows in its recall
+                stats.record_cache_recall(cache_hit or "miss", recall)
+
     def run_test(self):
         """
         Executes tps operations per second (using execute_query) and evaluates the results within the timeout period.
         """
-        with ThreadPoolExecutor(max_workers=self.tps * 2) as executor:
-            for i in range(self.duration):
-                batch_futures = [executor.submit(self.execute_query) for _ in range(self.tps)]
-                batch_start = time.time()
-                done, not_done = wait(batch_futures, timeout=self.timeout)
-
-                for future in done:
-                    try:
-                        future.result()
-                        with self.lock:
-                            self.success_count += 1
-                    except Exception:
-                        with self.lock:
-                            self.error_count += 1
-
-                for future in not_done:
-                    with self.lock:
-                        self.error_count += 1
-                    future.cancel()
-
-                batch_elapsed = time.time() - batch_start
-                if batch_elapsed < 1.0:
-                    time.sleep(1.0 - batch_elapsed)
-                with self.lock:
-                    self.total_queries += self.tps
-
+        self.run_load()
         self.report_results()
+        if self.history_db:
+            record_run(self.history_db, self.stats, type(self).__name__, self.run_config(), self.run_label)
+
+    def run_config(self):
+        """Settings of the run stored in the run history; backends may add their own (table, index, ...)."""
+        return {
+            "tps": self.tps,
+            "duration": self.duration,
+            "timeout": self.timeout,
+            "pool_size": self.pool_size,
+            "schedule": self.schedule,
+            "seed": self.seed,
+            "query_file": self.query_file,
+            "query_order": self.query_order,
+            "recall_k": self.recall_k,
+            "distance_metric": self.distance_metric,
+            "search_params": self.search_params,
+            "vector_binding": self.vector_binding,
+            "fetch_mode": self.fetch_mode,
+            "write_ratio": self.write_ratio,
+            "write_batch_size": self.write_batch_size,
+            "search_batch_size": self.search_batch_size,
+            "trace_file": self.trace_file,
+            "trace_speedup": None if self.trace is None else self.trace.speedup,
+            "trace_start": None if self.trace is None else self.trace.first_timestamp,
+            "trace_shards": None if self.trace is None else self.trace.shards,
+            "filter_selectivities": self.filter_selectivities,
+            "filter_attribute": self.filter_attribute if self.filter_selectivities else None,
+            "query_cache": None if self.query_cache is None else self.query_cache.mode,
+            "cache_threshold": None if self.query_cache is None else self.query_cache.threshold,
+            "cache_max_entries": None if self.query_cache is None else self.query_cache.max_entries,
+            "cache_max_bytes": None if self.query_cache is None else self.query_cache.max_bytes,
+            "cache_ttl": None if self.query_cache is None else self.query_cache.ttl,
+        }
+
+    def run_load(self):
+        """
+        Runs the configured schedule once without reporting and returns the merged LoadStats of the run.
+        """
+        self.warmup()
+        self._start_run()
+        executor = ThreadPoolExecutor(max_workers=self.pool_size)
+        try:
+            run_schedule = self._run_burst if self.schedule == "burst" else self._run_open_loop
+            if self.profiler is not None:
+                run_schedule = self.profiler.wrap(run_schedule)
+            run_schedule(executor)
+            self._finish_run()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return self.stats
+
+    def warmup(self):
+        """Opens and sets up every pooled connection, so that the run does not measure connection setup."""
+        if self.connection_pool is not None:
+            self.connection_pool.warmup()
+
+    def _record_pool_wait(self, seconds):
+        """on_wait callback of the backend's InstrumentedPool, called from the worker threads."""
+        if self._accepting_results:
+            self._local_stats().pool_wait.record(seconds)
+
+    @property
+    def run_number(self):
+        return self._run_number
+
+    def in_flight(self):
+        """Number of operations sent and not yet completed."""
+        return len(self._pending)
+
+    def live_stats(self):
+        """
+        Approximate counters and histograms of the run in progress, merged from the worker statistics
+        while the workers keep writing to them (the per-second series is left out).
+        """
+        stats = LoadStats()
+        with self.lock:
+            worker_stats = list(self._worker_stats)
+        for worker in worker_stats:
+            for name, value in list(worker.counters.items()):
+                stats.counters[name] += value
+            stats.latency.merge(worker.latency)
+            stats.pool_wait.merge(worker.pool_wait)
+            for name, value in list(worker.write_counters.items()):
+                stats.write_counters[name] += value
+        stats.counters["sent"] = self.total_queries
+        return stats
+
+    def _start_run(self):
+        if self.write_ratio and self.write_rows is None:
+            vectors = ([self.embedding_vector] if self.query_set is None
+                       else self.query_set.matrix[self.query_set.rows])
+            self.write_rows = SyntheticRows(vectors, self.write_batch_size, seed=self.seed)
+        if self.query_cache is not None:
+            self.query_cache.clear()
+        self.total_queries = 0
+        self.stats = LoadStats()
+        self._run_id = object()
+        self._worker_stats = []
+        self._pending = set()
+        self._accepting_results = True
+        self._test_start = time.perf_counter()
+        self._last_completion = self._test_start
+        self._cpu_start = time.process_time()
+        self._wall_start = time.time()
+        self._run_number += 1
+        self.cpu_monitor.start()
+        if self.profiler is not None:
+            self.profiler.start()
+
+    def _finish_run(self):
+        """Waits up to timeout for operations still in flight, then merges the per-worker statistics."""
+        with self.lock:
+            in_flight = list(self._pending)
+        done, not_done = wait(in_flight, timeout=self.timeout)
+        self._accepting_results = False
+        for future in not_done:
+            future.cancel()
+        self._collect_stats(len(not_done))
+
+    def _collect_stats(self, unfinished):
+        """
+        Merges the per-worker statistics into self.stats and updates the summary counters.
+        :param unfinished: Number of operations still in flight after the drain timeout, counted as timed out
+        """
+        with self.lock:
+            for worker_stats in self._worker_stats:
+                self.stats.merge(worker_stats)
+        self.stats.counters["timeouts"] += unfinished
+        self.stats.counters["sent"] = self.total_queries
+        self.elapsed = self.stats.elapsed = max(self._last_completion - self._test_start, self.duration)
+        self.stats.client_cpu = time.process_time() - self._cpu_start
+        self.cpu_monitor.stop()
+        self.stats.client_cpu_peak = self.cpu_monitor.peak
+        if self.profiler is not None:
+            self.profiler.stop()
+        self.success_count = self.stats.counters["success"]
+        self.error_count = self.stats.counters["errors"] + self.stats.counters["timeouts"]
+        self.late_count = self.stats.counters["late"]
+        if self.trace is not None:
+            self.stats.window_size = self.trace.window
+            self.stats.window_origin = self.trace.first_timestamp
+            self.stats.window_speedup = self.trace.speedup
+        if self.result_sink is not None:
+            self.result_sink.flush()
+
+    def _submit(self, executor, scheduled, query=None):
+        execute = self._execute_scheduled if self.profiler is None else self.profiler.wrap(self._execute_scheduled)
+        future = executor.submit(execute, scheduled, query)
+        with self.lock:
+            self.total_queries += 1
+            self._pending.add(future)
+        future.add_done_callback(self._discard_pending)
+        return future
+
+    def _discard_pending(self, future):
+        with self.lock:
+            self._pending.discard(future)
+
+    def _run_burst(self, executor):
+        """
+        Closed-loop mode: fires tps futures at the top of each second and waits for them before the next batch.
+        """
+        for i in range(self.duration):
+            batch_start = time.perf_counter()
+            batch_futures = [self._submit(executor, batch_start) for _ in range(self.tps)]
+            wait(batch_futures, timeout=self.timeout)
+
+            batch_elapsed = time.perf_counter() - batch_start
+            if batch_elapsed < 1.0:
+                time.sleep(1.0 - batch_elapsed)
+
+    def _arrival_offsets(self):
+        """
+        Yields the scheduled send times of the open-loop schedule, in seconds from the start of the test.
+        """
+        if self.schedule == "constant":
+            for i in range(self.tps * self.duration):
+                yield i / self.tps
+        else:
+            rng = random.Random(self.seed)
+            offset = rng.expovariate(self.tps)
+            while offset < self.duration:
+                yield offset
+                offset += rng.expovariate(self.tps)
+
+    def _arrivals(self):
+        """
+        Yields (offset, query) for every send of the open-loop schedule: the queries of the trace when one is
+        replayed, otherwise None, leaving the query to be drawn by the worker.
+        """
+        if self.trace is None:
+            for offset in self._arrival_offsets():
+                yield offset, None
+            return
+        for offset, query in self.trace.arrivals():
+            if offset >= self.duration:
+                break
+            yield offset, query
+
+    def _run_open_loop(self, executor):
+        """
+        Open-loop mode: sends are issued at their scheduled times regardless of how many are still in flight,
+        and latency is measured from the scheduled time so queueing delay is not hidden.
+        """
+        for offset, query in self._arrivals():
+            scheduled = self._test_start + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self._submit(executor, scheduled, query)
+
+    def _local_stats(self):
+        """Returns the calling worker thread's LoadStats, registering it for the final merge on first use."""
+        local = self._local
+        if getattr(local, "run_id", None) is not self._run_id:
+            local.run_id = self._run_id
+            local.stats = LoadStats()
+            with self.lock:
+                self._worker_stats.append(local.stats)
+        return local.stats
+
+    def _execute_scheduled(self, scheduled, query=None):
+        """
+        Times one execute_query call from its scheduled send time and records it in the worker's statistics.
+        :param query: Query of a replayed trace; drawn from the query set (or the WORD vector) if None
+        """
+        if self._is_write():
+            return self._execute_write(scheduled)
+        late = self._is_late(scheduled)
+        if query is None:
+            query = self._draw_queries()
+        search_filter = self._draw_filter()
+        discarded = False
+        result = None
+        error = None
+        cache_hit = None
+        started = time.perf_counter()
+        try:
+            cached = self._cache_lookup(query, search_filter)
+            if cached is None:
+                result = self._invoke(query, search_filter)
+                self._cache_store(query, search_filter, result)
+            else:
+                cache_hit, result = cached
+            outcome = "success"
+        except QueryTimeoutError as e:
+            outcome = "timeouts"
+            discarded = e.connection_discarded
+            error = type(e).__name__
+        except Exception as e:
+            outcome = "errors"
+            error = type(e).__name__
+        completed = time.perf_counter()
+        if self._accepting_results:
+            stats = self._local_stats()
+            final_outcome = self._record_outcome(stats, scheduled, started, completed, outcome, late, discarded,
+                                                 search_filter, cache_hit)
+            received = self._record_search(stats, query, result, outcome, search_filter, cache_hit)
+            if self.result_sink is not None:
+                rows = None if result is None else self._result_rows(query, result)
+                self._sink_result("search", query, scheduled, started, completed, final_outcome, error, rows, late,
+                                  received)
+
+    def _is_write(self):
+        return self.write_ratio > 0 and self._write_random.random() < self.write_ratio
+
+    def _execute_write(self, scheduled):
+        """Write counterpart of _execute_scheduled: bulk-inserts one batch and records it in the write statistics."""
+        late = self._is_late(scheduled)
+        rows = self.write_rows.next_batch()
+        error = None
+        started = time.perf_counter()
+        try:
+            self.execute_write(rows)
+            outcome = "success"
+        except QueryTimeoutError as e:
+            outcome = "timeouts"
+            error = type(e).__name__
+        except Exception as e:
+            outcome = "errors"
+            error = type(e).__name__
+        completed = time.perf_counter()
+        if self._accepting_results:
+            final_outcome = self._record_write(self._local_stats(), scheduled, started, completed, outcome, late,
+                                               len(rows))
+            if self.result_sink is not None:
+                self._sink_result("write", None, scheduled, started, completed, final_outcome, error, len(rows), late)
+
+    def _is_late(self, scheduled):
+        return self.schedule != "burst" and time.perf_counter() - scheduled > self.late_threshold
+
+    def _record_outcome(self, stats, scheduled, started, completed, outcome, late, discarded=False,
+                        search_filter=None, cache_hit=None):
+        stats.send_lag.record(started - scheduled)
+        latency = completed - scheduled
+        if outcome == "success" and latency > self.timeout:
+            outcome = "timeouts"
+        stats.record(int(completed - self._test_start), latency, outcome, late)
+        if self.trace is not None:
+            stats.record_window(self.trace.window_of(scheduled - self._test_start), latency, outcome)
+        if self.search_filters:
+            stats.record_filter(filter_label(search_filter), _selectivity(search_filter), latency, outcome)
+        if self.query_cache is not None:
+            stats.record_cache(cache_hit or "miss", latency, outcome)
+        if discarded:
+            stats.counters["discarded"] += 1
+        if completed > self._last_completion:
+            self._last_completion = completed
+        return outcome
+
+    def _record_write(self, stats, scheduled, started, completed, outcome, late, rows):
+        stats.send_lag.record(started - scheduled)
+        latency = completed - scheduled
+        if outcome == "success" and latency > self.timeout:
+            outcome = "timeouts"
+        stats.record_write(latency, outcome, rows, late)
+        if completed > self._last_completion:
+            self._last_completion = completed
+        return outcome
+
+    def _sink_result(self, operation, query, scheduled, started, completed, outcome, error, rows, late,
+                     result_bytes=None):
+        """Queues the record of one operation for the result file; times are converted to epoch seconds."""
+        to_epoch = self._wall_start - self._test_start
+        if isinstance(query, list):
+            # a batched search is recorded once, under its first query
+            query = query[0]
+        self.result_sink.record((
+            self._run_number,
+            type(self).__name__,
+            operation,
+            None if query is None else query.index,
+            scheduled + to_epoch,
+            started + to_epoch,
+            completed + to_epoch,
+            (completed - scheduled) * 1000,
+            outcome,
+            error,
+            rows,
+            late,
+            result_bytes,
+        ))
 
     def report_results(self):
-        logging.info("=== Test Results ===")
-        logging.info("Total operations: %d", self.total_queries)
-        logging.info("Successful operations: %d", self.success_count)
-        logging.info("Failed operations: %d", self.error_count)
-        qps = self.total_queries / self.duration
-        logging.info("QPS: %.2f", qps)
+        log_load_stats(self.stats, self.schedule, self.duration, self.late_threshold, self.recall_k)
+        if self.profiler is not None:
+            self.profiler.report()
+        if self.query_cache is not None:
+            cache = self.query_cache
+            logging.info("Query cache (%s%s): %d entries, %.1f MB at the end of the run; evictions: %s", cache.mode,
+                         f", threshold {cache.threshold}" if cache.mode == "semantic" else "", len(cache),
+                         cache.bytes / 1024 / 1024,
+                         ", ".join(f"{n} {reason}" for reason, n in sorted(cache.evictions.items())) or "none")
+        if self._binding_sizes and self.BINARY_BINDING_FALLBACK:
+            # both bindings send the same text literal, there is no binary size to compare
+            binding = self.BINARY_BINDING_FALLBACK if self.vector_binding == "binary" else self.vector_binding
+            logging.info("Vector binding: %s, %d bytes per query vector as text literal (the driver cannot send "
+                         "binary parameters)", binding, self._binding_sizes["text"])
+        elif self._binding_sizes:
+            text_size, binary_size = self._binding_sizes["text"], self._binding_sizes["binary"]
+            logging.info("Vector binding: %s, %d bytes per query vector as binary vs %d as text literal (%+.0f%%)",
+                         self.vector_binding, binary_size, text_size, (binary_size - text_size) / text_size * 100)
 
     @staticmethod
     def setup_logging():
@@ -86,3 +801,207 @@ class AbstractLoaderTest(ABC):
     def _generate_unique_comment(self):
         """Generate a random string for cache busting"""
         return ''.join(random.choices(string.ascii_letters + string.digits, k=8))
+
+
+def payload_size(encoded):
+    """Approximate bytes an encoded query vector takes on the wire."""
+    if isinstance(encoded, str):
+        return len(encoded.encode("utf-8"))
+    if isinstance(encoded, (bytes, bytearray)):
+        return len(encoded)
+    if isinstance(encoded, array.array):
+        return encoded.itemsize * len(encoded)
+    # lists of floats are serialised as float32 (Milvus gRPC FloatArray)
+    return 4 * len(encoded)
+
+
+def result_payload_size(value):
+    """
+    Approximate bytes of a search result as received: the UTF-8 length of strings, the length of bytes,
+    8 per number, summed over rows, hit lists and the values of dicts (Milvus hits).
+    """
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, Mapping):
+        return sum(result_payload_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(result_payload_size(v) for v in value)
+    return 8
+
+
+def concurrency_for(tps, latency, headroom=1.5, minimum=4):
+    """
+    Operations in flight at tps operations per second taking latency seconds each (Little's law), with headroom
+    and at least minimum, so that one slow search does not hold up the next ones. Used as the pool_size of
+    saturation searches and sweeps instead of tps * 2, which opens far more connections than a store accepts.
+    """
+    return max(minimum, math.ceil(tps * latency * headroom))
+
+
+def split_batch_rows(rows, batch_size):
+    """
+    Splits the rows of a batched search, whose first column is the 0-based number of the query they answer,
+    into one list of rows (without that column) per query.
+    """
+    results = [[] for _ in range(batch_size)]
+    for row in rows:
+        results[row[0]].append(tuple(row[1:]))
+    return results
+
+
+def client_bottleneck_warnings(stats, schedule, late_threshold, max_cpu=0.9, max_late_ratio=0.01):
+    """
+    Signs that the client, not the database, limited the run: a client process close to a full core
+    (the GIL keeps one Python process near one core) or sends falling behind an open-loop schedule.
+    """
+    warnings = []
+    if stats.client_cpu_peak >= max_cpu:
+        warnings.append(f"a client process used {stats.client_cpu_peak * 100:.0f}% of one core; "
+                        "spread the load with multiprocess_runner.py or use the asyncio engine")
+    sent = stats.counters["sent"]
+    if schedule != "burst" and sent and stats.counters["late"] / sent > max_late_ratio:
+        warnings.append(f"{stats.counters['late'] / sent * 100:.1f}% of sends started more than "
+                        f"{late_threshold * 1000:.1f} ms behind schedule")
+    return warnings
+
+
+def log_load_stats(stats, schedule, duration, late_threshold, recall_k=None):
+    """
+    Logs the summary of a (possibly merged) LoadStats.
+    """
+    counters = stats.counters
+    success_count = counters["success"]
+    logging.info("=== Test Results ===")
+    logging.info("Schedule: %s", schedule)
+    logging.info("Total operations: %d", counters["sent"])
+    logging.info("Successful operations: %d", success_count)
+    logging.info("Failed operations: %d", counters["errors"] + counters["timeouts"])
+    logging.info("Timed out operations: %d (connections discarded: %d)", counters["timeouts"], counters["discarded"])
+    logging.info("Offered QPS: %.2f", counters["sent"] / duration)
+    if schedule != "burst":
+        logging.info("Late sends (> %.1f ms behind schedule): %d", late_threshold * 1000, counters["late"])
+    if stats.elapsed:
+        logging.info("Sustained QPS: %.2f", success_count / stats.elapsed)
+    if stats.client_cpu and counters["sent"]:
+        logging.info("Client CPU: %.3f ms per operation (%.1f%% of one core)",
+                     stats.client_cpu / counters["sent"] * 1000, stats.client_cpu / (stats.elapsed or duration) * 100)
+    if stats.client_cpu_peak:
+        logging.info("Client CPU peak: %.1f%% of one core over a sampling interval", stats.client_cpu_peak * 100)
+    if counters["queries"] > success_count and success_count:
+        # batched searches: every call carried several query vectors
+        logging.info("Query vectors searched: %d (%.1f per call), %.2f vectors/s sustained",
+                     counters["queries"], counters["queries"] / success_count,
+                     counters["queries"] / (stats.elapsed or duration))
+        if stats.latency.count:
+            logging.info("Latency per vector (mean call latency / vectors per call): %.3f ms",
+                         stats.latency.mean * 1000 * success_count / counters["queries"])
+    if counters["vector_bytes"] and counters["sent"]:
+        logging.info("Query vector bytes sent: %.0f per operation", counters["vector_bytes"] / counters["sent"])
+    if counters["fetched"]:
+        logging.info("Result bytes received: %.0f per query vector, %.2f MB/s", counters["result_bytes"] /
+                     counters["fetched"], counters["result_bytes"] / (stats.elapsed or duration) / 1024 / 1024)
+    writes = stats.write_counters
+    if writes["success"] + writes["errors"] + writes["timeouts"]:
+        logging.info("Write operations: %d succeeded (%d rows, %.1f rows/s), %d failed, %d timed out",
+                     writes["success"], writes["rows"], writes["rows"] / (stats.elapsed or duration),
+                     writes["errors"], writes["timeouts"])
+        if stats.write_latency.count:
+            logging.info("Write latency (ms): p50 %.2f, p99 %.2f, max %.2f", stats.write_latency.percentile(50) * 1000,
+                         stats.write_latency.percentile(99) * 1000, stats.write_latency.max * 1000)
+    if stats.recall_count:
+        logging.info("Recall@%s: %.4f (over %d queries)", recall_k, stats.recall, stats.recall_count)
+
+    for warning in client_bottleneck_warnings(stats, schedule, late_threshold):
+        logging.warning("Client bottleneck: %s", warning)
+
+    latency = stats.latency
+    if not latency.count:
+        return
+    logging.info("Latency (ms): p50 %.2f, p90 %.2f, p99 %.2f, p99.9 %.2f, max %.2f",
+                 *(latency.percentile(p) * 1000 for p in (50, 90, 99, 99.9)), latency.max * 1000)
+    send_lag = stats.send_lag
+    if send_lag.count:
+        logging.info("Send lag behind schedule (ms): p50 %.2f, p99 %.2f, max %.2f", send_lag.percentile(50) * 1000,
+                     send_lag.percentile(99) * 1000, send_lag.max * 1000)
+    pool_wait = stats.pool_wait
+    if pool_wait.count:
+        # the remainder of the latency is spent in the database (and on the network)
+        logging.info("Connection pool wait (ms): p50 %.2f, p99 %.2f, max %.2f, mean %.2f of %.2f mean latency",
+                     pool_wait.percentile(50) * 1000, pool_wait.percentile(99) * 1000, pool_wait.max * 1000,
+                     pool_wait.mean * 1000, latency.mean * 1000)
+    if stats.filters:
+        log_filter_stats(stats, recall_k)
+    if stats.cache:
+        log_cache_stats(stats, recall_k)
+    if stats.windows:
+        log_window_stats(stats)
+    logging.info("Per-second series (second, operations, errors, mean latency ms, max latency ms):")
+    for second in sorted(stats.series):
+        ops, errors, lat_sum, lat_max = stats.series[second]
+        succeeded = ops - errors
+        mean_ms = lat_sum / succeeded * 1000 if succeeded else 0.0
+        logging.info("  %5d %7d %7d %9.2f %9.2f", second, ops, errors, mean_ms, lat_max * 1000)
+
+
+def _selectivity(search_filter):
+    return 1.0 if search_filter is None else search_filter.selectivity
+
+
+def log_filter_stats(stats, recall_k=None):
+    """Logs QPS, latency and recall of a filtered workload per filter, from the least to the most selective."""
+    logging.info("Per-filter results (filter, operations, errors, QPS, p50 ms, p99 ms, recall@%s):", recall_k)
+    for label, (selectivity, ops, errors, latency, recall_sum, recall_count) in sorted(
+            stats.filters.items(), key=lambda item: -item[1][0]):
+        logging.info("  %-28s %7d %6d %9.1f %8s %8s %8s", label, ops, errors,
+                     latency.count / stats.elapsed if stats.elapsed else 0.0,
+                     *("-" if value is None else f"{value * 1000:.2f}"
+                       for value in (latency.percentile(50), latency.percentile(99))),
+                     f"{recall_sum / recall_count:.4f}" if recall_count else "-")
+
+
+def log_cache_stats(stats, recall_k=None):
+    """
+    Logs the hit rate of the query cache, the latency of hits and misses, and the backend load the hits avoided,
+    valued at the mean latency of the misses.
+    """
+    hits = {kind: stats.cache[kind] for kind in QueryCache.MODES if kind in stats.cache}
+    miss = stats.cache.get("miss")
+    hit_count = sum(point[0] for point in hits.values())
+    searches = hit_count + (miss[0] if miss else 0)
+    logging.info("Query cache hits: %d of %d searches (%.1f%%; %s)", hit_count, searches,
+                 hit_count / searches * 100 if searches else 0.0,
+                 ", ".join(f"{kind} {point[0]}" for kind, point in hits.items()) or "none")
+    logging.info("Query cache latency (kind, operations, errors, p50 ms, p99 ms, mean ms, recall@%s):", recall_k)
+    for kind, (ops, errors, latency, recall_sum, recall_count) in sorted(stats.cache.items()):
+        logging.info("  %-9s %7d %6d %8s %8s %8s %8s", kind, ops, errors,
+                     *("-" if value is None else f"{value * 1000:.2f}"
+                       for value in (latency.percentile(50), latency.percentile(99), latency.mean)),
+                     f"{recall_sum / recall_count:.4f}" if recall_count else "-")
+    if miss and miss[2].count:
+        avoided = hit_count * miss[2].mean
+        logging.info("Backend load avoided: %d searches (%.1f%%), about %.2f s of search latency at the mean "
+                     "miss latency of %.2f ms", hit_count, hit_count / searches * 100 if searches else 0.0, avoided,
+                     miss[2].mean * 1000)
+
+
+def log_window_stats(stats):
+    """Logs the latency of a trace replay per window of trace time, and the window with the highest traffic."""
+    size = stats.window_size
+    logging.info("Per-window latency (%g s of trace time each, replayed at %gx; window start, operations, "
+                 "errors, replayed QPS, p50 ms, p99 ms, max ms):", size, stats.window_speedup)
+    for window in sorted(stats.windows):
+        ops, errors, latency = stats.windows[window]
+        logging.info("  %s %7d %6d %9.1f %8s %8s %8s", format_timestamp(stats.window_origin + window * size), ops,
+                     errors, ops / size * stats.window_speedup, *(
+                         "-" if not latency.count else f"{value * 1000:.2f}"
+                         for value in (latency.percentile(50), latency.percentile(99), latency.max)))
+    peak = max(stats.windows, key=lambda w: stats.windows[w][0])
+    ops, errors, latency = stats.windows[peak]
+    if latency.count:
+        logging.info("Peak window %s: %d operations (%.1f QPS in the trace), p99 %.2f ms, %d errors",
+                     format_timestamp(stats.window_origin + peak * size), ops, ops / size,
+                     latency.percentile(99) * 1000, errors)
@@ -0,0 +1,113 @@
+import os
+import csv
+import time
+import logging
+from abstract_loader_test import AbstractLoaderTest, concurrency_for
+
+
+class BatchSizeSweep:
+    """
+    Runs a fixed-length load at each of several search batch sizes (query vectors per call) and tabulates
+    vector throughput against per-call and per-vector latency, re-using one tester and its connection pool.
+    """
+
+    def __init__(self, tester, batch_sizes, point_duration=30, cooldown=2):
+        """
+        :param tester: AbstractLoaderTest instance implementing execute_batch; its tps counts calls per second
+        :param batch_sizes: Query vectors per call to measure, e.g. [1, 2, 4, 8, 16, 32]
+        :param point_duration: Seconds of load at each batch size
+        :param cooldown: Seconds to pause between batch sizes
+        """
+        # fail before the first run if the tester cannot batch (trace replay, filters, query cache)
+        initial = tester.search_batch_size
+        for batch_size in batch_sizes:
+            tester.set_search_batch_size(batch_size)
+        tester.set_search_batch_size(initial)
+        self.tester = tester
+        self.batch_sizes = list(batch_sizes)
+        self.point_duration = point_duration
+        self.cooldown = cooldown
+        self.results = []
+
+    def run(self):
+        for i, batch_size in enumerate(self.batch_sizes):
+            if i:
+                time.sleep(self.cooldown)
+            self.tester.set_search_batch_size(batch_size)
+            self.tester.duration = self.point_duration
+            stats = self.tester.run_load()
+            counters = stats.counters
+            latency = stats.latency
+            row = {
+                "batch_size": batch_size,
+                "calls_per_s": counters["success"] / stats.elapsed if stats.elapsed else 0.0,
+                "vectors_per_s": counters["queries"] / stats.elapsed if stats.elapsed else 0.0,
+                "p50_ms": latency.percentile(50) * 1000 if latency.count else None,
+                "p99_ms": latency.percentile(99) * 1000 if latency.count else None,
+                # every vector of a call waits for the whole call; the amortised cost is the call latency / size
+                "ms_per_vector": latency.mean * 1000 / batch_size if latency.count else None,
+                "recall": stats.recall,
+                "errors": counters["errors"] + counters["timeouts"],
+            }
+            self.results.append(row)
+            logging.info("Batch size %d: %.1f vectors/s, p99 %s ms per call, %s ms per vector", batch_size,
+                         row["vectors_per_s"], _format(row["p99_ms"], 2), _format(row["ms_per_vector"], 3))
+        self.report_results()
+        return self.results
+
+    def best(self):
+        """Row with the highest vector throughput."""
+        return max(self.results, key=lambda r: r["vectors_per_s"], default=None)
+
+    def report_results(self):
+        best = self.best()
+        logging.info("=== Batch Size Sweep Results ===")
+        logging.info("Batch | Calls/s | Vectors/s | p50 ms | p99 ms | ms/vector | Recall@%d | Errors | Best",
+                     self.tester.recall_k)
+        for row in self.results:
+            logging.info("%5d | %7.1f | %9.1f | %s | %s | %s | %s | %d | %s", row["batch_size"], row["calls_per_s"],
+                         row["vectors_per_s"], _format(row["p50_ms"], 2), _format(row["p99_ms"], 2),
+                         _format(row["ms_per_vector"], 3), _format(row["recall"], 4), row["errors"],
+                         "*" if row is best else "")
+
+    def write_csv(self, path):
+        fields = ["batch_size", "calls_per_s", "vectors_per_s", "p50_ms", "p99_ms", "ms_per_vector", "recall",
+                  "errors"]
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(self.results)
+
+
+def _format(value, digits):
+    return "-" if value is None else f"{value:.{digits}f}"
+
+
+if __name__ == '__main__':
+    import importlib
+    import inspect
+
+    AbstractLoaderTest.setup_logging()
+    module_name, class_name = os.environ.get("TESTER", "oci_postgres_load_test:OCI_Postgres_LoadTest").split(":")
+    tester_class = getattr(importlib.import_module(module_name), class_name)
+    word = os.environ.get("WORD", "サヴォワ地方はどこの国？")
+    word_arg = "query" if "query" in inspect.signature(tester_class).parameters else "word"
+    point_duration = int(os.environ.get("DURATION", 30))
+    tps = int(os.environ.get("TPS", 10))
+    pool_size = (int(os.environ["POOL_SIZE"]) if "POOL_SIZE" in os.environ else
+                 concurrency_for(tps, float(os.environ.get("EXPECTED_LATENCY_MS", 50)) / 1000))
+
+    tester = tester_class(
+        tps=tps,
+        duration=point_duration,
+        timeout=int(os.environ.get("TIMEOUT", 10)),
+        schedule=os.environ.get("SCHEDULE", "constant"),
+        query_file=os.environ.get("QUERY_FILE"),
+        ground_truth_dir=os.environ.get("GROUND_TRUTH_DIR"),
+        pool_size=pool_size,
+        **{word_arg: word}
+    )
+    sweep = BatchSizeSweep(tester, [int(size) for size in os.environ.get("BATCH_SIZES", "1,2,4,8,16,32").split(",")],
+                           point_duration=point_duration)
+    sweep.run()
+    sweep.write_csv(os.environ.get("BATCH_CSV", "batch_results.csv"))
@@ -0,0 +1,513 @@
+import io
+import os
+import json
+import time
+import queue
+import array
+import logging
+import threading
+from write_workload import WriteRow
+from filtered_workload import attribute_values
+
+# distance metric (as in ground_truth.METRICS) -> pgvector operator class / Oracle distance / Milvus metric type
+PG_OPCLASSES = {"cosine": "vector_cosine_ops", "l2": "vector_l2_ops", "ip": "vector_ip_ops"}
+ORACLE_DISTANCES = {"cosine": "COSINE", "l2": "EUCLIDEAN", "ip": "DOT"}
+MILVUS_METRICS = {"cosine": "COSINE", "l2": "L2", "ip": "IP"}
+INDEX_TYPES = ("hnsw", "ivf")
+
+
+class BulkLoader:
+    """
+    Creates a table (or collection), streams a vector source into it with parallel workers and builds the
+    vector index, timing each phase.
+
+    The source is read chunk by chunk (ClusteredGaussian, NpyVectors, FvecsVectors or a VectorExport) into a
+    queue bounded to two chunks per worker, so memory stays at a few batches whatever the dataset size. Each
+    worker holds its own connection and writes one batch per round trip with the backend's bulk path.
+    Subclasses implement the backend-specific steps.
+    """
+
+    def __init__(self, config, table, index="hnsw", index_name=None, index_params=None, metric="cosine",
+                 workers=4, batch_rows=5000, drop_existing=False, attributes=False):
+        """
+        :param config: Test configuration (config.yaml) with the connection settings of the backend
+        :param table: Table (or Milvus collection) to create and fill
+        :param index: "hnsw" or "ivf"
+        :param index_name: Name of the vector index (defaults to <table>_<index>_idx)
+        :param index_params: Build parameters, e.g. {"m": 16, "ef_construction": 64} or {"lists": 1000} for
+            pgvector, {"neighbors": 32, "efconstruction": 200} or {"neighbor_partitions": 1000} for Oracle,
+            {"M": 16, "efConstruction": 200} or {"nlist": 1024} for Milvus
+        :param metric: "cosine", "l2" or "ip"
+        :param workers: Parallel writer connections
+        :param batch_rows: Rows per write
+        :param drop_existing: Drop the table first instead of appending to it
+        :param attributes: Also fill and index the bucket and category filter attribute columns of a filtered
+            workload (see filtered_workload.py), derived from each row's vector
+        """
+        if index not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index}', expected one of {INDEX_TYPES}")
+        if metric not in PG_OPCLASSES:
+            raise ValueError(f"Unknown metric '{metric}', expected one of {tuple(PG_OPCLASSES)}")
+        self.config = config
+        self.table = table
+        self.index = index
+        self.index_name = index_name or f"{table}_{index}_idx".lower()
+        self.index_params = index_params or {}
+        self.metric = metric
+        self.workers = workers
+        self.batch_rows = batch_rows
+        self.drop_existing = drop_existing
+        self.attributes = attributes
+        self.results = {}
+
+    # --- backend-specific steps ---
+
+    def connect(self):
+        raise NotImplementedError
+
+    def disconnect(self, conn):
+        conn.close()
+
+    def create_table(self, conn, dimension):
+        raise NotImplementedError
+
+    def write_batch(self, conn, rows):
+        """Writes a list of WriteRows in one round trip (with their filter attributes if attributes is set)."""
+        raise NotImplementedError
+
+    def row_attributes(self, rows):
+        """Filter attribute values of a batch of WriteRows, None unless attributes is set."""
+        if not self.attributes:
+            return None
+        return attribute_values([row.vector for row in rows])
+
+    def finish_load(self, conn):
+        """Runs after the last batch, before the index build (flush, statistics, identity sequences)."""
+
+    def build_index(self, conn):
+        raise NotImplementedError
+
+    def index_size(self, conn):
+        """Size of the vector index in bytes, or None if the backend does not report it."""
+        return None
+
+    # --- orchestration ---
+
+    def load(self, source):
+        """
+        :param source: Object with dimension, count and chunks(chunk_rows) yielding (first row, float32 matrix)
+        :return: Dict of rows, timings, throughput and index size, also logged
+        """
+        conn = self.connect()
+        try:
+            self.create_table(conn, source.dimension)
+            rows, load_seconds = self._load_rows(source)
+            self.finish_load(conn)
+            logging.info("Building %s index %s on %s...", self.index.upper(), self.index_name, self.table)
+            start = time.perf_counter()
+            self.build_index(conn)
+            build_seconds = time.perf_counter() - start
+            index_bytes = self.index_size(conn)
+        finally:
+            self.disconnect(conn)
+        self.results = {
+            "backend": type(self).__name__,
+            "table": self.table,
+            "index": self.index,
+            "index_name": self.index_name,
+            "index_params": self.index_params,
+            "attributes": self.attributes,
+            "dimension": source.dimension,
+            "rows": rows,
+            "workers": self.workers,
+            "batch_rows": self.batch_rows,
+            "load_seconds": load_seconds,
+            "rows_per_second": rows / load_seconds if load_seconds else None,
+            "vector_mib_per_second": rows * source.dimension * 4 / 1048576 / load_seconds if load_seconds else None,
+            "index_build_seconds": build_seconds,
+            "index_bytes": index_bytes,
+        }
+        self.report_results()
+        return self.results
+
+    def _load_rows(self, source):
+        batches = queue.Queue(maxsize=self.workers * 2)
+        failed = threading.Event()
+        errors = []
+        loaded = [0] * self.workers
+
+        def worker(slot):
+            conn = None
+            try:
+                conn = self.connect()
+                while True:
+                    batch = batches.get()
+                    if batch is None:
+                        return
+                    first, vectors = batch
+                    self.write_batch(conn, [WriteRow(first + i, f"vectorbench row {first + i}", vector)
+                                            for i, vector in enumerate(vectors)])
+                    loaded[slot] += len(vectors)
+            except Exception as e:
+                logging.exception("Bulk load worker %d failed", slot)
+                errors.append(e)
+                failed.set()
+            finally:
+                if conn is not None:
+                    self.disconnect(conn)
+
+        threads = [threading.Thread(target=worker, args=(slot,), name=f"bulk-load-{slot}", daemon=True)
+                   for slot in range(self.workers)]
+        logging.info("Loading %d vectors (dimension %d) into %s with %d workers, %d rows per batch",
+                     source.count, source.dimension, self.table, self.workers, self.batch_rows)
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        next_report = start + 10
+        for batch in source.chunks(self.batch_rows):
+            while not failed.is_set():
+                try:
+                    batches.put(batch, timeout=0.5)
+                    break
+                except queue.Full:
+                    pass
+            if failed.is_set():
+                break
+            if time.perf_counter() >= next_report:
+                done = sum(loaded)
+                logging.info("  %d / %d rows (%.0f rows/s)", done, source.count, done / (time.perf_counter() - start))
+                next_report += 10
+        for _ in threads:
+            while True:
+                try:
+                    batches.put(None, timeout=0.5)
+                    break
+                except queue.Full:
+                    if failed.is_set():
+                        # drain so that the surviving workers see their sentinel
+                        try:
+                            batches.get_nowait()
+                        except queue.Empty:
+                            pass
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        if errors:
+            raise errors[0]
+        return sum(loaded), elapsed
+
+    def report_results(self):
+        r = self.results
+        logging.info("====== Bulk Load Report ======")
+        logging.info(f"Backend: {r['backend']}  table: {r['table']}  index: {r['index_name']} ({r['index']})")
+        logging.info(f"Rows loaded: {r['rows']} (dimension {r['dimension']}) in {r['load_seconds']:.2f} s")
+        if r["rows_per_second"] is not None:
+            logging.info(f"Load throughput: {r['rows_per_second']:.0f} rows/s, "
+                         f"{r['vector_mib_per_second']:.1f} MiB/s of vector data "
+                         f"({r['workers']} workers, {r['batch_rows']} rows per batch)")
+        logging.info(f"Index build time: {r['index_build_seconds']:.2f} s")
+        if r["index_bytes"] is not None:
+            logging.info(f"Index size: {r['index_bytes'] / 1048576:.1f} MiB")
+        else:
+            logging.info("Index size: not reported by this backend")
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.results, f, indent=2)
+        logging.info("Wrote bulk load results to %s", path)
+
+
+class PostgresBulkLoader(BulkLoader):
+    """pgvector: COPY ... FROM STDIN (FORMAT BINARY) per batch, then CREATE INDEX USING hnsw / ivfflat."""
+
+    def __init__(self, config, table, build_settings=None, **kwargs):
+        """
+        :param build_settings: Session settings for the index build, e.g. {"maintenance_work_mem": "8GB",
+            "max_parallel_maintenance_workers": 7}
+        """
+        super().__init__(config, table, **kwargs)
+        self.build_settings = build_settings or {}
+
+    def connect(self):
+        import psycopg2
+        return psycopg2.connect(
+            host=self.config["pgvector_dbhost"],
+            port=5432,
+            dbname=self.config["pgvector_dbname"],
+            user=self.config["pgvector_username"],
+            password=self.config["pgvector_password"]
+        )
+
+    def create_table(self, conn, dimension):
+        with conn.cursor() as cur:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+            if self.drop_existing:
+                cur.execute(f"DROP TABLE IF EXISTS {self.table}")
+            # identity ids, so that the rows of a mixed read/write workload can be inserted without one
+            attribute_columns = ", bucket integer, category integer" if self.attributes else ""
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                    text text,
+                    embedding vector({int(dimension)}){attribute_columns}
+                )""")
+        conn.commit()
+
+    def write_batch(self, conn, rows):
+        from oci_postgres_load_test import copy_binary_payload
+        columns = "text, embedding, bucket, category" if self.attributes else "text, embedding"
+        with conn.cursor() as cur:
+            cur.copy_expert(f"COPY {self.table} ({columns}) FROM STDIN WITH (FORMAT BINARY)",
+                            io.BytesIO(copy_binary_payload(rows, self.row_attributes(rows))))
+        conn.commit()
+
+    def finish_load(self, conn):
+        with conn.cursor() as cur:
+            if self.attributes:
+                # B-tree indexes let the planner pre-filter selective predicates instead of scanning the vector index
+                for column in ("bucket", "category"):
+                    cur.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_{column}_idx ON {self.table} ({column})")
+            cur.execute(f"ANALYZE {self.table}")
+        conn.commit()
+
+    def build_index(self, conn):
+        from oci_postgres_load_test import setting_statements
+        method = "hnsw" if self.index == "hnsw" else "ivfflat"
+        sql = f"CREATE INDEX {self.index_name} ON {self.table} USING {method} (embedding {PG_OPCLASSES[self.metric]})"
+        if self.index_params:
+            sql += " WITH (" + ", ".join(f"{name} = {int(value)}" for name, value in self.index_params.items()) + ")"
+        with conn.cursor() as cur:
+            for statement in setting_statements(dict(self.build_settings, statement_timeout=0)):
+                cur.execute(statement)
+            if self.drop_existing:
+                cur.execute(f"DROP INDEX IF EXISTS {self.index_name}")
+            cur.execute(sql)
+        conn.commit()
+
+    def index_size(self, conn):
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_relation_size(%s::regclass)", (self.index_name,))
+            return cur.fetchone()[0]
+
+
+class OracleBulkLoader(BulkLoader):
+    """
+    Oracle AI Vector Search (ATP or Base Database): array inserts of FLOAT32 VECTORs per batch, then
+    CREATE VECTOR INDEX (INMEMORY NEIGHBOR GRAPH for HNSW, NEIGHBOR PARTITIONS for IVF).
+    """
+
+    def __init__(self, config, table, target="atp", target_accuracy=95, parallel=None, **kwargs):
+        """
+        :param target: "atp" (wallet, atp_* settings) or "basedb" (basedb_* settings)
+        :param target_accuracy: Default target accuracy stored with the index
+        :param parallel: Degree of parallelism of the index build (None for the database default)
+        """
+        super().__init__(config, table, **kwargs)
+        if target not in ("atp", "basedb"):
+            raise ValueError(f"Unknown Oracle target '{target}', expected 'atp' or 'basedb'")
+        self.target = target
+        self.target_accuracy = target_accuracy
+        self.parallel = parallel
+
+    def connect(self):
+        import oracledb
+        if self.target == "atp":
+            return oracledb.connect(
+                user=self.config["atp_username"],
+                password=self.config["atp_password"],
+                dsn=self.config["atp_dsn"],
+                config_dir=self.config["atp_wallet_dir"]
+            )
+        return oracledb.connect(
+            user=self.config["basedb_username"],
+            password=self.config["basedb_password"],
+            dsn=f"{self.config['basedb_host']}:{self.config['basedb_port']}/{self.config['basedb_service_name']}"
+        )
+
+    def create_table(self, conn, dimension):
+        import oracledb
+        with conn.cursor() as cur:
+            if self.drop_existing:
+                try:
+                    cur.execute(f"DROP TABLE {self.table} PURGE")
+                except oracledb.DatabaseError as e:
+                    if e.args[0].full_code != "ORA-00942":  # table or view does not exist
+                        raise
+            cur.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = UPPER(:1)", [self.table])
+            if not cur.fetchone()[0]:
+                attribute_columns = ", bucket NUMBER(10), category NUMBER(10)" if self.attributes else ""
+                cur.execute(f"""
+                    CREATE TABLE {self.table} (
+                        id NUMBER GENERATED BY DEFAULT ON NULL AS IDENTITY PRIMARY KEY,
+                        text VARCHAR2(4000),
+                        embedding VECTOR({int(dimension)}, FLOAT32){attribute_columns}
+                    )""")
+
+    def write_batch(self, conn, rows):
+        import oracledb
+        attributes = self.row_attributes(rows)
+        with conn.cursor() as cur:
+            if attributes is None:
+                cur.setinputsizes(None, oracledb.DB_TYPE_VECTOR)
+                cur.executemany(f"INSERT INTO {self.table} (text, embedding) VALUES (:1, :2)",
+                                [(row.text, array.array("f", row.vector)) for row in rows])
+            else:
+                cur.setinputsizes(None, oracledb.DB_TYPE_VECTOR, None, None)
+                cur.executemany(f"INSERT INTO {self.table} (text, embedding, bucket, category) VALUES (:1, :2, :3, :4)",
+                                [(row.text, array.array("f", row.vector), int(bucket), int(category))
+                                 for row, bucket, category in zip(rows, attributes["bucket"], attributes["category"])])
+        conn.commit()
+
+    def finish_load(self, conn):
+        with conn.cursor() as cur:
+            if self.attributes:
+                for column in ("bucket", "category"):
+                    # appending to an existing table: its indexes already exist (ORA-00955 otherwise)
+                    cur.execute("SELECT COUNT(*) FROM user_indexes WHERE index_name = UPPER(:1)",
+                                [f"{self.table}_{column}_idx"])
+                    if cur.fetchone()[0] == 0:
+                        cur.execute(f"CREATE INDEX {self.table}_{column}_idx ON {self.table} ({column})")
+            cur.execute("BEGIN DBMS_STATS.GATHER_TABLE_STATS(USER, UPPER(:1)); END;", [self.table])
+
+    def build_index(self, conn):
+        import oracledb
+        params = {name.upper().replace("_", " "): int(value) for name, value in self.index_params.items()}
+        if self.index == "hnsw":
+            organization = "INMEMORY NEIGHBOR GRAPH"
+            parameters = ", ".join(["TYPE HNSW"] + [f"{name} {value}" for name, value in params.items()])
+        else:
+            organization = "NEIGHBOR PARTITIONS"
+            parameters = ", ".join(["TYPE IVF"] + [f"{name} {value}" for name, value in params.items()])
+        sql = (f"CREATE VECTOR INDEX {self.index_name} ON {self.table} (embedding) ORGANIZATION {organization} "
+               f"DISTANCE {ORACLE_DISTANCES[self.metric]} WITH TARGET ACCURACY {int(self.target_accuracy)} "
+               f"PARAMETERS ({parameters})")
+        if self.parallel:
+            sql += f" PARALLEL {int(self.parallel)}"
+        with conn.cursor() as cur:
+            if self.drop_existing:
+                try:
+                    cur.execute(f"DROP INDEX {self.index_name}")
+                except oracledb.DatabaseError as e:
+                    if e.args[0].full_code != "ORA-01418":  # specified index does not exist
+                        raise
+            cur.execute(sql)
+
+    def index_size(self, conn):
+        with conn.cursor() as cur:
+            if self.index == "hnsw":
+                # HNSW graphs live in the vector memory pool, not in segments
+                cur.execute("SELECT SUM(allocated_bytes) FROM v$vector_graph_index WHERE index_name = UPPER(:1)",
+                            [self.index_name])
+            else:
+                # IVF centroids and partitions are stored in VECTOR$<index>$... auxiliary tables
+                cur.execute("SELECT SUM(bytes) FROM user_segments WHERE segment_name LIKE 'VECTOR$' || UPPER(:1) || '$%'",
+                            [self.index_name])
+            size = cur.fetchone()[0]
+        return int(size) if size is not None else None
+
+
+class MilvusBulkLoader(BulkLoader):
+    """Milvus: batched inserts from every worker, flush, then create_index and wait until every row is indexed."""
+
+    def connect(self):
+        from pymilvus import MilvusClient
+        return MilvusClient(uri=self.config["milvus_uri"])
+
+    def create_table(self, client, dimension):
+        from pymilvus import DataType
+        collection = self.table
+        if self.drop_existing and client.has_collection(collection):
+            client.drop_collection(collection)
+        if client.has_collection(collection):
+            return
+        schema = client.create_schema(auto_id=self.config.get("auto_id", True), enable_dynamic_field=False)
+        schema.add_field(self.config.get("id_field", "id"), DataType.INT64, is_primary=True)
+        schema.add_field(self.config.get("text_field", "text"), DataType.VARCHAR, max_length=65535)
+        schema.add_field(self.config.get("vector_field", "embedding"), DataType.FLOAT_VECTOR, dim=int(dimension))
+        if self.attributes:
+            schema.add_field("bucket", DataType.INT32)
+            schema.add_field("category", DataType.INT32)
+        client.create_collection(collection_name=collection, schema=schema)
+
+    def write_batch(self, client, rows):
+        from milvus_loader_test import milvus_entities
+        # plain inserts even with write_mode: upsert, the collection is being filled from scratch
+        entities = milvus_entities(dict(self.config, write_mode="insert"), rows, self.row_attributes(rows))
+        client.insert(collection_name=self.table, data=entities)
+
+    def finish_load(self, client):
+        client.flush(collection_name=self.table)
+
+    def build_index(self, client):
+        index_params = client.prepare_index_params()
+        index_params.add_index(
+            field_name=self.config.get("vector_field", "embedding"),
+            index_name=self.index_name,
+            index_type="HNSW" if self.index == "hnsw" else "IVF_FLAT",
+            metric_type=MILVUS_METRICS[self.metric],
+            params=dict(self.index_params)
+        )
+        if self.attributes:
+            # scalar indexes for the filter expressions: sorted for the bucket ranges, inverted for category
+            index_params.add_index(field_name="bucket", index_name=f"{self.table}_bucket_idx", index_type="STL_SORT")
+            index_params.add_index(field_name="category", index_name=f"{self.table}_category_idx",
+                                   index_type="INVERTED")
+        client.create_index(collection_name=self.table, index_params=index_params)
+        # index building is asynchronous on the server; the build ends once no row is pending
+        while True:
+            info = client.describe_index(collection_name=self.table, index_name=self.index_name)
+            if info.get("state") == "Failed":
+                raise RuntimeError(f"Milvus index build failed: {info.get('index_state_fail_reason')}")
+            if info.get("state") == "Finished" and not info.get("pending_index_rows"):
+                return
+            time.sleep(1)
+
+    def disconnect(self, client):
+        client.close()
+
+
+LOADERS = {
+    "postgres": PostgresBulkLoader,
+    "atp": lambda config, table, **kwargs: OracleBulkLoader(config, table, target="atp", **kwargs),
+    "basedb": lambda config, table, **kwargs: OracleBulkLoader(config, table, target="basedb", **kwargs),
+    "milvus": MilvusBulkLoader,
+}
+
+
+if __name__ == '__main__':
+    import yaml
+    from abstract_loader_test import AbstractLoaderTest
+    from dataset import ClusteredGaussian, open_vectors
+
+    # synthetic:  BACKEND=postgres TABLE=bench_1m DIMENSION=1024 COUNT=1000000 INDEX=hnsw INDEX_PARAMS='{"m": 16}'
+    # from file:  BACKEND=milvus TABLE=sift1m SOURCE=sift_base.fvecs INDEX=ivf INDEX_PARAMS='{"nlist": 1024}'
+    AbstractLoaderTest.setup_logging()
+    with open("config.yaml", "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    source_path = os.environ.get("SOURCE", "synthetic")
+    if source_path == "synthetic":
+        source = ClusteredGaussian(
+            dimension=int(os.environ.get("DIMENSION", 1024)),
+            count=int(os.environ.get("COUNT", 100000)),
+            clusters=int(os.environ.get("CLUSTERS", 100)),
+            spread=float(os.environ.get("SPREAD", 0.3)),
+            seed=int(os.environ.get("SEED", 0))
+        )
+    else:
+        source = open_vectors(source_path)
+    backend = os.environ.get("BACKEND", "postgres")
+    loader = LOADERS[backend](
+        config,
+        os.environ.get("TABLE", config.get("collection_name") if backend == "milvus" else "vectorbench_synthetic"),
+        index=os.environ.get("INDEX", "hnsw"),
+        index_name=os.environ.get("INDEX_NAME"),
+        index_params=json.loads(os.environ.get("INDEX_PARAMS", "{}")),
+        metric=os.environ.get("METRIC", "cosine"),
+        workers=int(os.environ.get("WORKERS", 4)),
+        batch_rows=int(os.environ.get("BATCH_ROWS", 5000)),
+        drop_existing=os.environ.get("DROP_EXISTING", "0") == "1",
+        attributes=os.environ.get("FILTER_ATTRIBUTES", "0") == "1"
+    )
+    loader.load(source)
+    if "LOAD_RESULTS" in os.environ:
+        loader.write_json(os.environ["LOAD_RESULTS"])
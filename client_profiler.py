@@ -0,0 +1,194 @@
+import io
+import sys
+import time
+import pstats
+import logging
+import cProfile
+import threading
+from collections import Counter
+
+# innermost frames of threads that are blocked waiting for work rather than running the harness
+IDLE_MODULES = ("threading.py", "queue.py", "thread.py", "selectors.py", "base_events.py")
+# a thread is busy in a sample if it used at least this fraction of a core since the previous sample;
+# otherwise it slept (the open-loop scheduler) or was blocked, e.g. in a driver call waiting for the database
+BUSY_CPU_FRACTION = 0.25
+
+
+def thread_cpu_clock(ident):
+    """CPU-time clock of a thread of this process, None where the platform has no per-thread clocks."""
+    try:
+        return time.pthread_getcpuclockid(ident)
+    except (AttributeError, OSError):
+        return None
+
+
+class CpuMonitor:
+    """
+    Samples the CPU time of the client process every interval seconds from a background thread,
+    so that short stretches where the client pins a core are not averaged away over the whole run.
+    """
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        # fraction of one core used in every sampled interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.samples = []
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cpu-monitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        wall, cpu = time.perf_counter(), time.process_time()
+        while not self._stop.wait(self.interval):
+            now_wall, now_cpu = time.perf_counter(), time.process_time()
+            if now_wall > wall:
+                self.samples.append((now_cpu - cpu) / (now_wall - wall))
+            wall, cpu = now_wall, now_cpu
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def peak(self):
+        return max(self.samples, default=0.0)
+
+
+class ClientProfiler:
+    """
+    Profiles the harness itself while a run is in progress.
+
+    "cprofile" enables a cProfile.Profile around every operation of the worker threads (and the scheduling
+    loop); it is exact but slows the client down. "sampling" takes a stack sample of every thread every
+    interval seconds from a background thread, which costs the workers almost nothing.
+    """
+    MODES = ("cprofile", "sampling")
+
+    def __init__(self, mode, interval=0.005, top=25):
+        """
+        :param mode: "cprofile" or "sampling"
+        :param interval: Seconds between two stack samples in "sampling" mode
+        :param top: Number of functions (or stack frames) listed in the report
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown profiler '{mode}', expected one of {self.MODES}")
+        self.mode = mode
+        self.interval = interval
+        self.top = top
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._reset()
+
+    def _reset(self):
+        # a new thread-local gives every worker a fresh cProfile.Profile on its next operation
+        self._profiles = []
+        self._local = threading.local()
+        self.samples = Counter()
+        self.sample_count = 0
+        self.idle_samples = 0
+
+    def start(self):
+        """Starts profiling a run, discarding the profile of the previous run (saturation and sweep steps)."""
+        self._reset()
+        if self.mode == "sampling":
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def wrap(self, function):
+        """Returns function, profiled on the calling thread in "cprofile" mode."""
+        if self.mode != "cprofile":
+            return function
+
+        def profiled(*args, **kwargs):
+            profile = getattr(self._local, "profile", None)
+            if profile is None:
+                profile = self._local.profile = cProfile.Profile()
+                with self._lock:
+                    self._profiles.append(profile)
+            profile.enable()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.disable()
+        return profiled
+
+    def _sample(self):
+        """
+        Counts the innermost frame of every thread that keeps using the CPU after the sample was taken.
+        A Python frame alone cannot tell a thread running that line from one sleeping or blocked in a C call
+        made on it (the scheduler's time.sleep, a driver waiting for the database), so a frame is only counted
+        once the thread's CPU clock shows it busy over the following interval; without per-thread clocks only
+        the IDLE_MODULES frames count as idle.
+        """
+        own = threading.get_ident()
+        # thread ident -> (CPU clock, CPU time at the previous sample, frame seen at the previous sample)
+        pending = {}
+        wall = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, wall = now - wall, now
+            frames = sys._current_frames()
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                label = (None if code.co_filename.endswith(IDLE_MODULES)
+                         else f"{code.co_filename}:{frame.f_lineno} {code.co_name}")
+                clock, cpu, previous = pending.get(ident) or (thread_cpu_clock(ident), None, None)
+                if clock is None:
+                    self._count(label)
+                    pending[ident] = (None, None, None)
+                    continue
+                try:
+                    now_cpu = time.clock_gettime(clock)
+                except OSError:
+                    # the thread exited in the meantime
+                    continue
+                if cpu is not None:
+                    self._count(previous if now_cpu - cpu >= elapsed * BUSY_CPU_FRACTION else None)
+                pending[ident] = (clock, now_cpu, label)
+            for ident in set(pending) - set(frames):
+                del pending[ident]
+            self.sample_count += 1
+
+    def _count(self, label):
+        if label is None:
+            self.idle_samples += 1
+        else:
+            self.samples[label] += 1
+
+    def report(self):
+        if self.mode == "cprofile":
+            with self._lock:
+                profiles = list(self._profiles)
+            if not profiles:
+                return
+            out = io.StringIO()
+            stats = pstats.Stats(profiles[0], stream=out)
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.sort_stats("cumulative").print_stats(self.top)
+            logging.info("Client profile (cProfile over %d threads, by cumulative time):\n%s",
+                         len(profiles), out.getvalue())
+        elif self.samples:
+            total = sum(self.samples.values())
+            logging.info("Client profile (%d samples every %.1f ms; %d busy and %d idle thread stacks, "
+                         "busy innermost frames):", self.sample_count, self.interval * 1000, total, self.idle_samples)
+            for frame, count in self.samples.most_common(self.top):
+                logging.info("  %5.1f%% %s", count / total * 100, frame)
@@ -0,0 +1,143 @@
+import time
+import asyncio
+import logging
+import threading
+
+
+class InstrumentedPool:
+    """
+    Thread-safe front of a driver connection pool shared by the backends.
+
+    - acquire blocks (instead of failing) while all size connections are in use, and reports how long it
+      waited through on_wait, so the report can tell waiting for a connection from waiting for the database
+    - setup(conn) runs on every acquire to apply per-connection session state; it must be cheap once the
+      connection is configured
+    - warmup opens and sets up every connection before the clock starts
+    """
+
+    def __init__(self, size, acquire, release, discard=None, setup=None, on_wait=None):
+        """
+        :param size: Number of connections; acquire waits while this many are in use
+        :param acquire: Driver call returning a connection, e.g. ThreadedConnectionPool.getconn or SessionPool.acquire
+        :param release: Driver call returning a connection to its pool
+        :param discard: Driver call closing a broken connection instead of returning it (defaults to release)
+        :param setup: Per-connection session setup, called with the connection on every acquire
+        :param on_wait: Called with the seconds each acquire waited
+        """
+        self.size = size
+        self._acquire = acquire
+        self._release = release
+        self._discard = discard or release
+        self._setup = setup
+        self._on_wait = on_wait
+        self._slots = threading.BoundedSemaphore(size)
+        # usage gauges for the metrics endpoint; the lock only guards these two integers
+        self._usage_lock = threading.Lock()
+        self.in_use = 0
+        self.waiting = 0
+
+    def _count(self, in_use=0, waiting=0):
+        with self._usage_lock:
+            self.in_use += in_use
+            self.waiting += waiting
+
+    def acquire(self):
+        start = time.perf_counter()
+        self._count(waiting=1)
+        self._slots.acquire()
+        try:
+            conn = self._acquire()
+            if self._setup is not None:
+                self._setup(conn)
+        except BaseException:
+            self._slots.release()
+            self._count(waiting=-1)
+            raise
+        self._count(in_use=1, waiting=-1)
+        if self._on_wait is not None:
+            self._on_wait(time.perf_counter() - start)
+        return conn
+
+    def release(self, conn, discard=False):
+        try:
+            if discard:
+                self._discard(conn)
+            else:
+                self._release(conn)
+        finally:
+            self._count(in_use=-1)
+            self._slots.release()
+
+    def warmup(self):
+        """Acquires (opening and setting up) every connection at once, then returns them all."""
+        start = time.perf_counter()
+        on_wait, self._on_wait = self._on_wait, None
+        connections = []
+        try:
+            for _ in range(self.size):
+                connections.append(self.acquire())
+        finally:
+            for conn in connections:
+                self.release(conn)
+            self._on_wait = on_wait
+        logging.info("Warmed up %d pooled connections in %.2f seconds", len(connections), time.perf_counter() - start)
+
+
+class AsyncInstrumentedPool:
+    """asyncio counterpart of InstrumentedPool; acquire, release, discard and setup are coroutine functions."""
+
+    def __init__(self, size, acquire, release, discard=None, setup=None, on_wait=None):
+        self.size = size
+        self._acquire = acquire
+        self._release = release
+        self._discard = discard or release
+        self._setup = setup
+        self._on_wait = on_wait
+        self._slots = asyncio.Semaphore(size)
+        self.in_use = 0
+        self.waiting = 0
+
+    async def acquire(self):
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+            try:
+                conn = await self._acquire()
+                if self._setup is not None:
+                    await self._setup(conn)
+            except BaseException:
+                self._slots.release()
+                raise
+        finally:
+            self.waiting -= 1
+        self.in_use += 1
+        if self._on_wait is not None:
+            self._on_wait(time.perf_counter() - start)
+        return conn
+
+    async def release(self, conn, discard=False):
+        try:
+            if discard:
+                await self._discard(conn)
+            else:
+                await self._release(conn)
+        finally:
+            self.in_use -= 1
+            self._slots.release()
+
+    async def warmup(self):
+        """Acquires every connection concurrently, then returns them all."""
+        start = time.perf_counter()
+        on_wait, self._on_wait = self._on_wait, None
+        try:
+            results = await asyncio.gather(*(self.acquire() for _ in range(self.size)), return_exceptions=True)
+        finally:
+            self._on_wait = on_wait
+        connections = [r for r in results if not isinstance(r, BaseException)]
+        for conn in connections:
+            await self.release(conn)
+        failures = [r for r in results if isinstance(r, BaseException)]
+        if failures:
+            raise failures[0]
+        logging.info("Warmed up %d pooled connections in %.2f seconds", len(connections), time.perf_counter() - start)
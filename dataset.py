@@ -0,0 +1,106 @@
+import os
+import numpy as np
+
+# rows generated per seeded block; fixing it makes the data independent of the chunk size it is read with
+GENERATOR_BLOCK_ROWS = 65536
+
+
+class ClusteredGaussian:
+    """
+    Reproducible synthetic dataset: count vectors drawn around clusters random centres with Gaussian noise.
+
+    Real embeddings are clustered rather than uniform, which is what makes IVF partitions and HNSW graphs
+    behave as they do in production; uniform random vectors make every index look equally bad. Each block of
+    GENERATOR_BLOCK_ROWS rows has its own generator seeded from (seed, block), so any chunk can be produced
+    without generating the rows before it and the same seed always yields the same vectors.
+    """
+
+    def __init__(self, dimension, count, clusters=100, spread=0.3, normalize=True, seed=0):
+        """
+        :param dimension: Vector dimension
+        :param count: Number of vectors
+        :param clusters: Number of cluster centres
+        :param spread: Standard deviation of the noise around a centre, relative to the norm of the centres
+        :param normalize: Scale every vector to unit length (as cosine-similarity embeddings are)
+        :param seed: Seed of the centres and of every block
+        """
+        self.dimension = dimension
+        self.count = count
+        self.spread = spread
+        self.normalize = normalize
+        self.seed = seed
+        centres = np.random.default_rng([seed, 0xC3]).standard_normal((clusters, dimension), dtype=np.float32)
+        self.centres = centres / np.linalg.norm(centres, axis=1, keepdims=True)
+
+    def block(self, index):
+        start = index * GENERATOR_BLOCK_ROWS
+        rows = min(GENERATOR_BLOCK_ROWS, self.count - start)
+        rng = np.random.default_rng([self.seed, index])
+        picks = rng.integers(len(self.centres), size=rows)
+        noise = rng.standard_normal((rows, self.dimension), dtype=np.float32)
+        vectors = self.centres[picks] + noise * np.float32(self.spread / np.sqrt(self.dimension))
+        if self.normalize:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+    def chunks(self, chunk_rows):
+        """Yields (first row, float32 matrix) chunks of at most chunk_rows rows, holding one block at a time."""
+        pending, pending_start = None, 0
+        for index in range((self.count + GENERATOR_BLOCK_ROWS - 1) // GENERATOR_BLOCK_ROWS):
+            block = self.block(index)
+            pending = block if pending is None else np.concatenate([pending, block])
+            while len(pending) >= chunk_rows:
+                yield pending_start, pending[:chunk_rows]
+                pending, pending_start = pending[chunk_rows:], pending_start + chunk_rows
+        if pending is not None and len(pending):
+            yield pending_start, pending
+
+
+class NpyVectors:
+    """(count, dimension) matrix in a .npy file, memory-mapped so that only the chunk being loaded is in memory."""
+
+    def __init__(self, path):
+        self.path = path
+        self.vectors = np.load(path, mmap_mode="r")
+        if self.vectors.ndim != 2:
+            raise ValueError(f"{path}: expected a 2-dimensional array, got shape {self.vectors.shape}")
+        self.count, self.dimension = self.vectors.shape
+
+    def chunks(self, chunk_rows):
+        for start in range(0, self.count, chunk_rows):
+            yield start, np.asarray(self.vectors[start:start + chunk_rows], dtype=np.float32)
+
+
+class FvecsVectors:
+    """
+    .fvecs file (the TEXMEX / ANN benchmark format): every vector is an int32 dimension followed by that many
+    float32 values. Memory-mapped like NpyVectors.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        raw = np.memmap(path, dtype=np.int32, mode="r")
+        if not len(raw):
+            raise ValueError(f"{path}: empty file")
+        self.dimension = int(raw[0])
+        if self.dimension <= 0 or len(raw) % (self.dimension + 1):
+            raise ValueError(f"{path}: not an .fvecs file (dimension {self.dimension}, {len(raw)} words)")
+        self.count = len(raw) // (self.dimension + 1)
+        self._rows = raw.reshape(self.count, self.dimension + 1)
+
+    def chunks(self, chunk_rows):
+        for start in range(0, self.count, chunk_rows):
+            rows = self._rows[start:start + chunk_rows]
+            if (rows[:, 0] != self.dimension).any():
+                raise ValueError(f"{self.path}: inconsistent dimensions near row {start}")
+            yield start, np.array(rows[:, 1:]).view(np.float32)
+
+
+def open_vectors(path):
+    """NpyVectors or FvecsVectors, by file extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        return NpyVectors(path)
+    if extension == ".fvecs":
+        return FvecsVectors(path)
+    raise ValueError(f"Unsupported vector file '{path}', expected .npy or .fvecs")
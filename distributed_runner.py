@@ -0,0 +1,368 @@
+import os
+import json
+import time
+import logging
+import threading
+import importlib
+import traceback
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from abstract_loader_test import AbstractLoaderTest, log_load_stats
+from load_stats import LoadStats
+from run_history import record_run
+from multiprocess_runner import split_tps, worker_tester_kwargs, close_tester
+
+
+def load_tester_class(path):
+    """Imports an AbstractLoaderTest subclass given as "module:Class"."""
+    module_name, class_name = path.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+class WorkerAgent:
+    """
+    Runs the test plans of a DistributedLoadTest coordinator on this host, one at a time.
+
+    The coordinator talks to the agent over HTTP with JSON bodies:
+    - POST /prepare builds the tester of a plan and warms up its connection pool
+    - POST /start runs the load once the agent's clock reaches start_at (epoch seconds)
+    - GET /stats returns the state of the plan with its live (or, once done, final) LoadStats
+    - GET /time returns the agent's clock, sampled by the coordinator to correct start_at for clock offsets
+    - POST /close closes the tester
+    """
+
+    def __init__(self, port=9500, host="127.0.0.1"):
+        """
+        :param port: TCP port, 0 to pick a free one (see self.port once started)
+        :param host: Interface to bind; use "0.0.0.0" to accept a coordinator on another host
+        """
+        self.host = host
+        self.port = port
+        self.tester = None
+        # idle -> ready -> running -> done (or failed at any step)
+        self.state = "idle"
+        self.stats = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._server = None
+
+    def prepare(self, plan):
+        with self._lock:
+            if self.state in ("ready", "running"):
+                raise RuntimeError(f"Agent is busy ({self.state})")
+            self._close_tester()
+            self.state, self.stats, self.error = "preparing", None, None
+        try:
+            tester_class = load_tester_class(plan["tester"])
+            self.tester = tester_class(tps=plan["tps"], duration=plan["duration"], timeout=plan["timeout"],
+                                       **worker_tester_kwargs(plan["tester_kwargs"], plan["index"], plan["agents"]))
+            self.tester.warmup()
+        except Exception:
+            self.state, self.error = "failed", traceback.format_exc()
+            raise
+        self.state = "ready"
+        logging.info("Prepared plan %d: %s at %d TPS for %d s", plan["index"], plan["tester"], plan["tps"],
+                     plan["duration"])
+
+    def start(self, start_at):
+        with self._lock:
+            if self.state != "ready":
+                raise RuntimeError(f"Agent cannot start from state '{self.state}'")
+            self.state = "running"
+        threading.Thread(target=self._run, args=(start_at,), name="agent-run", daemon=True).start()
+
+    def _run(self, start_at):
+        delay = start_at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            self.stats = self.tester.run_load()
+            self.state = "done"
+        except Exception:
+            self.error = traceback.format_exc()
+            self.state = "failed"
+            logging.error("Load failed: %s", self.error)
+
+    def status(self):
+        stats = self.stats
+        if stats is None and self.state == "running":
+            stats = self.tester.live_stats()
+        return {"state": self.state, "error": self.error, "stats": None if stats is None else stats.to_dict()}
+
+    def close(self):
+        with self._lock:
+            self._close_tester()
+            if self.state != "running":
+                self.state = "idle"
+
+    def _close_tester(self):
+        if self.tester is not None and self.state != "running":
+            close_tester(self.tester)
+            self.tester = None
+
+    def start_server(self):
+        agent = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/stats":
+                    self._reply(200, agent.status())
+                elif self.path == "/time":
+                    self._reply(200, {"time": time.time()})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                try:
+                    if self.path == "/prepare":
+                        agent.prepare(body)
+                        self._reply(200, {"state": agent.state})
+                    elif self.path == "/start":
+                        agent.start(body["start_at"])
+                        self._reply(202, {"state": agent.state})
+                    elif self.path == "/close":
+                        agent.close()
+                        self._reply(200, {"state": agent.state})
+                    else:
+                        self.send_error(404)
+                except Exception as e:
+                    self._reply(409 if isinstance(e, RuntimeError) else 500,
+                                {"state": agent.state, "error": agent.error or traceback.format_exc()})
+
+            def _reply(self, code, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logging.debug("Agent endpoint: " + format, *args)
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        logging.info("Worker agent listening on http://%s:%d", self.host, self.port)
+        return self
+
+    def serve_forever(self):
+        try:
+            self._server.serve_forever()
+        finally:
+            self.close()
+            self._server.server_close()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+
+class AgentError(Exception):
+    """Raised by the coordinator when a worker agent rejects or fails a request."""
+
+
+def _request(url, payload=None, timeout=10):
+    data = None if payload is None else json.dumps(payload).encode("utf-8")
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        body = json.loads(e.read() or b"{}")
+        raise AgentError(body.get("error") or f"HTTP {e.code}") from e
+
+
+class DistributedLoadTest:
+    """
+    Coordinator that spreads the target TPS of an AbstractLoaderTest subclass across WorkerAgents
+    on other hosts (or several on one host), starts them in step and merges their statistics into one report.
+    """
+
+    def __init__(self, tester, agents, tps, duration, timeout, startup_timeout=300, start_delay=2.0,
+                 progress_interval=5.0, clock_samples=5, **tester_kwargs):
+        """
+        :param tester: "module:Class" of the AbstractLoaderTest subclass, importable on every agent
+        :param agents: Agent addresses as "host:port"
+        :param tps: Total number of operations per second across all agents
+        :param startup_timeout: Seconds to wait for every agent to build its tester and warm up its pool
+        :param start_delay: Seconds between the end of the preparation and the common start time
+        :param progress_interval: Seconds between progress log lines merged from the agents' live statistics
+        :param clock_samples: GET /time round trips per agent; the offset comes from the fastest one
+        :param tester_kwargs: Additional JSON-serialisable keyword arguments for the tester (e.g. word, schedule)
+        """
+        self.tester = tester
+        self.agents = [f"http://{agent}" for agent in agents][:max(1, tps)]
+        self.tps = tps
+        self.duration = duration
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.start_delay = start_delay
+        self.progress_interval = progress_interval
+        self.clock_samples = clock_samples
+        self.tester_kwargs = tester_kwargs
+        self.stats = None
+
+    def tps_shares(self):
+        return split_tps(self.tps, len(self.agents))
+
+    def run_test(self):
+        self.run_load()
+        self.report_results()
+        history_db = self.tester_kwargs.get("history_db")
+        if history_db:
+            config = dict(self.tester_kwargs, tps=self.tps, duration=self.duration, timeout=self.timeout,
+                          agents=len(self.agents))
+            config.pop("history_db")
+            label = config.pop("run_label", None)
+            record_run(history_db, self.stats, self.tester.split(":")[1], config, label)
+
+    def run_load(self):
+        with ThreadPoolExecutor(max_workers=len(self.agents)) as executor:
+            try:
+                offsets = list(executor.map(self._prepare, range(len(self.agents)), self.tps_shares()))
+                start_at = time.time() + self.start_delay
+                # each agent starts when its own clock reads start_at plus its offset from ours
+                list(executor.map(lambda agent, offset: _request(f"{agent}/start", {"start_at": start_at + offset}),
+                                  self.agents, offsets))
+                logging.info("Started %d agents for %d TPS (%s)", len(self.agents), self.tps, self.tps_shares())
+                self.stats = self._collect(start_at)
+            finally:
+                list(executor.map(self._close, self.agents))
+        return self.stats
+
+    def _prepare(self, index, tps):
+        plan = {"index": index, "agents": len(self.agents), "tester": self.tester, "tps": tps,
+                "duration": self.duration, "timeout": self.timeout, "tester_kwargs": self.tester_kwargs}
+        _request(f"{self.agents[index]}/prepare", plan, timeout=self.startup_timeout)
+        offset, round_trip = self._clock_offset(self.agents[index])
+        logging.info("Agent %s ready (clock offset %+.1f ms, +/- %.1f ms)", self.agents[index], offset * 1000,
+                     round_trip / 2 * 1000)
+        return offset
+
+    def _clock_offset(self, agent):
+        """
+        Offset of the agent's clock from ours, from the GET /time round trip that took the least time:
+        the agent read its clock somewhere within that round trip, so its midpoint is off by at most half of it.
+        :return: (offset, round trip) in seconds
+        """
+        samples = []
+        for _ in range(self.clock_samples):
+            sent = time.time()
+            reply = _request(f"{agent}/time")
+            received = time.time()
+            samples.append((received - sent, reply["time"] - (sent + received) / 2))
+        round_trip, offset = min(samples)
+        return offset, round_trip
+
+    def _collect(self, start_at):
+        """Polls the agents until every one has finished, logging merged progress, and merges the final stats."""
+        deadline = start_at + self.duration + self.timeout * 2 + 30
+        last_progress = time.time()
+        while True:
+            time.sleep(1)
+            statuses = [self._status(agent) for agent in self.agents]
+            finished = all(status["state"] in ("done", "failed") for status in statuses)
+            if finished or time.time() > deadline:
+                break
+            if time.time() >= start_at and time.time() - last_progress >= self.progress_interval:
+                last_progress = time.time()
+                live = self._merge(statuses)
+                logging.info("Progress: %d sent, %d succeeded, %d failed, p99 %s ms",
+                             live.counters["sent"], live.counters["success"],
+                             live.counters["errors"] + live.counters["timeouts"],
+                             "-" if not live.latency.count else f"{live.latency.percentile(99) * 1000:.2f}")
+        failures = 0
+        for agent, status in zip(self.agents, statuses):
+            if status["state"] != "done":
+                failures += 1
+                logging.error("Agent %s failed: %s", agent, status["error"] or f"still {status['state']}")
+        if failures:
+            logging.warning("%d of %d agents failed; results cover the remaining agents", failures, len(self.agents))
+        return self._merge([status for status in statuses if status["state"] == "done"])
+
+    def _status(self, agent):
+        try:
+            return _request(f"{agent}/stats")
+        except (AgentError, OSError) as e:
+            return {"state": "unreachable", "error": str(e), "stats": None}
+
+    @staticmethod
+    def _merge(statuses):
+        stats = LoadStats()
+        for status in statuses:
+            if status["stats"] is not None:
+                stats.merge(LoadStats.from_dict(status["stats"]))
+        return stats
+
+    def _close(self, agent):
+        try:
+            _request(f"{agent}/close", {})
+        except (AgentError, OSError) as e:
+            logging.warning("Could not close agent %s: %s", agent, e)
+
+    def report_results(self):
+        log_load_stats(
+            self.stats,
+            self.tester_kwargs.get("schedule", "burst"),
+            self.duration,
+            self.tester_kwargs.get("late_threshold", 0.005),
+            self.tester_kwargs.get("recall_k", 4)
+        )
+        logging.info("Worker agents: %d", len(self.agents))
+
+
+if __name__ == '__main__':
+    import sys
+    import inspect
+
+    AbstractLoaderTest.setup_logging()
+    if sys.argv[1:] == ["agent"]:
+        agent = WorkerAgent(port=int(os.environ.get("AGENT_PORT", 9500)),
+                            host=os.environ.get("AGENT_HOST", "127.0.0.1"))
+        agent.start_server().serve_forever()
+        sys.exit()
+
+    tester_path = os.environ.get("TESTER", "oci_postgres_load_test:OCI_Postgres_LoadTest")
+    word = os.environ.get("WORD", "サヴォワ地方はどこの国？")
+    word_arg = "query" if "query" in inspect.signature(load_tester_class(tester_path)).parameters else "word"
+
+    tester = DistributedLoadTest(
+        tester_path,
+        agents=os.environ["AGENTS"].split(","),
+        tps=int(os.environ.get("TPS", 10)),
+        duration=int(os.environ.get("DURATION", 3)),
+        timeout=int(os.environ.get("TIMEOUT", 10)),
+        schedule=os.environ.get("SCHEDULE", "burst"),
+        query_file=os.environ.get("QUERY_FILE"),
+        query_order=os.environ.get("QUERY_ORDER", "rotate"),
+        ground_truth_dir=os.environ.get("GROUND_TRUTH_DIR"),
+        vector_binding=os.environ.get("VECTOR_BINDING", "binary"),
+        result_file=os.environ.get("RESULT_FILE"),
+        metrics_port=int(os.environ["METRICS_PORT"]) if "METRICS_PORT" in os.environ else None,
+        write_ratio=float(os.environ.get("WRITE_RATIO", 0)),
+        write_batch_size=int(os.environ.get("WRITE_BATCH_SIZE", 100)),
+        history_db=os.environ.get("HISTORY_DB"),
+        run_label=os.environ.get("RUN_LABEL"),
+        profile=os.environ.get("PROFILE"),
+        search_batch_size=int(os.environ.get("SEARCH_BATCH_SIZE", 1)),
+        trace_file=os.environ.get("TRACE_FILE"),
+        trace_speedup=float(os.environ.get("TRACE_SPEEDUP", 1.0)),
+        trace_start=os.environ.get("TRACE_START"),
+        trace_end=os.environ.get("TRACE_END"),
+        trace_window=int(os.environ.get("TRACE_WINDOW", 60)),
+        filter_selectivities=([float(s) for s in os.environ["FILTER_SELECTIVITIES"].split(",")]
+                              if "FILTER_SELECTIVITIES" in os.environ else None),
+        filter_attribute=os.environ.get("FILTER_ATTRIBUTE", "bucket"),
+        query_cache=os.environ.get("QUERY_CACHE"),
+        cache_threshold=float(os.environ.get("CACHE_THRESHOLD", 0.95)),
+        cache_max_entries=int(os.environ.get("CACHE_MAX_ENTRIES", 10000)),
+        cache_max_bytes=int(float(os.environ.get("CACHE_MAX_MB", 64)) * 1024 * 1024),
+        cache_ttl=float(os.environ["CACHE_TTL"]) if "CACHE_TTL" in os.environ else None,
+        fetch_mode=os.environ.get("FETCH_MODE", "text"),
+        **{word_arg: word}
+    )
+    tester.run_test()
@@ -0,0 +1,102 @@
+from collections import namedtuple
+import numpy as np
+
+# bucket: uniform integer in [0, BUCKETS), so "bucket < n" matches n / BUCKETS of the rows (range predicates)
+BUCKETS = 10000
+# category: Zipf-distributed integer in [0, CATEGORIES), category k holding a share proportional to 1 / (k + 1)
+# (equality predicates, from 19% of the rows for category 0 down to 0.19% for category 99)
+CATEGORIES = 100
+ATTRIBUTES = ("bucket", "category")
+ATTRIBUTE_SEED = 20250401
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def category_shares():
+    weights = 1.0 / np.arange(1, CATEGORIES + 1)
+    return weights / weights.sum()
+
+
+_CATEGORY_CDF = np.cumsum(category_shares())
+
+
+def _coefficients(dimension):
+    rng = np.random.default_rng(ATTRIBUTE_SEED + dimension)
+    return rng.integers(1, 2 ** 63, size=dimension, dtype=np.uint64) | np.uint64(1)
+
+
+def attribute_values(vectors):
+    """
+    Filter attributes of rows, derived from a hash of the float32 bits of their vectors.
+
+    Because the values are a function of the vector alone, the bulk loader, the ground truth (computed from a
+    vector export) and the in-process backend agree on them without storing or exporting anything else.
+    :param vectors: (n, dimension) matrix
+    :return: dict attribute -> int32 array of n values
+    """
+    bits = np.ascontiguousarray(vectors, dtype=np.float32).view(np.uint32).astype(np.uint64)
+    with np.errstate(over="ignore"):
+        # multiply-add hash over the components (wrapping mod 2**64), finished with the splitmix64 mixer
+        h = bits @ _coefficients(bits.shape[1])
+        h ^= h >> np.uint64(30)
+        h = (h * np.uint64(0xBF58476D1CE4E5B9)) & _MASK64
+        h ^= h >> np.uint64(27)
+        h = (h * np.uint64(0x94D049BB133111EB)) & _MASK64
+        h ^= h >> np.uint64(31)
+    uniform = (h >> np.uint64(11)).astype(np.float64) / float(2 ** 53)
+    return {
+        "bucket": (h % np.uint64(BUCKETS)).astype(np.int32),
+        "category": np.minimum(np.searchsorted(_CATEGORY_CDF, uniform, side="right"), CATEGORIES - 1).astype(np.int32),
+    }
+
+
+class SearchFilter(namedtuple("SearchFilter", ["attribute", "operator", "value", "selectivity"])):
+    """
+    A metadata predicate added to a vector search: "bucket < value" or "category = value".
+    selectivity is the expected fraction of rows it matches, from the known distribution of the attribute.
+    """
+
+    @property
+    def name(self):
+        """Identifier usable in statement and file names."""
+        return f"{self.attribute}_{'lt' if self.operator == '<' else 'eq'}_{self.value}"
+
+    @property
+    def label(self):
+        return f"{self.selectivity * 100:.3g}% ({self.sql()})"
+
+    def sql(self, alias=None):
+        """SQL predicate; the value is an integer written as a literal, so the planner estimates its selectivity."""
+        column = f"{alias}.{self.attribute}" if alias else self.attribute
+        return f"{column} {self.operator} {int(self.value)}"
+
+    def milvus(self):
+        """Milvus boolean filter expression."""
+        return f"{self.attribute} {'==' if self.operator == '=' else self.operator} {int(self.value)}"
+
+    def mask(self, attributes):
+        """Boolean array of the rows matching the filter, from attribute_values."""
+        values = attributes[self.attribute]
+        return values < self.value if self.operator == "<" else values == self.value
+
+
+def make_filter(attribute, selectivity):
+    """
+    Filter on attribute matching about selectivity (0-1) of the rows, or None (no filter) for a selectivity of 1.
+    "bucket" matches any multiple of 0.01% exactly; "category" picks the category whose share is closest.
+    """
+    if selectivity >= 1:
+        return None
+    if selectivity <= 0:
+        raise ValueError(f"Filter selectivity must be above 0, got {selectivity}")
+    if attribute == "bucket":
+        value = max(1, round(selectivity * BUCKETS))
+        return SearchFilter("bucket", "<", value, value / BUCKETS)
+    if attribute == "category":
+        shares = category_shares()
+        value = int(np.argmin(np.abs(np.log(shares / selectivity))))
+        return SearchFilter("category", "=", value, float(shares[value]))
+    raise ValueError(f"Unknown filter attribute '{attribute}', expected one of {ATTRIBUTES}")
+
+
+def filter_label(search_filter):
+    return "unfiltered" if search_filter is None else search_filter.label
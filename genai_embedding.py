@@ -0,0 +1,41 @@
+from oci.config import from_file
+from oci.auth.signers.instance_principals_security_token_signer import InstancePrincipalsSecurityTokenSigner
+from oci.generative_ai_inference import GenerativeAiInferenceClient
+from oci.generative_ai_inference.models import EmbedTextDetails, OnDemandServingMode
+
+DEFAULT_MODEL_ID = "cohere.embed-multilingual-v3.0"
+
+
+def embedding_model_id(config):
+    return config.get("emb_llm_id", DEFAULT_MODEL_ID)
+
+
+def create_genai_client(config, instance_principal=False):
+    """
+    :param config: Test configuration (config.yaml) providing service_endpoint
+    :param instance_principal: Authenticate with the instance principal instead of ~/.oci/config
+    """
+    if instance_principal:
+        return GenerativeAiInferenceClient(
+            config={},
+            signer=InstancePrincipalsSecurityTokenSigner(),
+            service_endpoint=config["service_endpoint"]
+        )
+    return GenerativeAiInferenceClient(config=from_file(), service_endpoint=config["service_endpoint"])
+
+
+def embed_texts(config, texts, instance_principal=False, **details):
+    """
+    Embeds texts with OCI GenAI and returns one vector per text.
+    Extra keyword arguments (e.g. input_type, truncate) are passed to EmbedTextDetails.
+    """
+    client = create_genai_client(config, instance_principal)
+    result = client.embed_text(
+        embed_text_details=EmbedTextDetails(
+            inputs=list(texts),
+            serving_mode=OnDemandServingMode(model_id=embedding_model_id(config)),
+            compartment_id=config["compartment_id"],
+            **details
+        )
+    )
+    return result.data.embeddings
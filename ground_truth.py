@@ -0,0 +1,205 @@
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+from filtered_workload import attribute_values
+
+METRICS = ("cosine", "l2", "ip")
+
+
+class VectorExportWriter:
+    """
+    Streams (id, vector) batches exported from a vector store to disk: vectors.f32 holds the raw float32 rows,
+    ids.txt the matching ids (one per line) and meta.json the shape and a digest of the content.
+    Ground truths cached in the directory by an earlier export are deleted.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.startswith("ground_truth_") and name.endswith(".npy"):
+                os.remove(os.path.join(directory, name))
+        self._digest = hashlib.sha256()
+        self._vectors = open(os.path.join(directory, "vectors.f32"), "wb")
+        self._ids = open(os.path.join(directory, "ids.txt"), "w", encoding="utf-8")
+        self.dimension = None
+        self.count = 0
+
+    def write(self, ids, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dimension is None:
+            self.dimension = int(vectors.shape[1])
+        ids = [f"{i}\n" for i in ids]
+        data = vectors.tobytes()
+        self._vectors.write(data)
+        self._ids.writelines(ids)
+        self._digest.update(data)
+        self._digest.update("".join(ids).encode("utf-8"))
+        self.count += len(vectors)
+
+    def close(self):
+        self._vectors.close()
+        self._ids.close()
+        with open(os.path.join(self.directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"dimension": self.dimension, "count": self.count,
+                       "digest": self._digest.hexdigest()}, f)
+        logging.info("Exported %d vectors (dimension %s) to %s", self.count, self.dimension, self.directory)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class VectorExport:
+    """Read side of a VectorExportWriter directory; vectors are memory-mapped and read chunk by chunk."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.dimension = meta["dimension"]
+        self.count = meta["count"]
+        self.digest = meta.get("digest")
+        self.vectors = np.memmap(os.path.join(directory, "vectors.f32"), dtype=np.float32, mode="r",
+                                 shape=(self.count, self.dimension))
+
+    def fingerprint(self):
+        """Identifies the exported content in ground-truth cache names, so that a re-export invalidates them."""
+        if self.digest is not None:
+            return f"n{self.count}_{self.digest[:16]}"
+        # exports written before the digest was recorded
+        stat = os.stat(os.path.join(self.directory, "vectors.f32"))
+        return f"n{self.count}_{stat.st_size}_{stat.st_mtime_ns}"
+
+    def ids(self):
+        with open(os.path.join(self.directory, "ids.txt"), "r", encoding="utf-8") as f:
+            return [line.rstrip("\n") for line in f]
+
+    def chunks(self, chunk_rows):
+        for start in range(0, self.count, chunk_rows):
+            yield start, np.array(self.vectors[start:start + chunk_rows])
+
+
+def _scores(queries, chunk, metric):
+    """Returns a (queries, chunk) matrix where larger means closer."""
+    if metric == "l2":
+        return 2 * queries @ chunk.T - (chunk * chunk).sum(axis=1)[None, :]
+    if metric == "cosine":
+        norms = np.linalg.norm(chunk, axis=1)
+        norms[norms == 0] = 1
+        chunk = chunk / norms[:, None]
+    return queries @ chunk.T
+
+
+def exact_top_k(queries, export, k, metric="cosine", memory_budget=256 * 1024 * 1024, search_filter=None):
+    """
+    Brute-force exact top-k over an exported table, streaming the table from disk chunk by chunk.
+    :param queries: (n, dimension) query matrix
+    :param export: VectorExport to search
+    :param k: Number of neighbours per query
+    :param metric: "cosine", "l2" or "ip"
+    :param memory_budget: Approximate bytes used for one chunk of scores
+    :param search_filter: Optional SearchFilter; only the rows matching it are candidates
+    :return: (n, k) int64 matrix of row numbers in the export, nearest first (-1 if fewer than k rows match)
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric '{metric}', expected one of {METRICS}")
+    queries = np.asarray(queries, dtype=np.float32)
+    if metric == "cosine":
+        norms = np.linalg.norm(queries, axis=1)
+        norms[norms == 0] = 1
+        queries = queries / norms[:, None]
+    n = len(queries)
+    chunk_rows = max(k, memory_budget // (4 * max(n, 1)))
+    best_scores = np.full((n, k), -np.inf, dtype=np.float32)
+    best_rows = np.full((n, k), -1, dtype=np.int64)
+    for start, chunk in export.chunks(chunk_rows):
+        scores = _scores(queries, chunk, metric)
+        if search_filter is not None:
+            scores[:, ~search_filter.mask(attribute_values(chunk))] = -np.inf
+        take = min(k, scores.shape[1])
+        part = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+        candidate_scores = np.concatenate([best_scores, np.take_along_axis(scores, part, axis=1)], axis=1)
+        candidate_rows = np.concatenate([best_rows, part + start], axis=1)
+        keep = np.argpartition(-candidate_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(candidate_scores, keep, axis=1)
+        best_rows = np.take_along_axis(candidate_rows, keep, axis=1)
+        logging.debug("Ground truth: scanned %d / %d vectors", min(start + chunk_rows, export.count), export.count)
+    best_rows[np.isneginf(best_scores)] = -1
+    order = np.argsort(-best_scores, axis=1)
+    return np.take_along_axis(best_rows, order, axis=1)
+
+
+class GroundTruth:
+    """
+    Exact top-k neighbour ids of every query of a QuerySet, used to compute recall@k of the ids a backend returns.
+    """
+
+    def __init__(self, neighbour_ids, k):
+        self.neighbour_ids = neighbour_ids
+        self.k = k
+
+    @classmethod
+    def load_or_compute(cls, query_set, export_dir, k, metric="cosine", search_filter=None):
+        """
+        Computes the ground truth of query_set against the export in export_dir, caching it next to the export.
+        :param search_filter: Optional SearchFilter restricting the neighbours to the rows matching it
+        """
+        export = VectorExport(export_dir)
+        digest = hashlib.sha256("\n".join(query_set.texts).encode("utf-8")).hexdigest()[:16]
+        suffix = "" if search_filter is None else f"_{search_filter.name}"
+        cache_path = os.path.join(export_dir,
+                                  f"ground_truth_{metric}_k{k}_{digest}_{export.fingerprint()}{suffix}.npy")
+        if os.path.exists(cache_path):
+            rows = np.load(cache_path)
+        else:
+            logging.info("Computing exact top-%d for %d queries over %d vectors (%s%s)", k, len(query_set),
+                         export.count, metric, "" if search_filter is None else ", where " + search_filter.sql())
+            queries = np.asarray(query_set.matrix[query_set.rows], dtype=np.float32)
+            rows = exact_top_k(queries, export, k, metric, search_filter=search_filter)
+            np.save(cache_path, rows)
+        ids = export.ids()
+        neighbour_ids = [[ids[r] for r in query_rows if r >= 0] for query_rows in rows]
+        return cls(neighbour_ids, k)
+
+    def recall(self, query_index, returned_ids):
+        """Fraction of the true top-k found among the first k returned ids."""
+        expected = self.neighbour_ids[query_index]
+        if not expected:
+            return None
+        found = {str(i) for i in list(returned_ids)[:self.k]}
+        return len(found.intersection(expected)) / len(expected)
+
+
+if __name__ == '__main__':
+    import importlib
+    import inspect
+    from abstract_loader_test import AbstractLoaderTest
+
+    # export the table of a backend:  STEP=export TESTER=oci_postgres_load_test:OCI_Postgres_LoadTest EXPORT_DIR=...
+    # compute the ground truth:       STEP=compute TESTER=... QUERY_FILE=queries.txt EXPORT_DIR=... K=4
+    AbstractLoaderTest.setup_logging()
+    module_name, class_name = os.environ.get("TESTER", "oci_postgres_load_test:OCI_Postgres_LoadTest").split(":")
+    tester_class = getattr(importlib.import_module(module_name), class_name)
+    word = os.environ.get("WORD", "サヴォワ地方はどこの国？")
+    word_arg = "query" if "query" in inspect.signature(tester_class).parameters else "word"
+    export_dir = os.environ.get("EXPORT_DIR", "vector_export")
+
+    tester = tester_class(
+        tps=1,
+        duration=1,
+        timeout=int(os.environ.get("TIMEOUT", 600)),
+        query_file=os.environ.get("QUERY_FILE"),
+        **{word_arg: word}
+    )
+    if os.environ.get("STEP", "export") == "export":
+        with VectorExportWriter(export_dir) as writer:
+            for ids, vectors in tester.iter_vectors():
+                writer.write(ids, vectors)
+    else:
+        GroundTruth.load_or_compute(tester.query_set, export_dir, int(os.environ.get("K", 4)),
+                                    os.environ.get("METRIC", tester.distance_metric))
@@ -0,0 +1,364 @@
+import math
+
+# precision bits of the per-window latency histograms of a trace replay
+WINDOW_HISTOGRAM_BITS = 6
+
+
+class LatencyHistogram:
+    """
+    Fixed-memory, log-bucketed latency histogram in the style of HdrHistogram.
+
+    Latencies are recorded as integer microseconds. Values below 2**sub_bucket_bits are
+    counted exactly; above that every power-of-two range is split into 2**(sub_bucket_bits - 1)
+    linear buckets, which bounds the relative error of any reported percentile to
+    1 / 2**(sub_bucket_bits - 1) (under 0.8% with the default of 8 bits).
+    """
+
+    def __init__(self, sub_bucket_bits=8, max_value_us=3600 * 1000 * 1000):
+        """
+        :param sub_bucket_bits: Number of bits of precision kept for each recorded value
+        :param max_value_us: Largest trackable value in microseconds; larger values are clamped
+        """
+        self.sub_bucket_bits = sub_bucket_bits
+        self.max_value_us = max_value_us
+        self._linear = 1 << sub_bucket_bits
+        self._half = self._linear >> 1
+        max_shift = max(0, max_value_us.bit_length() - sub_bucket_bits)
+        self.counts = [0] * (self._linear + max_shift * self._half)
+        self.count = 0
+        self.sum_us = 0
+        self.min_us = None
+        self.max_us = 0
+
+    def _index(self, value_us):
+        if value_us < self._linear:
+            return value_us
+        shift = value_us.bit_length() - self.sub_bucket_bits
+        return self._linear + (shift - 1) * self._half + ((value_us >> shift) - self._half)
+
+    def _bucket_bounds(self, index):
+        if index < self._linear:
+            return index, index
+        shift, offset = divmod(index - self._linear, self._half)
+        shift += 1
+        mantissa = offset + self._half
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def record(self, seconds):
+        """Records one latency given in seconds."""
+        value_us = min(max(int(seconds * 1_000_000), 0), self.max_value_us)
+        self.counts[self._index(value_us)] += 1
+        self.count += 1
+        self.sum_us += value_us
+        if self.min_us is None or value_us < self.min_us:
+            self.min_us = value_us
+        if value_us > self.max_us:
+            self.max_us = value_us
+
+    def merge(self, other):
+        if len(other.counts) != len(self.counts) or other.sub_bucket_bits != self.sub_bucket_bits:
+            raise ValueError("Cannot merge histograms with different bucket layouts")
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        self.count += other.count
+        self.sum_us += other.sum_us
+        if other.min_us is not None and (self.min_us is None or other.min_us < self.min_us):
+            self.min_us = other.min_us
+        self.max_us = max(self.max_us, other.max_us)
+        return self
+
+    def percentile(self, p):
+        """Returns the p-th percentile (0-100) in seconds, or None if nothing was recorded."""
+        if not self.count:
+            return None
+        target = max(1, math.ceil(self.count * p / 100.0))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if not c:
+                continue
+            seen += c
+            if seen >= target:
+                low, high = self._bucket_bounds(i)
+                value = min((low + high) / 2.0, self.max_us)
+                return max(value, self.min_us) / 1_000_000
+        return self.max_us / 1_000_000
+
+    @property
+    def mean(self):
+        return self.sum_us / self.count / 1_000_000 if self.count else None
+
+    @property
+    def max(self):
+        return self.max_us / 1_000_000 if self.count else None
+
+    def buckets(self):
+        """Yields (upper bound in seconds, count) for every non-empty bucket in ascending order."""
+        for i, c in enumerate(self.counts):
+            if c:
+                yield self._bucket_bounds(i)[1] / 1_000_000, c
+
+    def to_dict(self):
+        return {
+            "sub_bucket_bits": self.sub_bucket_bits,
+            "max_value_us": self.max_value_us,
+            "counts": {i: c for i, c in enumerate(self.counts) if c},
+            "count": self.count,
+            "sum_us": self.sum_us,
+            "min_us": self.min_us,
+            "max_us": self.max_us,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        hist = cls(data["sub_bucket_bits"], data["max_value_us"])
+        for i, c in data["counts"].items():
+            hist.counts[int(i)] = c
+        hist.count = data["count"]
+        hist.sum_us = data["sum_us"]
+        hist.min_us = data["min_us"]
+        hist.max_us = data["max_us"]
+        return hist
+
+
+class LoadStats:
+    """
+    Counters, latency histogram and per-second time series of one worker (or of a whole run once merged).
+    Instances are only ever written by a single thread, so recording needs no locking.
+    """
+    # queries: query vectors searched by successful operations, more than success with batched searches
+    # fetched: those of them answered by the backend (not the query cache), which returned result_bytes
+    COUNTERS = ("sent", "success", "errors", "timeouts", "discarded", "late", "vector_bytes", "queries", "fetched",
+                "result_bytes")
+    WRITE_COUNTERS = ("success", "errors", "timeouts", "rows")
+
+    def __init__(self):
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        # wall-clock seconds from the first scheduled send until the last completion
+        self.elapsed = 0.0
+        # CPU seconds used by the client process(es) during the run
+        self.client_cpu = 0.0
+        # highest CPU use of a client process over one sampling interval, as a fraction of one core
+        self.client_cpu_peak = 0.0
+        self.latency = LatencyHistogram()
+        # time spent waiting for a pooled connection, part of latency
+        self.pool_wait = LatencyHistogram()
+        # delay between the scheduled send time and the start of the operation on a worker (harness lag)
+        self.send_lag = LatencyHistogram()
+        # second offset -> [operations, errors, latency sum (s), latency max (s)]
+        self.series = {}
+        self.recall_sum = 0.0
+        self.recall_count = 0
+        # bulk writes of a mixed read/write workload, kept apart from the search counters and latency
+        self.write_counters = dict.fromkeys(self.WRITE_COUNTERS, 0)
+        self.write_latency = LatencyHistogram()
+        # trace replay: window -> [operations, errors, latency histogram], windows being window_size seconds
+        # of trace time from window_origin (epoch seconds), replayed window_speedup times faster
+        self.windows = {}
+        self.window_size = None
+        self.window_origin = None
+        self.window_speedup = 1.0
+        # filtered workload: filter label -> [selectivity, operations, errors, latency histogram, recall sum,
+        # recall count]
+        self.filters = {}
+        # query cache: "exact", "semantic" (hits) or "miss" -> [operations, errors, latency histogram, recall sum,
+        # recall count]
+        self.cache = {}
+
+    def record(self, second, latency, outcome="success", late=False):
+        """
+        :param second: Whole seconds since the start of the test at which the operation completed
+        :param latency: Latency in seconds, measured from the scheduled send time
+        :param outcome: "success", "errors" or "timeouts"
+        :param late: Whether the send started behind its schedule
+        """
+        self.counters[outcome] += 1
+        if late:
+            self.counters["late"] += 1
+        point = self.series.get(second)
+        if point is None:
+            point = self.series[second] = [0, 0, 0.0, 0.0]
+        point[0] += 1
+        if outcome == "success":
+            self.latency.record(latency)
+            point[2] += latency
+            if latency > point[3]:
+                point[3] = latency
+        else:
+            point[1] += 1
+
+    def record_write(self, latency, outcome="success", rows=0, late=False):
+        """
+        :param latency: Latency of the whole batch in seconds, measured from the scheduled send time
+        :param rows: Rows in the batch, counted as written only on success
+        """
+        self.write_counters[outcome] += 1
+        if late:
+            self.counters["late"] += 1
+        if outcome == "success":
+            self.write_counters["rows"] += rows
+            self.write_latency.record(latency)
+
+    def record_window(self, window, latency, outcome="success"):
+        """Records an operation of a trace replay in the window its scheduled send time falls into."""
+        point = self.windows.get(window)
+        if point is None:
+            # coarser buckets (under 3.2% error) keep one histogram per window and worker affordable
+            point = self.windows[window] = [0, 0, LatencyHistogram(WINDOW_HISTOGRAM_BITS)]
+        point[0] += 1
+        if outcome == "success":
+            point[2].record(latency)
+        else:
+            point[1] += 1
+
+    def _filter_point(self, label, selectivity):
+        point = self.filters.get(label)
+        if point is None:
+            point = self.filters[label] = [selectivity, 0, 0, LatencyHistogram(), 0.0, 0]
+        return point
+
+    def record_filter(self, label, selectivity, latency, outcome="success"):
+        """Records a search of a filtered workload under the label of its filter (selectivity 1 if unfiltered)."""
+        point = self._filter_point(label, selectivity)
+        point[1] += 1
+        if outcome == "success":
+            point[3].record(latency)
+        else:
+            point[2] += 1
+
+    def record_filter_recall(self, label, selectivity, recall):
+        point = self._filter_point(label, selectivity)
+        point[4] += recall
+        point[5] += 1
+
+    def _cache_point(self, kind):
+        point = self.cache.get(kind)
+        if point is None:
+            point = self.cache[kind] = [0, 0, LatencyHistogram(), 0.0, 0]
+        return point
+
+    def record_cache(self, kind, latency, outcome="success"):
+        """Records a search under the query cache's answer to it: "exact" or "semantic" hit, or "miss"."""
+        point = self._cache_point(kind)
+        point[0] += 1
+        if outcome == "success":
+            point[2].record(latency)
+        else:
+            point[1] += 1
+
+    def record_cache_recall(self, kind, recall):
+        point = self._cache_point(kind)
+        point[3] += recall
+        point[4] += 1
+
+    def record_recall(self, recall):
+        self.recall_sum += recall
+        self.recall_count += 1
+
+    @property
+    def recall(self):
+        return self.recall_sum / self.recall_count if self.recall_count else None
+
+    def merge(self, other):
+        for name, value in other.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+        self.elapsed = max(self.elapsed, other.elapsed)
+        self.client_cpu += other.client_cpu
+        self.client_cpu_peak = max(self.client_cpu_peak, other.client_cpu_peak)
+        self.recall_sum += other.recall_sum
+        self.recall_count += other.recall_count
+        self.latency.merge(other.latency)
+        self.pool_wait.merge(other.pool_wait)
+        self.send_lag.merge(other.send_lag)
+        for name, value in other.write_counters.items():
+            self.write_counters[name] = self.write_counters.get(name, 0) + value
+        self.write_latency.merge(other.write_latency)
+        for second, (ops, errors, lat_sum, lat_max) in other.series.items():
+            point = self.series.setdefault(second, [0, 0, 0.0, 0.0])
+            point[0] += ops
+            point[1] += errors
+            point[2] += lat_sum
+            point[3] = max(point[3], lat_max)
+        for window, (ops, errors, latency) in other.windows.items():
+            point = self.windows.get(window)
+            if point is None:
+                point = self.windows[window] = [0, 0, LatencyHistogram(WINDOW_HISTOGRAM_BITS)]
+            point[0] += ops
+            point[1] += errors
+            point[2].merge(latency)
+        for label, (selectivity, ops, errors, latency, recall_sum, recall_count) in other.filters.items():
+            point = self._filter_point(label, selectivity)
+            point[1] += ops
+            point[2] += errors
+            point[3].merge(latency)
+            point[4] += recall_sum
+            point[5] += recall_count
+        for kind, (ops, errors, latency, recall_sum, recall_count) in other.cache.items():
+            point = self._cache_point(kind)
+            point[0] += ops
+            point[1] += errors
+            point[2].merge(latency)
+            point[3] += recall_sum
+            point[4] += recall_count
+        if other.window_size is not None:
+            self.window_size = other.window_size
+            self.window_origin = other.window_origin
+            self.window_speedup = other.window_speedup
+        return self
+
+    def to_dict(self):
+        return {
+            "counters": dict(self.counters),
+            "elapsed": self.elapsed,
+            "client_cpu": self.client_cpu,
+            "client_cpu_peak": self.client_cpu_peak,
+            "recall_sum": self.recall_sum,
+            "recall_count": self.recall_count,
+            "latency": self.latency.to_dict(),
+            "pool_wait": self.pool_wait.to_dict(),
+            "send_lag": self.send_lag.to_dict(),
+            "write_counters": dict(self.write_counters),
+            "write_latency": self.write_latency.to_dict(),
+            "series": {second: list(point) for second, point in self.series.items()},
+            "windows": {window: [ops, errors, latency.to_dict()]
+                        for window, (ops, errors, latency) in self.windows.items()},
+            "window_size": self.window_size,
+            "window_origin": self.window_origin,
+            "window_speedup": self.window_speedup,
+            "filters": {label: [selectivity, ops, errors, latency.to_dict(), recall_sum, recall_count]
+                        for label, (selectivity, ops, errors, latency, recall_sum, recall_count)
+                        in self.filters.items()},
+            "cache": {kind: [ops, errors, latency.to_dict(), recall_sum, recall_count]
+                      for kind, (ops, errors, latency, recall_sum, recall_count) in self.cache.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.counters.update(data["counters"])
+        stats.elapsed = data["elapsed"]
+        stats.client_cpu = data.get("client_cpu", 0.0)
+        stats.client_cpu_peak = data.get("client_cpu_peak", 0.0)
+        stats.recall_sum = data["recall_sum"]
+        stats.recall_count = data["recall_count"]
+        stats.latency = LatencyHistogram.from_dict(data["latency"])
+        if "pool_wait" in data:
+            stats.pool_wait = LatencyHistogram.from_dict(data["pool_wait"])
+        if "send_lag" in data:
+            stats.send_lag = LatencyHistogram.from_dict(data["send_lag"])
+        if "write_counters" in data:
+            stats.write_counters.update(data["write_counters"])
+            stats.write_latency = LatencyHistogram.from_dict(data["write_latency"])
+        stats.series = {int(second): list(point) for second, point in data["series"].items()}
+        stats.windows = {int(window): [ops, errors, LatencyHistogram.from_dict(latency)]
+                         for window, (ops, errors, latency) in data.get("windows", {}).items()}
+        stats.window_size = data.get("window_size")
+        stats.window_origin = data.get("window_origin")
+        stats.window_speedup = data.get("window_speedup", 1.0)
+        stats.filters = {
+            label: [selectivity, ops, errors, LatencyHistogram.from_dict(latency), recall_sum, recall_count]
+            for label, (selectivity, ops, errors, latency, recall_sum, recall_count) in data.get("filters", {}).items()
+        }
+        stats.cache = {kind: [ops, errors, LatencyHistogram.from_dict(latency), recall_sum, recall_count]
+                       for kind, (ops, errors, latency, recall_sum, recall_count) in data.get("cache", {}).items()}
+        return stats
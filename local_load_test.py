@@ -0,0 +1,373 @@
+import os
+import time
+import random
+import hashlib
+import logging
+import threading
+import numpy as np
+from abstract_loader_test import AbstractLoaderTest, QueryTimeoutError
+from dataset import ClusteredGaussian, open_vectors
+from ground_truth import METRICS, VectorExport
+from filtered_workload import attribute_values
+
+
+def normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def similarity(queries, vectors, metric):
+    """(queries, vectors) matrix where larger means closer; cosine expects both sides normalised already."""
+    if metric == "l2":
+        return 2 * queries @ vectors.T - (vectors * vectors).sum(axis=1)[None, :]
+    return queries @ vectors.T
+
+
+def top_k(scores, k):
+    """Column numbers of the k largest scores of every row of a 2-D array (or of a 1-D array), largest first."""
+    k = min(k, scores.shape[-1])
+    if not k:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+    part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=-1), axis=-1)
+    return np.take_along_axis(part, order, axis=-1)
+
+
+class ExactIndex:
+    """
+    In-memory flat index searched by vectorised brute force; rows added later are kept in separate blocks
+    so that an insert never copies the whole matrix. Filtered searches score only the rows matching the filter
+    (exact pre-filtering), using the filter attributes of every block.
+    """
+
+    def __init__(self, vectors, metric="cosine"):
+        self.metric = metric
+        self.blocks = [self._prepare(vectors)]
+        self.attributes = [attribute_values(self.blocks[0])]
+        self.count = len(vectors)
+        self._lock = threading.Lock()
+
+    def _prepare(self, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        return normalize_rows(vectors) if self.metric == "cosine" else vectors
+
+    def add(self, vectors):
+        """Appends vectors and returns their row numbers."""
+        block = self._prepare(vectors)
+        attributes = attribute_values(block)
+        with self._lock:
+            first = self.count
+            self.blocks = self.blocks + [block]
+            self.attributes = self.attributes + [attributes]
+            self.count += len(block)
+        return np.arange(first, first + len(block))
+
+    def vector(self, row):
+        for block in self.blocks:
+            if row < len(block):
+                return block[row]
+            row -= len(block)
+        raise IndexError(row)
+
+    def search(self, query, k, params, search_filter=None):
+        return self.search_many(query[None, :], k, params, search_filter)[0]
+
+    def search_many(self, queries, k, params, search_filter=None):
+        """Row numbers of the top-k of every query row, scanning each block once for the whole batch."""
+        queries = self._prepare(queries)
+        best_rows, best_scores, offset = [], [], 0
+        for block, attributes in zip(self.blocks, self.attributes):
+            scores = similarity(queries, block, self.metric)
+            if search_filter is not None:
+                scores[:, ~search_filter.mask(attributes)] = -np.inf
+            rows = top_k(scores, k)
+            best_rows.append(rows + offset)
+            best_scores.append(np.take_along_axis(scores, rows, axis=1))
+            offset += len(block)
+        rows, scores = np.concatenate(best_rows, axis=1), np.concatenate(best_scores, axis=1)
+        order = top_k(scores, k)
+        rows, scores = np.take_along_axis(rows, order, axis=1), np.take_along_axis(scores, order, axis=1)
+        if search_filter is None:
+            return rows
+        # fewer than k rows may match
+        return [query_rows[np.isfinite(query_scores)] for query_rows, query_scores in zip(rows, scores)]
+
+
+class IVFIndex(ExactIndex):
+    """
+    Inverted-file index: k-means partitions the vectors into nlist lists, and a search scans only the
+    nprobe lists whose centroids are closest to the query (the "nprobe" search parameter).
+    Filters are applied to the rows of the probed lists (post-filtering), so selective filters return
+    fewer than k rows unless nprobe grows, as with an IVF index searched without iterative scans.
+    """
+
+    def __init__(self, vectors, metric="cosine", nlist=256, nprobe=8, iterations=10, sample_rows=65536, seed=0):
+        """
+        :param nlist: Number of partitions
+        :param nprobe: Partitions scanned per query unless overridden by the nprobe search parameter
+        :param iterations: k-means iterations
+        :param sample_rows: Rows k-means is trained on
+        """
+        super().__init__(vectors, metric)
+        self.nprobe = nprobe
+        data = self.blocks[0]
+        rng = np.random.default_rng(seed)
+        sample = data[rng.choice(len(data), size=min(sample_rows, len(data)), replace=False)]
+        nlist = min(nlist, len(sample))
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)]
+        for _ in range(iterations):
+            assignment = self._nearest_centroid(sample, centroids)
+            for c in range(nlist):
+                members = sample[assignment == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            if metric == "cosine":
+                centroids = normalize_rows(centroids)
+        self.centroids = centroids
+        self.lists = [[] for _ in range(nlist)]
+        self._assign(data, 0)
+        self.lists = [np.concatenate(rows) if rows else np.empty(0, dtype=np.int64) for rows in self.lists]
+        self.data = data
+        logging.info("Built IVF index: %d vectors in %d lists", len(data), nlist)
+
+    def _nearest_centroid(self, vectors, centroids, chunk_rows=8192):
+        return np.concatenate([similarity(vectors[start:start + chunk_rows], centroids, self.metric).argmax(axis=1)
+                               for start in range(0, len(vectors), chunk_rows)])
+
+    def _assign(self, vectors, first_row):
+        assignment = self._nearest_centroid(vectors, self.centroids)
+        for c in np.unique(assignment):
+            self.lists[c].append(np.flatnonzero(assignment == c) + first_row)
+
+    def add(self, vectors):
+        block = self._prepare(vectors)
+        attributes = attribute_values(block)
+        assignment = self._nearest_centroid(block, self.centroids)
+        with self._lock:
+            first = self.count
+            self.data = np.concatenate([self.data, block])
+            # published before the lists, so that a search seeing the new rows also sees their attributes
+            self.attributes = [{name: np.concatenate([values, attributes[name]])
+                                for name, values in self.attributes[0].items()}]
+            lists = list(self.lists)
+            for c in np.unique(assignment):
+                lists[c] = np.concatenate([lists[c], np.flatnonzero(assignment == c) + first])
+            self.lists = lists
+            self.blocks = [self.data]
+            self.count += len(block)
+        return np.arange(first, first + len(block))
+
+    def search_many(self, queries, k, params, search_filter=None):
+        queries = self._prepare(queries)
+        nprobe = int(params.get("nprobe", self.nprobe))
+        lists, data = self.lists, self.data
+        matches = None if search_filter is None else search_filter.mask(self.attributes[0])
+        results = []
+        # the centroids are scored for the whole batch at once; every query then scans its own lists
+        for query, probes in zip(queries, top_k(similarity(queries, self.centroids, self.metric), nprobe)):
+            candidates = np.concatenate([lists[c] for c in probes])
+            if matches is not None:
+                candidates = candidates[matches[candidates]]
+            scores = similarity(query[None, :], data[candidates], self.metric)[0]
+            results.append(candidates[top_k(scores, k)])
+        return results
+
+
+class LocalVectorStoreLoadTest(AbstractLoaderTest):
+    """
+    Backend searching an in-process vector index, so that the harness (schedules, metrics, recall, ...)
+    can be developed and checked without OCI GenAI or a running database. The exact index costs a
+    vectorised brute-force scan per query (NumPy releases the GIL, so worker threads scan in parallel);
+    the IVF index trades recall for speed through nprobe, like the remote stores' ANN indexes.
+
+    Query texts are "embedded" without a model: each text deterministically picks a stored vector and
+    perturbs it with query_noise, so queries land among the data as real queries do.
+    """
+    INDEXES = ("exact", "ivf")
+
+    def __init__(self, tps, duration, timeout, word="local", source=None, index="exact", index_params=None,
+                 simulated_latency=0.0, latency_sigma=0.0, failure_rate=0.0, timeout_rate=0.0, query_noise=0.1,
+                 text_bytes=512, **kwargs):
+        """
+        :param word: Text whose vector is searched when no query_file is given
+        :param source: ClusteredGaussian, NpyVectors, FvecsVectors or VectorExport holding the indexed vectors
+                       (defaults to 100,000 clustered 128-dimensional vectors)
+        :param index: "exact" or "ivf"
+        :param index_params: Keyword arguments of IVFIndex (nlist, nprobe, iterations, ...)
+        :param simulated_latency: Seconds added to every query, e.g. a network round trip
+        :param latency_sigma: Sigma of a log-normal factor applied to simulated_latency (0 for a constant delay)
+        :param failure_rate: Fraction of queries failing with an error
+        :param timeout_rate: Fraction of queries failing with a QueryTimeoutError
+        :param query_noise: Relative noise added to the stored vector a query text is derived from
+        :param text_bytes: Length of the synthetic text returned with every row in the "text" fetch mode
+        """
+        if index not in self.INDEXES:
+            raise ValueError(f"Unknown index '{index}', expected one of {self.INDEXES}")
+        distance_metric = kwargs.get("distance_metric", "cosine")
+        if distance_metric not in METRICS:
+            raise ValueError(f"Unknown metric '{distance_metric}', expected one of {METRICS}")
+        self.source = source if source is not None else ClusteredGaussian(dimension=128, count=100000)
+        self.index_name = index
+        self.query_noise = query_noise
+        self.simulated_latency = simulated_latency
+        self.latency_sigma = latency_sigma
+        self.failure_rate = failure_rate
+        self.timeout_rate = timeout_rate
+        self.text_bytes = text_bytes
+        self._fault_random = random.Random(kwargs.get("seed"))
+
+        started = time.perf_counter()
+        vectors = np.concatenate([chunk for _, chunk in self.source.chunks(65536)])
+        if index == "ivf":
+            self.index = IVFIndex(vectors, distance_metric, **(index_params or {}))
+        else:
+            self.index = ExactIndex(vectors, distance_metric)
+        self.ids = self.source.ids() if isinstance(self.source, VectorExport) else None
+        logging.info("Indexed %d vectors (dimension %d, %s) in %.1f s", len(vectors), vectors.shape[1], index,
+                     time.perf_counter() - started)
+        super().__init__(tps, duration, timeout, **kwargs)
+        self.word = word
+        self.embedding_vector = self.embed_words([word])[0]
+
+    def embedding_model(self):
+        path = getattr(self.source, "path", None) or getattr(self.source, "directory", None)
+        if path is None:
+            source = self.source
+            path = f"gaussian-d{source.dimension}-n{source.count}-c{len(source.centres)}-s{source.seed}"
+        return f"local:{os.path.basename(os.path.normpath(path))}:noise{self.query_noise}"
+
+    def embed_batch(self, texts):
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            rng = np.random.default_rng(seed)
+            base = self.index.vector(int(rng.integers(self.index.count)))
+            noise = rng.standard_normal(len(base)).astype(np.float32)
+            vectors.append(base + noise * np.float32(self.query_noise * np.linalg.norm(base) / np.sqrt(len(base))))
+        return np.array(vectors, dtype=np.float32)
+
+    def _simulate(self):
+        """Injects the configured failures and latency."""
+        draw = self._fault_random.random()
+        if draw < self.timeout_rate:
+            raise QueryTimeoutError("Simulated query timeout")
+        if draw < self.timeout_rate + self.failure_rate:
+            raise RuntimeError("Simulated query failure")
+        if self.simulated_latency:
+            delay = self.simulated_latency
+            if self.latency_sigma:
+                delay *= self._fault_random.lognormvariate(0, self.latency_sigma)
+            time.sleep(delay)
+
+    def _result(self, vector, rows):
+        """Result rows in the fetch mode: (id,), (id, distance) or (id, synthetic text of text_bytes)."""
+        ids = [self.ids[row] for row in rows] if self.ids is not None else [int(row) for row in rows]
+        if self.fetch_mode == "distance":
+            return list(zip(ids, self._distances(vector, rows)))
+        if self.fetch_mode == "text":
+            return [(i, f"passage {i} ".ljust(self.text_bytes, "x")[:self.text_bytes]) for i in ids]
+        return [(i,) for i in ids]
+
+    def _distances(self, vector, rows):
+        """Distances of the given rows to vector in the index's metric (cosine distance, squared L2, -dot)."""
+        if not len(rows):
+            return []
+        query = self.index._prepare(vector[None, :])[0]
+        stored = np.array([self.index.vector(int(row)) for row in rows])
+        if self.index.metric == "l2":
+            return ((stored - query) ** 2).sum(axis=1).tolist()
+        scores = stored @ query
+        return (-scores if self.index.metric == "ip" else 1 - scores).tolist()
+
+    def execute_query(self, query=None, search_filter=None):
+        vector = np.asarray(self.embedding_vector if query is None else query.vector, dtype=np.float32)
+        rows = self.index.search(vector, self.recall_k, self.search_params, search_filter)
+        self._simulate()
+        return self._result(vector, rows)
+
+    def execute_batch(self, queries):
+        vectors = np.array([self.embedding_vector if q is None else q.vector for q in queries], dtype=np.float32)
+        batch_rows = self.index.search_many(vectors, self.recall_k, self.search_params)
+        self._simulate()
+        return [self._result(vector, rows) for vector, rows in zip(vectors, batch_rows)]
+
+    def execute_write(self, rows):
+        self._simulate()
+        self.index.add(np.array([row.vector for row in rows], dtype=np.float32))
+
+    def iter_vectors(self, batch_size=1000):
+        row = 0
+        for block in self.index.blocks:
+            for start in range(0, len(block), batch_size):
+                vectors = block[start:start + batch_size]
+                ids = range(row + start, row + start + len(vectors))
+                yield [self.ids[i] for i in ids] if self.ids is not None else list(ids), vectors
+            row += len(block)
+
+    def run_config(self):
+        config = super().run_config()
+        config.update(index=self.index_name, vectors=self.index.count, simulated_latency=self.simulated_latency,
+                      failure_rate=self.failure_rate, timeout_rate=self.timeout_rate, text_bytes=self.text_bytes)
+        return config
+
+
+if __name__ == '__main__':
+    import json
+
+    AbstractLoaderTest.setup_logging()
+    source_path = os.environ.get("SOURCE", "synthetic")
+    if source_path == "synthetic":
+        source = ClusteredGaussian(
+            dimension=int(os.environ.get("DIMENSION", 128)),
+            count=int(os.environ.get("COUNT", 100000)),
+            clusters=int(os.environ.get("CLUSTERS", 100)),
+            seed=int(os.environ.get("SEED", 0))
+        )
+    elif os.path.isdir(source_path):
+        source = VectorExport(source_path)
+    else:
+        source = open_vectors(source_path)
+
+    tester = LocalVectorStoreLoadTest(
+        tps=int(os.environ.get("TPS", 10)),
+        duration=int(os.environ.get("DURATION", 3)),
+        timeout=int(os.environ.get("TIMEOUT", 10)),
+        word=os.environ.get("WORD", "サヴォワ地方はどこの国？"),
+        source=source,
+        index=os.environ.get("INDEX", "exact"),
+        index_params=json.loads(os.environ.get("INDEX_PARAMS", "{}")),
+        simulated_latency=float(os.environ.get("LATENCY", 0.0)),
+        latency_sigma=float(os.environ.get("LATENCY_SIGMA", 0.0)),
+        failure_rate=float(os.environ.get("FAILURE_RATE", 0.0)),
+        timeout_rate=float(os.environ.get("TIMEOUT_RATE", 0.0)),
+        search_batch_size=int(os.environ.get("SEARCH_BATCH_SIZE", 1)),
+        schedule=os.environ.get("SCHEDULE", "burst"),
+        query_file=os.environ.get("QUERY_FILE"),
+        query_order=os.environ.get("QUERY_ORDER", "rotate"),
+        ground_truth_dir=os.environ.get("GROUND_TRUTH_DIR"),
+        distance_metric=os.environ.get("METRIC", "cosine"),
+        result_file=os.environ.get("RESULT_FILE"),
+        metrics_port=int(os.environ["METRICS_PORT"]) if "METRICS_PORT" in os.environ else None,
+        write_ratio=float(os.environ.get("WRITE_RATIO", 0)),
+        write_batch_size=int(os.environ.get("WRITE_BATCH_SIZE", 100)),
+        history_db=os.environ.get("HISTORY_DB"),
+        run_label=os.environ.get("RUN_LABEL"),
+        profile=os.environ.get("PROFILE"),
+        trace_file=os.environ.get("TRACE_FILE"),
+        trace_speedup=float(os.environ.get("TRACE_SPEEDUP", 1.0)),
+        trace_start=os.environ.get("TRACE_START"),
+        trace_end=os.environ.get("TRACE_END"),
+        trace_window=int(os.environ.get("TRACE_WINDOW", 60)),
+        filter_selectivities=([float(s) for s in os.environ["FILTER_SELECTIVITIES"].split(",")]
+                              if "FILTER_SELECTIVITIES" in os.environ else None),
+        filter_attribute=os.environ.get("FILTER_ATTRIBUTE", "bucket"),
+        query_cache=os.environ.get("QUERY_CACHE"),
+        cache_threshold=float(os.environ.get("CACHE_THRESHOLD", 0.95)),
+        cache_max_entries=int(os.environ.get("CACHE_MAX_ENTRIES", 10000)),
+        cache_max_bytes=int(float(os.environ.get("CACHE_MAX_MB", 64)) * 1024 * 1024),
+        cache_ttl=float(os.environ["CACHE_TTL"]) if "CACHE_TTL" in os.environ else None,
+        fetch_mode=os.environ.get("FETCH_MODE", "text"),
+        text_bytes=int(os.environ.get("TEXT_BYTES", 512))
+    )
+    tester.run_test()
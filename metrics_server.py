@@ -0,0 +1,123 @@
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+# upper bounds (seconds) of the exported histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _labels(labels):
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}" if labels else ""
+
+
+def _histogram_lines(name, histogram, labels):
+    """Folds a LatencyHistogram into cumulative buckets; each HDR bucket counts under the first bound above it."""
+    cumulative = [0] * len(LATENCY_BUCKETS)
+    for upper, count in histogram.buckets():
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if upper <= bound:
+                cumulative[i] += count
+                break
+    lines = [f"# TYPE {name} histogram", f"# UNIT {name} seconds"]
+    total = 0
+    for bound, count in zip(LATENCY_BUCKETS, cumulative):
+        total += count
+        lines.append(f"{name}_bucket{_labels(dict(labels, le=bound))} {total}")
+    lines.append(f"{name}_bucket{_labels(dict(labels, le='+Inf'))} {histogram.count}")
+    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+    lines.append(f"{name}_sum{_labels(labels)} {histogram.sum_us / 1_000_000}")
+    return lines
+
+
+def render_metrics(tester):
+    """Renders the live state of an AbstractLoaderTest in the OpenMetrics text format."""
+    stats = tester.live_stats()
+    counters = stats.counters
+    labels = {"backend": type(tester).__name__}
+    lines = [
+        "# TYPE vectorbench_operations counter",
+        "# HELP vectorbench_operations Completed operations by outcome in the current run",
+    ]
+    for outcome in ("success", "errors", "timeouts"):
+        lines.append(f"vectorbench_operations_total{_labels(dict(labels, outcome=outcome))} {counters[outcome]}")
+    lines.append("# TYPE vectorbench_writes counter")
+    for outcome in ("success", "errors", "timeouts"):
+        lines.append(f"vectorbench_writes_total{_labels(dict(labels, outcome=outcome))} {stats.write_counters[outcome]}")
+    lines += [
+        "# TYPE vectorbench_rows_written counter",
+        f"vectorbench_rows_written_total{_labels(labels)} {stats.write_counters['rows']}",
+        "# TYPE vectorbench_sent counter",
+        f"vectorbench_sent_total{_labels(labels)} {counters['sent']}",
+        "# TYPE vectorbench_late_sends counter",
+        f"vectorbench_late_sends_total{_labels(labels)} {counters['late']}",
+        "# TYPE vectorbench_in_flight gauge",
+        f"vectorbench_in_flight{_labels(labels)} {tester.in_flight()}",
+        "# TYPE vectorbench_target_tps gauge",
+        f"vectorbench_target_tps{_labels(labels)} {tester.tps}",
+        "# TYPE vectorbench_run gauge",
+        "# HELP vectorbench_run Number of the current run; counters restart at every run",
+        f"vectorbench_run{_labels(labels)} {tester.run_number}",
+    ]
+    pool = tester.connection_pool
+    if pool is not None:
+        lines.append("# TYPE vectorbench_pool_connections gauge")
+        lines.append(f"vectorbench_pool_connections{_labels(dict(labels, state='in_use'))} {pool.in_use}")
+        lines.append(f"vectorbench_pool_connections{_labels(dict(labels, state='idle'))} {pool.size - pool.in_use}")
+        lines.append("# TYPE vectorbench_pool_waiting gauge")
+        lines.append(f"vectorbench_pool_waiting{_labels(labels)} {pool.waiting}")
+    lines += _histogram_lines("vectorbench_latency_seconds", stats.latency, labels)
+    lines += _histogram_lines("vectorbench_pool_wait_seconds", stats.pool_wait, labels)
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Serves render_metrics(tester) on http://host:port/metrics from a background thread,
+    so a Prometheus (or any OpenMetrics) scraper can follow a run while it is in progress.
+    """
+
+    def __init__(self, tester, port=9464, host="127.0.0.1"):
+        """
+        :param tester: AbstractLoaderTest to expose
+        :param port: TCP port, 0 to pick a free one (see self.port once started)
+        :param host: Interface to bind; use "0.0.0.0" to let a remote Prometheus scrape the load process
+        """
+        self.tester = tester
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        tester = self.tester
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render_metrics(tester).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug("Metrics endpoint: " + format, *args)
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        logging.info("Serving live metrics on http://%s:%d/metrics", self.host, self.port)
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
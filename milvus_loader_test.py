@@ -1,23 +1,56 @@
 import logging
 import os
 import yaml
-from abstract_loader_test import AbstractLoaderTest
+import grpc
+from abstract_loader_test import AbstractLoaderTest, QueryTimeoutError
 from pymilvus import MilvusClient
-from oci.auth.signers.instance_principals_security_token_signer import InstancePrincipalsSecurityTokenSigner
-from oci.generative_ai_inference.generative_ai_inference_client import GenerativeAiInferenceClient
-from oci.generative_ai_inference.models import (
-    EmbedTextDetails,
-    OnDemandServingMode
-)
+from pymilvus.exceptions import MilvusException
+from genai_embedding import embed_texts, embedding_model_id
+
+
+def is_deadline_exceeded(e):
+    """True if a pymilvus call failed because its timeout= deadline expired."""
+    if isinstance(e, grpc.RpcError):
+        return e.code() == grpc.StatusCode.DEADLINE_EXCEEDED
+    if isinstance(e, MilvusException):
+        # pymilvus' retry wrapper re-raises an expired deadline as a MilvusException carrying the gRPC status code;
+        # other failures mentioning a timeout (connect, load, handshake) are errors, not query timeouts
+        if e.code == grpc.StatusCode.DEADLINE_EXCEEDED or "DEADLINE_EXCEEDED" in str(e.message):
+            return True
+        return e.__cause__ is not None and is_deadline_exceeded(e.__cause__)
+    return False
+
+
+def milvus_entities(config, rows, attributes=None):
+    """
+    WriteRows as Milvus entities. Ids are only sent for upserts or collections created without auto_id.
+    :param attributes: Filter attribute values of the rows (see attribute_values), added as bucket and category
+    """
+    vector_field = config.get("vector_field", "embedding")
+    text_field = config.get("text_field", "text")
+    id_field = config.get("id_field", "id")
+    with_ids = config.get("write_mode", "insert") == "upsert" or not config.get("auto_id", True)
+    entities = []
+    for i, row in enumerate(rows):
+        entity = {vector_field: row.vector.tolist(), text_field: row.text}
+        if with_ids:
+            entity[id_field] = row.id
+        if attributes is not None:
+            entity["bucket"] = int(attributes["bucket"][i])
+            entity["category"] = int(attributes["category"][i])
+        entities.append(entity)
+    return entities
+
 
 class MilvusLoadTest(AbstractLoaderTest):
-    def __init__(self, tps, duration, timeout, query, config=None):
+    def __init__(self, tps, duration, timeout, query, config=None, **kwargs):
         if config is None:
             AbstractLoaderTest.setup_logging()
             logging.getLogger().setLevel(logging.DEBUG)
             config = self.load_config("config.yaml")
         self.config = config
-        super().__init__(tps, duration, timeout)
+        kwargs.setdefault("distance_metric", self.config.get("metric_type", "COSINE").lower())
+        super().__init__(tps, duration, timeout, **kwargs)
 
         # --- DEBUG LOG for Milvus ---
         logging.debug("Connecting to Milvus with:")
@@ -31,23 +64,16 @@ class MilvusLoadTest(AbstractLoaderTest):
         logging.debug("Embedding using OCI GenAI with:")
         logging.debug(f"  endpoint        : {self.config['service_endpoint']}")
         logging.debug(f"  compartment_id  : {self.config['compartment_id']}")
-        logging.debug(f"  model_id        : {self.config['emb_llm_id']}")
+        logging.debug(f"  model_id        : {embedding_model_id(self.config)}")
         logging.debug(f"  query           : {query}")
 
-        genai_client = GenerativeAiInferenceClient(
-            config={},
-            signer=InstancePrincipalsSecurityTokenSigner(),
-            service_endpoint=self.config["service_endpoint"]
-        )
-        res = genai_client.embed_text(
-            embed_text_details=EmbedTextDetails(
-                inputs=[query],
-                serving_mode=OnDemandServingMode(model_id=self.config["emb_llm_id"]),
-                compartment_id=self.config["compartment_id"],
-                input_type="SEARCH_QUERY"
-            )
-        )
-        self.config["embedding_vector"] = res.data.embeddings
+        self.config["embedding_vector"] = [self.embed_words([query])[0].tolist()]
+
+    def embed_batch(self, texts):
+        return embed_texts(self.config, texts, instance_principal=True, input_type="SEARCH_QUERY")
+
+    def embedding_model(self):
+        return f"{embedding_model_id(self.config)}:SEARCH_QUERY"
 
     @staticmethod
     def load_config(file_path):
@@ -58,28 +84,143 @@ class MilvusLoadTest(AbstractLoaderTest):
     def EMBEDDING_VECTOR(self):
         return self.config["embedding_vector"]
 
-    def execute_query(self):
+    def milvus_search_kwargs(self):
+        """search_params (e.g. {"ef": 64} or {"nprobe": 16}) are passed to Milvus as search_params.params."""
+        if not self.search_params:
+            return {}
+        return {"search_params": {"params": dict(self.search_params)}}
+
+    def output_fields(self):
+        """
+        Fields returned with every hit: the configured output_fields in the "text" fetch mode, none otherwise
+        (Milvus always returns the id and the distance, so "ids" and "distance" fetch the same payload).
+        """
+        return self.config["output_fields"] if self.fetch_mode == "text" else []
+
+    def result_ids(self, result):
+        return [hit["id"] for hit in result[0]]
+
+    def iter_vectors(self, batch_size=1000):
+        id_field = self.config.get("id_field", "id")
+        vector_field = self.config.get("vector_field", "embedding")
+        iterator = self.client.query_iterator(
+            collection_name=self.config["collection_name"],
+            batch_size=batch_size,
+            output_fields=[id_field, vector_field]
+        )
+        try:
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    break
+                yield [row[id_field] for row in rows], [row[vector_field] for row in rows]
+        finally:
+            iterator.close()
+
+    def execute_query(self, query=None, search_filter=None):
+        return self.search(self.EMBEDDING_VECTOR if query is None else [query.vector.tolist()], search_filter)
+
+    def execute_batch(self, queries):
+        # one search call carrying every query vector; Milvus returns one hit list per vector
+        result = self.search([self.EMBEDDING_VECTOR[0] if q is None else q.vector.tolist() for q in queries])
+        return [[hits] for hits in result]
+
+    def search(self, data, search_filter=None):
         try:
             result = self.client.search(
                 collection_name=self.config["collection_name"],
-                data=self.EMBEDDING_VECTOR,
-                output_fields=self.config["output_fields"]
+                data=data,
+                filter="" if search_filter is None else search_filter.milvus(),
+                output_fields=self.output_fields(),
+                limit=self.recall_k,
+                timeout=self.timeout,
+                **self.milvus_search_kwargs()
             )
             return result
         except Exception as e:
+            if is_deadline_exceeded(e):
+                logging.error(f"Query timed out after {self.timeout} seconds.")
+                raise QueryTimeoutError(str(e)) from e
             logging.error(f"Error during query execution: {e}")
             raise
 
+    def execute_write(self, rows):
+        # one batched insert (or upsert, with write_mode: upsert) per write operation
+        write = self.client.upsert if self.config.get("write_mode", "insert") == "upsert" else self.client.insert
+        try:
+            return write(
+                collection_name=self.config["collection_name"],
+                data=milvus_entities(self.config, rows, self.write_attributes(rows)),
+                timeout=self.timeout
+            )
+        except Exception as e:
+            if is_deadline_exceeded(e):
+                logging.error(f"Write timed out after {self.timeout} seconds.")
+                raise QueryTimeoutError(str(e)) from e
+            logging.error(f"Error during write: {e}")
+            raise
+
 if __name__ == "__main__":
     tps = int(os.environ.get("TPS", 10))
     duration = int(os.environ.get("DURATION", 3))
     timeout = int(os.environ.get("TIMEOUT", 10))
     query = os.environ.get("WORD", "サヴォワ地方はどこの国？")
+    schedule = os.environ.get("SCHEDULE", "burst")
+    query_file = os.environ.get("QUERY_FILE")
+    query_order = os.environ.get("QUERY_ORDER", "rotate")
+    ground_truth_dir = os.environ.get("GROUND_TRUTH_DIR")
+    result_file = os.environ.get("RESULT_FILE")
+    metrics_port = int(os.environ["METRICS_PORT"]) if "METRICS_PORT" in os.environ else None
+    write_ratio = float(os.environ.get("WRITE_RATIO", 0))
+    write_batch_size = int(os.environ.get("WRITE_BATCH_SIZE", 100))
+    history_db = os.environ.get("HISTORY_DB")
+    run_label = os.environ.get("RUN_LABEL")
+    profile = os.environ.get("PROFILE")
+    search_batch_size = int(os.environ.get("SEARCH_BATCH_SIZE", 1))
+    trace_file = os.environ.get("TRACE_FILE")
+    trace_speedup = float(os.environ.get("TRACE_SPEEDUP", 1.0))
+    trace_start = os.environ.get("TRACE_START")
+    trace_end = os.environ.get("TRACE_END")
+    trace_window = int(os.environ.get("TRACE_WINDOW", 60))
+    filter_selectivities = ([float(s) for s in os.environ["FILTER_SELECTIVITIES"].split(",")]
+                            if "FILTER_SELECTIVITIES" in os.environ else None)
+    filter_attribute = os.environ.get("FILTER_ATTRIBUTE", "bucket")
+    query_cache = os.environ.get("QUERY_CACHE")
+    cache_threshold = float(os.environ.get("CACHE_THRESHOLD", 0.95))
+    cache_max_entries = int(os.environ.get("CACHE_MAX_ENTRIES", 10000))
+    cache_max_bytes = int(float(os.environ.get("CACHE_MAX_MB", 64)) * 1024 * 1024)
+    cache_ttl = float(os.environ["CACHE_TTL"]) if "CACHE_TTL" in os.environ else None
+    fetch_mode = os.environ.get("FETCH_MODE", "text")
 
     tester = MilvusLoadTest(
         tps=tps,
         duration=duration,
         timeout=timeout,
-        query=query
+        query=query,
+        schedule=schedule,
+        query_file=query_file,
+        query_order=query_order,
+        ground_truth_dir=ground_truth_dir,
+        result_file=result_file,
+        metrics_port=metrics_port,
+        write_ratio=write_ratio,
+        write_batch_size=write_batch_size,
+        history_db=history_db,
+        run_label=run_label,
+        profile=profile,
+        search_batch_size=search_batch_size,
+        trace_file=trace_file,
+        trace_speedup=trace_speedup,
+        trace_start=trace_start,
+        trace_end=trace_end,
+        trace_window=trace_window,
+        filter_selectivities=filter_selectivities,
+        filter_attribute=filter_attribute,
+        query_cache=query_cache,
+        cache_threshold=cache_threshold,
+        cache_max_entries=cache_max_entries,
+        cache_max_bytes=cache_max_bytes,
+        cache_ttl=cache_ttl,
+        fetch_mode=fetch_mode
     )
     tester.run_test()
@@ -0,0 +1,212 @@
+import os
+import time
+import logging
+import traceback
+import multiprocessing
+from queue import Empty
+from threading import BrokenBarrierError
+from abstract_loader_test import AbstractLoaderTest, log_load_stats
+from load_stats import LoadStats
+from run_history import record_run
+
+
+def split_tps(tps, workers):
+    """Splits a total rate into workers integer shares differing by at most one."""
+    base, remainder = divmod(tps, workers)
+    return [base + (1 if i < remainder else 0) for i in range(workers)]
+
+
+def worker_tester_kwargs(tester_kwargs, index, workers=1):
+    """
+    Tester keyword arguments of the index-th of workers load workers: its own seed, result file, metrics port
+    and share of the trace.
+    """
+    tester_kwargs = dict(tester_kwargs)
+    if tester_kwargs.get("seed") is not None:
+        tester_kwargs["seed"] += index
+    if tester_kwargs.get("result_file"):
+        # one result file per worker, e.g. results.worker0.jsonl
+        root, ext = os.path.splitext(tester_kwargs["result_file"])
+        tester_kwargs["result_file"] = f"{root}.worker{index}{ext}"
+    if tester_kwargs.get("metrics_port"):
+        # one metrics endpoint per worker on consecutive ports
+        tester_kwargs["metrics_port"] += index
+    if tester_kwargs.get("trace_file"):
+        # every worker replays every workers-th query of the trace, so together they replay it once
+        tester_kwargs["trace_shard"] = index
+        tester_kwargs["trace_shards"] = workers
+    return tester_kwargs
+
+
+def close_tester(tester):
+    close_all = getattr(tester, "close_all", None)
+    if close_all is not None:
+        close_all()
+    if tester.result_sink is not None:
+        tester.result_sink.close()
+
+
+def _run_worker(index, workers, tester_class, tps, duration, timeout, tester_kwargs, barrier, results):
+    """
+    Entry point of one load process: builds its own tester (and therefore its own connection pool),
+    waits until every process is ready, runs its share of the load and sends back the LoadStats.
+    """
+    try:
+        tester = tester_class(tps=tps, duration=duration, timeout=timeout,
+                              **worker_tester_kwargs(tester_kwargs, index, workers))
+    except Exception:
+        barrier.abort()
+        results.put((index, None, traceback.format_exc()))
+        return
+    try:
+        # open every connection before the processes start together; run_load only re-checks the warm pool
+        tester.warmup()
+        barrier.wait()
+        stats = tester.run_load()
+        results.put((index, stats.to_dict(), None))
+    except BrokenBarrierError:
+        results.put((index, None, "Another load process failed to start"))
+    except Exception:
+        results.put((index, None, traceback.format_exc()))
+    finally:
+        close_tester(tester)
+
+
+class MultiProcessLoadTest:
+    """
+    Spreads the target TPS of an AbstractLoaderTest subclass across several worker processes,
+    one per core by default, and merges their counters and latency histograms into one report.
+    """
+
+    def __init__(self, tester_class, tps, duration, timeout, processes=None, startup_timeout=300, **tester_kwargs):
+        """
+        :param tester_class: AbstractLoaderTest subclass instantiated once in every worker process
+        :param tps: Total number of operations per second across all processes
+        :param processes: Number of worker processes (defaults to the number of CPUs)
+        :param startup_timeout: Seconds to wait for every process to build its tester
+        :param tester_kwargs: Additional keyword arguments for tester_class (e.g. word, schedule)
+        """
+        self.tester_class = tester_class
+        self.tps = tps
+        self.duration = duration
+        self.timeout = timeout
+        self.processes = max(1, min(processes or os.cpu_count() or 1, tps))
+        self.startup_timeout = startup_timeout
+        self.tester_kwargs = tester_kwargs
+        self.stats = None
+
+    def tps_shares(self):
+        return split_tps(self.tps, self.processes)
+
+    def run_test(self):
+        self.run_load()
+        self.report_results()
+        history_db = self.tester_kwargs.get("history_db")
+        if history_db:
+            config = dict(self.tester_kwargs, tps=self.tps, duration=self.duration, timeout=self.timeout,
+                          processes=self.processes)
+            config.pop("history_db")
+            label = config.pop("run_label", None)
+            record_run(history_db, self.stats, self.tester_class.__name__, config, label)
+
+    def run_load(self):
+        ctx = multiprocessing.get_context("spawn")
+        barrier = ctx.Barrier(self.processes, timeout=self.startup_timeout)
+        results = ctx.Queue()
+        workers = []
+        for index, share in enumerate(self.tps_shares()):
+            worker = ctx.Process(
+                target=_run_worker,
+                args=(index, self.processes, self.tester_class, share, self.duration, self.timeout, self.tester_kwargs,
+                      barrier, results),
+                name=f"load-worker-{index}"
+            )
+            worker.start()
+            workers.append(worker)
+        logging.info("Started %d load processes for %d TPS (%s)", self.processes, self.tps, self.tps_shares())
+
+        self.stats = LoadStats()
+        deadline = time.time() + self.startup_timeout + self.duration + self.timeout * 2
+        pending = len(workers)
+        failures = 0
+        while pending and time.time() < deadline:
+            try:
+                index, stats, error = results.get(timeout=1)
+            except Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    break
+                continue
+            pending -= 1
+            if error is not None:
+                failures += 1
+                logging.error("Load process %d failed: %s", index, error)
+            else:
+                self.stats.merge(LoadStats.from_dict(stats))
+        failures += pending
+        for worker in workers:
+            worker.join(timeout=self.timeout)
+            if worker.is_alive():
+                worker.terminate()
+        if failures:
+            logging.warning("%d of %d load processes failed; results cover the remaining processes",
+                            failures, self.processes)
+        return self.stats
+
+    def report_results(self):
+        log_load_stats(
+            self.stats,
+            self.tester_kwargs.get("schedule", "burst"),
+            self.duration,
+            self.tester_kwargs.get("late_threshold", 0.005),
+            self.tester_kwargs.get("recall_k", 4)
+        )
+        logging.info("Load processes: %d", self.processes)
+
+
+if __name__ == '__main__':
+    import importlib
+    import inspect
+
+    AbstractLoaderTest.setup_logging()
+    module_name, class_name = os.environ.get("TESTER", "oci_postgres_load_test:OCI_Postgres_LoadTest").split(":")
+    tester_class = getattr(importlib.import_module(module_name), class_name)
+    word = os.environ.get("WORD", "サヴォワ地方はどこの国？")
+    # MilvusLoadTest names its query argument "query"; the SQL backends call it "word"
+    word_arg = "query" if "query" in inspect.signature(tester_class).parameters else "word"
+
+    tester = MultiProcessLoadTest(
+        tester_class,
+        tps=int(os.environ.get("TPS", 10)),
+        duration=int(os.environ.get("DURATION", 3)),
+        timeout=int(os.environ.get("TIMEOUT", 10)),
+        processes=int(os.environ["PROCESSES"]) if "PROCESSES" in os.environ else None,
+        schedule=os.environ.get("SCHEDULE", "burst"),
+        query_file=os.environ.get("QUERY_FILE"),
+        query_order=os.environ.get("QUERY_ORDER", "rotate"),
+        ground_truth_dir=os.environ.get("GROUND_TRUTH_DIR"),
+        vector_binding=os.environ.get("VECTOR_BINDING", "binary"),
+        result_file=os.environ.get("RESULT_FILE"),
+        metrics_port=int(os.environ["METRICS_PORT"]) if "METRICS_PORT" in os.environ else None,
+        write_ratio=float(os.environ.get("WRITE_RATIO", 0)),
+        write_batch_size=int(os.environ.get("WRITE_BATCH_SIZE", 100)),
+        history_db=os.environ.get("HISTORY_DB"),
+        run_label=os.environ.get("RUN_LABEL"),
+        profile=os.environ.get("PROFILE"),
+        search_batch_size=int(os.environ.get("SEARCH_BATCH_SIZE", 1)),
+        trace_file=os.environ.get("TRACE_FILE"),
+        trace_speedup=float(os.environ.get("TRACE_SPEEDUP", 1.0)),
+        trace_start=os.environ.get("TRACE_START"),
+        trace_end=os.environ.get("TRACE_END"),
+        trace_window=int(os.environ.get("TRACE_WINDOW", 60)),
+        filter_selectivities=([float(s) for s in os.environ["FILTER_SELECTIVITIES"].split(",")]
+                              if "FILTER_SELECTIVITIES" in os.environ else None),
+        filter_attribute=os.environ.get("FILTER_ATTRIBUTE", "bucket"),
+        query_cache=os.environ.get("QUERY_CACHE"),
+        cache_threshold=float(os.environ.get("CACHE_THRESHOLD", 0.95)),
+        cache_max_entries=int(os.environ.get("CACHE_MAX_ENTRIES", 10000)),
+        cache_max_bytes=int(float(os.environ.get("CACHE_MAX_MB", 64)) * 1024 * 1024),
+        cache_ttl=float(os.environ["CACHE_TTL"]) if "CACHE_TTL" in os.environ else None,
+        fetch_mode=os.environ.get("FETCH_MODE", "text"),
+        **{word_arg: word}
+    )
+    tester.run_test()
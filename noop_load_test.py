@@ -0,0 +1,50 @@
+import os
+import time
+from abstract_loader_test import AbstractLoaderTest
+from saturation_search import SaturationSearch
+
+
+class NoopLoadTest(AbstractLoaderTest):
+    """
+    Backend whose queries do nothing (or sleep for a fixed time), so that a run measures only the harness:
+    scheduling, thread hand-off, locking and statistics. Its maximum sustainable rate is the ceiling
+    of one client process, above which measurements of a real store say more about the client than the store.
+    """
+
+    def __init__(self, tps, duration, timeout, word=None, latency=0.0, **kwargs):
+        """
+        :param word: Ignored; accepted so that the generic runners can build this backend like the others
+        :param latency: Seconds each query sleeps, simulating a store that answers in constant time
+        """
+        super().__init__(tps, duration, timeout, **kwargs)
+        self.latency = latency
+
+    def execute_query(self, query=None):
+        if self.latency:
+            time.sleep(self.latency)
+        return []
+
+
+if __name__ == '__main__':
+    # finds the highest rate the harness itself sustains with a p99 send-to-completion time under MAX_P99_MS
+    AbstractLoaderTest.setup_logging()
+    max_tps = int(os.environ.get("MAX_TPS", 20000))
+    step_duration = int(os.environ.get("STEP_DURATION", 10))
+    tester = NoopLoadTest(
+        tps=max_tps,
+        duration=step_duration,
+        timeout=int(os.environ.get("TIMEOUT", 10)),
+        latency=float(os.environ.get("LATENCY", 0.0)),
+        schedule=os.environ.get("SCHEDULE", "constant"),
+        profile=os.environ.get("PROFILE")
+    )
+    search = SaturationSearch(
+        tester,
+        start_tps=int(os.environ.get("START_TPS", 500)),
+        max_tps=max_tps,
+        mode=os.environ.get("MODE", "binary"),
+        step_duration=step_duration,
+        max_p99_ms=float(os.environ.get("MAX_P99_MS", 10))
+    )
+    search.run()
+    tester.report_results()
@@ -0,0 +1,334 @@
+import os
+import array
+import yaml
+import logging
+import oracledb
+from abstract_async_loader_test import AbstractAsyncLoaderTest
+from abstract_loader_test import AbstractLoaderTest, QueryTimeoutError, split_batch_rows
+from genai_embedding import embed_texts, embedding_model_id
+from connection_pool import AsyncInstrumentedPool
+from oci_atp_load_test import CALL_TIMEOUT_ERRORS, tune_cursor, read_lobs_async, lob_type_handler
+
+
+class OCI_ATP_AsyncLoadTest(AbstractAsyncLoaderTest):
+    """
+    asyncio port of OCI_ATP_LoadTest using a python-oracledb async pool.
+    Async connections are only available in thin mode, so the wallet is read from atp_wallet_dir
+    and atp_wallet_password in config.yaml instead of through the Oracle Client libraries.
+    """
+
+    INDEX_VARIANTS = {
+        "ivf": ("WIKI_JA_EMBEDDINGS_20250401_IVF", "EMBEDDING_IVF_IDX_20250401"),
+        "hnsw": ("WIKI_JA_EMBEDDINGS_20250401_HNSW", "embedding_hnsw_idx_20250401"),
+    }
+
+    def __init__(self, tps, duration, timeout, word, config=None, fetch_array_size=None, fetch_lobs=False,
+                 **kwargs):
+        """
+        :param fetch_array_size: Rows per fetch round trip (cursor arraysize, prefetchrows one more), by default
+                                 the rows a search returns, so that its result comes back with the execute call
+        :param fetch_lobs: False fetches LOB columns (a CLOB text) inline as str/bytes, True as LOB locators read
+                           one round trip each; applied to the tester's own connections (see lob_type_handler)
+        """
+        if config is None:
+            AbstractLoaderTest.setup_logging()
+            config = self.load_config('config.yaml')
+        self.config = config
+        self.word = word
+        self.id_column = self.config.get("id_column", "id")
+        super().__init__(tps, duration, timeout, **kwargs)
+        self.embedding_vector = self.embed_word(word)
+        self.fetch_array_size = fetch_array_size
+        self.fetch_lobs = fetch_lobs
+        self._lob_type_handler = lob_type_handler(fetch_lobs)
+
+    def embed_batch(self, texts):
+        return embed_texts(self.config, texts, is_echo=True, truncate="NONE")
+
+    def embedding_model(self):
+        return embedding_model_id(self.config)
+
+    def embed_word(self, word):
+        return self.embed_words([word])[0].tolist()
+
+    @staticmethod
+    def to_vector_literal(vector):
+        return "[" + ",".join([f"{x:.8f}" for x in vector]) + "]"
+
+    def encode_vector(self, vector, binding):
+        # binary: python-oracledb binds array.array('f') natively as a FLOAT32 VECTOR, nothing to parse server-side
+        if binding == "binary":
+            return array.array("f", vector)
+        return self.to_vector_literal(vector)
+
+    def vector_expression(self, name="embedding"):
+        return f":{name}" if self.vector_binding == "binary" else f"TO_VECTOR(:{name})"
+
+    @staticmethod
+    def load_config(file_path):
+        with open(file_path, 'r', encoding='utf-8') as file:
+            return yaml.safe_load(file)
+
+    @property
+    def TABLE_NAME(self):
+        return self.INDEX_VARIANTS[self.search_params.get("index", "ivf")][0]
+
+    @property
+    def INDEX_NAME(self):
+        return self.INDEX_VARIANTS[self.search_params.get("index", "ivf")][1]
+
+    def index_hint(self):
+        """
+        VECTOR_INDEX_SCAN hint forcing the vector index; the "index_hint": false search parameter leaves the plan
+        to the optimizer, which may then pre-filter a filtered search instead of filtering the index scan.
+        """
+        if not self.search_params.get("index_hint", True):
+            return ""
+        return f"/*+ VECTOR_INDEX_SCAN( w {self.INDEX_NAME}) */ "
+
+    def approx_clause(self):
+        """
+        FETCH APPROX clause honouring the target_accuracy, efsearch (HNSW) or probes (IVF) search parameters.
+        """
+        clause = f"FETCH APPROX FIRST {self.recall_k} ROWS ONLY"
+        if "target_accuracy" in self.search_params:
+            clause += f" WITH TARGET ACCURACY {int(self.search_params['target_accuracy'])}"
+        elif "efsearch" in self.search_params:
+            clause += f" WITH TARGET ACCURACY PARAMETERS (EFSEARCH {int(self.search_params['efsearch'])})"
+        elif "probes" in self.search_params:
+            clause += (" WITH TARGET ACCURACY PARAMETERS "
+                       f"(NEIGHBOR PARTITION PROBES {int(self.search_params['probes'])})")
+        return clause
+
+    @property
+    def WRITE_TABLE(self):
+        return self.config.get("write_table", self.TABLE_NAME)
+
+    def insert_sql(self, attributes=None):
+        # the id column is left to its default (identity)
+        if attributes is None:
+            return f"INSERT INTO {self.WRITE_TABLE} (text, embedding) VALUES (:1, :2)"
+        return f"INSERT INTO {self.WRITE_TABLE} (text, embedding, bucket, category) VALUES (:1, :2, :3, :4)"
+
+    def generate_sql(self, search_filter=None):
+        return f"""
+            SELECT {self.index_hint()}{self.fetch_columns(f'w.{self.id_column}', self.distance_column(), 'w.text')}
+            FROM {self.TABLE_NAME} w
+            {'' if search_filter is None else 'WHERE ' + search_filter.sql('w')}
+            ORDER BY VECTOR_DISTANCE(
+                    w.embedding,
+                    {self.vector_expression()}
+            )
+            {self.approx_clause()}
+        """
+
+    def distance_column(self):
+        return f"VECTOR_DISTANCE(w.embedding, {self.vector_expression()}) AS distance"
+
+    def generate_batch_sql(self, size):
+        """
+        Answers size searches in one round trip: a UNION ALL of the top-k query, one branch per bound vector
+        (:embedding0, :embedding1, ...), each row tagged with the number of the query it answers.
+        """
+        branches = []
+        for i in range(size):
+            vector = self.vector_expression(f"embedding{i}")
+            columns = self.fetch_columns(f"w.{self.id_column}", f"VECTOR_DISTANCE(w.embedding, {vector}) AS distance",
+                                         "w.text")
+            # ROWNUM numbers the rows of the ordered inline view, so the union is ordered without the distance
+            branches.append(f"""
+                SELECT {i} AS query_no, ROWNUM AS query_rank, v.*
+                FROM (
+                    SELECT {self.index_hint()}{columns}
+                    FROM {self.TABLE_NAME} w
+                    ORDER BY VECTOR_DISTANCE(w.embedding, {vector})
+                    {self.approx_clause()}
+                ) v""")
+        union = "\n                UNION ALL".join(branches)
+        return f"""
+            SELECT query_no, {self.fetch_columns(self.id_column, "distance", "text")}
+            FROM ({union}
+            )
+            ORDER BY query_no, query_rank"""
+
+    def run_config(self):
+        config = super().run_config()
+        config.update(fetch_array_size=self.fetch_array_size, fetch_lobs=self.fetch_lobs)
+        return config
+
+    async def configure_connection(self, conn):
+        conn.call_timeout = int(self.timeout * 1000)
+        conn.outputtypehandler = self._lob_type_handler
+
+    async def setup(self):
+        logging.debug("Creating Oracle async connection pool with the following parameters:")
+        logging.debug(f"  user        : {self.config['atp_username']}")
+        logging.debug(f"  password    : {'*' * len(self.config['atp_password'])}")
+        logging.debug(f"  dsn         : {self.config['atp_dsn']}")
+        logging.debug(f"  config_dir  : {self.config['atp_wallet_dir']}")
+
+        self.pool = oracledb.create_pool_async(
+            user=self.config["atp_username"],
+            password=self.config["atp_password"],
+            dsn=self.config["atp_dsn"],
+            config_dir=self.config["atp_wallet_dir"],
+            wallet_location=self.config["atp_wallet_dir"],
+            wallet_password=self.config.get("atp_wallet_password"),
+            min=self.max_concurrency,
+            max=self.max_concurrency,
+            increment=1,
+            getmode=oracledb.POOL_GETMODE_WAIT
+        )
+        self.connection_pool = AsyncInstrumentedPool(
+            self.max_concurrency,
+            acquire=self.pool.acquire,
+            release=self.pool.release,
+            discard=self.pool.drop,
+            setup=self.configure_connection,
+            on_wait=self._record_pool_wait
+        )
+
+    async def teardown(self):
+        await self.pool.close()
+
+    async def execute_query(self, query=None, search_filter=None):
+        embedding = self.encoded_vector(query)
+        conn = await self.connection_pool.acquire()
+        drop = False
+        try:
+            with conn.cursor() as cur:
+                tune_cursor(cur, self.recall_k, self.fetch_array_size)
+                await cur.execute(self.generate_sql(search_filter), {"embedding": embedding})
+                result = await cur.fetchall()
+                return await read_lobs_async(result) if self.fetch_lobs else result
+        except oracledb.Error as e:
+            error, = e.args
+            timed_out = error.full_code in CALL_TIMEOUT_ERRORS
+            drop = timed_out or not conn.is_healthy()
+            if timed_out:
+                logging.error(f"Query timed out after {self.timeout} seconds: {error.full_code}")
+                raise QueryTimeoutError(str(e), connection_discarded=True) from e
+            logging.error(f"Error during query execution: {e}")
+            raise
+        finally:
+            await self.connection_pool.release(conn, discard=drop)
+
+    async def execute_batch(self, queries):
+        binds = {f"embedding{i}": self.encoded_vector(query) for i, query in enumerate(queries)}
+        conn = await self.connection_pool.acquire()
+        drop = False
+        try:
+            with conn.cursor() as cur:
+                tune_cursor(cur, self.recall_k * len(queries), self.fetch_array_size)
+                await cur.execute(self.generate_batch_sql(len(queries)), binds)
+                rows = await cur.fetchall()
+                return split_batch_rows(await read_lobs_async(rows) if self.fetch_lobs else rows, len(queries))
+        except oracledb.Error as e:
+            error, = e.args
+            timed_out = error.full_code in CALL_TIMEOUT_ERRORS
+            drop = timed_out or not conn.is_healthy()
+            if timed_out:
+                logging.error(f"Batched query timed out after {self.timeout} seconds: {error.full_code}")
+                raise QueryTimeoutError(str(e), connection_discarded=True) from e
+            logging.error(f"Error during batched query execution: {e}")
+            raise
+        finally:
+            await self.connection_pool.release(conn, discard=drop)
+
+    async def execute_write(self, rows):
+        attributes = self.write_attributes(rows)
+        if attributes is None:
+            data = [(row.text, array.array("f", row.vector)) for row in rows]
+        else:
+            data = [(row.text, array.array("f", row.vector), int(bucket), int(category))
+                    for row, bucket, category in zip(rows, attributes["bucket"], attributes["category"])]
+        conn = await self.connection_pool.acquire()
+        drop = False
+        try:
+            with conn.cursor() as cur:
+                await cur.executemany(self.insert_sql(attributes), data)
+            await conn.commit()
+        except oracledb.Error as e:
+            error, = e.args
+            timed_out = error.full_code in CALL_TIMEOUT_ERRORS
+            drop = timed_out or not conn.is_healthy()
+            if timed_out:
+                logging.error(f"Insert timed out after {self.timeout} seconds: {error.full_code}")
+                raise QueryTimeoutError(str(e), connection_discarded=True) from e
+            logging.error(f"Error during insert: {e}")
+            raise
+        finally:
+            await self.connection_pool.release(conn, discard=drop)
+
+
+if __name__ == '__main__':
+    tps = int(os.environ.get("TPS", 10))
+    duration = int(os.environ.get("DURATION", 3))
+    timeout = int(os.environ.get("TIMEOUT", 10))
+    word = os.environ.get("WORD", "サヴォワ地方はどこの国？")
+    schedule = os.environ.get("SCHEDULE", "burst")
+    query_file = os.environ.get("QUERY_FILE")
+    query_order = os.environ.get("QUERY_ORDER", "rotate")
+    ground_truth_dir = os.environ.get("GROUND_TRUTH_DIR")
+    result_file = os.environ.get("RESULT_FILE")
+    metrics_port = int(os.environ["METRICS_PORT"]) if "METRICS_PORT" in os.environ else None
+    write_ratio = float(os.environ.get("WRITE_RATIO", 0))
+    write_batch_size = int(os.environ.get("WRITE_BATCH_SIZE", 100))
+    history_db = os.environ.get("HISTORY_DB")
+    run_label = os.environ.get("RUN_LABEL")
+    profile = os.environ.get("PROFILE")
+    search_batch_size = int(os.environ.get("SEARCH_BATCH_SIZE", 1))
+    trace_file = os.environ.get("TRACE_FILE")
+    trace_speedup = float(os.environ.get("TRACE_SPEEDUP", 1.0))
+    trace_start = os.environ.get("TRACE_START")
+    trace_end = os.environ.get("TRACE_END")
+    trace_window = int(os.environ.get("TRACE_WINDOW", 60))
+    filter_selectivities = ([float(s) for s in os.environ["FILTER_SELECTIVITIES"].split(",")]
+                            if "FILTER_SELECTIVITIES" in os.environ else None)
+    filter_attribute = os.environ.get("FILTER_ATTRIBUTE", "bucket")
+    query_cache = os.environ.get("QUERY_CACHE")
+    cache_threshold = float(os.environ.get("CACHE_THRESHOLD", 0.95))
+    cache_max_entries = int(os.environ.get("CACHE_MAX_ENTRIES", 10000))
+    cache_max_bytes = int(float(os.environ.get("CACHE_MAX_MB", 64)) * 1024 * 1024)
+    cache_ttl = float(os.environ["CACHE_TTL"]) if "CACHE_TTL" in os.environ else None
+    fetch_mode = os.environ.get("FETCH_MODE", "text")
+    fetch_array_size = int(os.environ["FETCH_ARRAY_SIZE"]) if "FETCH_ARRAY_SIZE" in os.environ else None
+    fetch_lobs = os.environ.get("FETCH_LOBS", "0") == "1"
+    vector_binding = os.environ.get("VECTOR_BINDING", "binary")
+
+    tester = OCI_ATP_AsyncLoadTest(
+        tps=tps,
+        duration=duration,
+        timeout=timeout,
+        word=word,
+        schedule=schedule,
+        query_file=query_file,
+        query_order=query_order,
+        ground_truth_dir=ground_truth_dir,
+        vector_binding=vector_binding,
+        result_file=result_file,
+        metrics_port=metrics_port,
+        write_ratio=write_ratio,
+        write_batch_size=write_batch_size,
+        history_db=history_db,
+        run_label=run_label,
+        profile=profile,
+        search_batch_size=search_batch_size,
+        trace_file=trace_file,
+        trace_speedup=trace_speedup,
+        trace_start=trace_start,
+        trace_end=trace_end,
+        trace_window=trace_window,
+        filter_selectivities=filter_selectivities,
+        filter_attribute=filter_attribute,
+        query_cache=query_cache,
+        cache_threshold=cache_threshold,
+        cache_max_entries=cache_max_entries,
+        cache_max_bytes=cache_max_bytes,
+        cache_ttl=cache_ttl,
+        fetch_mode=fetch_mode,
+        fetch_array_size=fetch_array_size,
+        fetch_lobs=fetch_lobs
+    )
+    tester.run_test()
+    tester.close_all()
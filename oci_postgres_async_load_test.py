@@ -0,0 +1,270 @@
+import os
+import yaml
+import logging
+import weakref
+from psycopg.adapt import Dumper
+from psycopg.errors import QueryCanceled
+from psycopg.pq import Format
+from psycopg.types import TypeInfo
+from psycopg_pool import AsyncConnectionPool
+from abstract_async_loader_test import AbstractAsyncLoaderTest
+from abstract_loader_test import AbstractLoaderTest, QueryTimeoutError
+from connection_pool import AsyncInstrumentedPool
+from genai_embedding import embed_texts, embedding_model_id
+from oci_postgres_load_test import setting_statements, vector_literal, vector_binary, copy_binary_payload
+
+
+class EncodedVector(bytes):
+    """A query vector already in pgvector's binary input format: dimension, unused, big-endian float4 values."""
+
+    @classmethod
+    def encode(cls, vector):
+        return cls(vector_binary(vector))
+
+
+class VectorBinaryDumper(Dumper):
+    """Sends an EncodedVector as is; the vector type oid is set per database in configure_connection."""
+    format = Format.BINARY
+
+    def dump(self, obj):
+        return obj
+
+
+class OCI_Postgres_AsyncLoadTest(AbstractAsyncLoaderTest):
+    """
+    asyncio port of OCI_Postgres_LoadTest using a psycopg3 AsyncConnectionPool.
+    """
+
+    TABLE_NAME = "WIKI_JA_EMBEDDINGS_20250401_HNSW"
+
+    def __init__(self, tps, duration, timeout, word, config=None, **kwargs):
+        if config is None:
+            AbstractLoaderTest.setup_logging()
+            config = self.load_config('config.yaml')
+        self.config = config
+        self.word = word
+        self.id_column = self.config.get("id_column", "id")
+        super().__init__(tps, duration, timeout, **kwargs)
+        self.embedding_vector = self.embed_word(word)
+        self._applied_params = weakref.WeakKeyDictionary()
+
+    def embed_batch(self, texts):
+        return embed_texts(self.config, texts, is_echo=True, truncate="NONE")
+
+    def embedding_model(self):
+        return embedding_model_id(self.config)
+
+    def embed_word(self, word):
+        return self.embed_words([word])[0].tolist()
+
+    @staticmethod
+    def load_config(file_path):
+        with open(file_path, 'r', encoding='utf-8') as file:
+            return yaml.safe_load(file)
+
+    def search_sql(self, search_filter=None):
+        # %b binds the pre-encoded vector in binary format, %s::vector parses a text literal
+        parameter = "%b" if self.vector_binding == "binary" else "%s::vector"
+        # the filter's predicate is inlined: every filter gets its own prepared statement and plan
+        where = "" if search_filter is None else f"WHERE {search_filter.sql('w')}"
+        # the distance is ordered by its alias, so that the vector parameter is bound only once
+        columns = self.fetch_columns(f"w.{self.id_column}", f"w.embedding <=> {parameter} AS distance", "w.text")
+        order = "distance" if self.fetch_mode == "distance" else f"embedding <=> {parameter}"
+        return f"""
+        SELECT {columns}
+        FROM {self.TABLE_NAME} w
+        {where}
+        ORDER BY {order}
+        LIMIT {self.recall_k}
+        """
+
+    @property
+    def BASE_SQL(self):
+        return self.search_sql()
+
+    @property
+    def WRITE_TABLE(self):
+        return self.config.get("write_table", self.TABLE_NAME)
+
+    def copy_sql(self, attributes=None):
+        columns = "text, embedding" if attributes is None else "text, embedding, bucket, category"
+        return f"COPY {self.WRITE_TABLE} ({columns}) FROM STDIN WITH (FORMAT BINARY)"
+
+    def encode_vector(self, vector, binding):
+        if binding == "binary":
+            return EncodedVector.encode(vector)
+        return vector_literal(vector)
+
+    @staticmethod
+    async def configure_connection(conn):
+        """Called by psycopg_pool once for every new connection."""
+        info = await TypeInfo.fetch(conn, "vector")
+        dumper = type("VectorBinaryDumper", (VectorBinaryDumper,), {"oid": info.oid})
+        conn.adapters.register_dumper(EncodedVector, dumper)
+
+    async def apply_search_settings(self, conn):
+        """InstrumentedPool setup: applies the current search params, once per connection and params version."""
+        version = self.search_params_version
+        if version and self._applied_params.get(conn) != version:
+            async with conn.cursor() as cur:
+                for statement in setting_statements(self.search_params):
+                    await cur.execute(statement)
+            self._applied_params[conn] = version
+
+    async def setup(self):
+        logging.debug("Creating PostgreSQL async connection pool with the following parameters:")
+        logging.debug(f"  host     : {self.config['pgvector_dbhost']}")
+        logging.debug(f"  port     : 5432")
+        logging.debug(f"  dbname   : {self.config['pgvector_dbname']}")
+        logging.debug(f"  user     : {self.config['pgvector_username']}")
+        logging.debug(f"  password : {'*' * len(self.config['pgvector_password'])}")
+
+        self.conn_pool = AsyncConnectionPool(
+            kwargs={
+                "host": self.config['pgvector_dbhost'],
+                "port": 5432,
+                "dbname": self.config['pgvector_dbname'],
+                "user": self.config['pgvector_username'],
+                "password": self.config['pgvector_password'],
+                "autocommit": True,
+                "options": f"-c statement_timeout={int(self.timeout * 1000)}",
+            },
+            min_size=self.max_concurrency,
+            max_size=self.max_concurrency,
+            configure=self.configure_connection,
+            open=False
+        )
+        await self.conn_pool.open(wait=True)
+        # putconn itself discards connections that come back broken
+        self.connection_pool = AsyncInstrumentedPool(
+            self.max_concurrency,
+            acquire=self.conn_pool.getconn,
+            release=self.conn_pool.putconn,
+            setup=self.apply_search_settings,
+            on_wait=self._record_pool_wait
+        )
+
+    async def teardown(self):
+        await self.conn_pool.close()
+
+    async def execute_query(self, query=None, search_filter=None):
+        embedding = self.encoded_vector(query)
+        conn = await self.connection_pool.acquire()
+        try:
+            async with conn.cursor() as cur:
+                # prepare=True: parsed and planned once per connection, then only bound and executed
+                await cur.execute(self.search_sql(search_filter), (embedding,), prepare=True)
+                return await cur.fetchall()
+        except QueryCanceled as e:
+            logging.error(f"Query cancelled by statement_timeout after {self.timeout} seconds.")
+            raise QueryTimeoutError(str(e)) from e
+        except Exception as e:
+            logging.error("Error during query execution: %s", e)
+            raise
+        finally:
+            await self.connection_pool.release(conn)
+
+    async def execute_batch(self, queries):
+        embeddings = [self.encoded_vector(query) for query in queries]
+        conn = await self.connection_pool.acquire()
+        try:
+            # pipeline mode: every search is sent before the first result is read, one round trip for the batch
+            async with conn.pipeline():
+                cursors = [conn.cursor() for _ in embeddings]
+                for cur, embedding in zip(cursors, embeddings):
+                    await cur.execute(self.BASE_SQL, (embedding,), prepare=True)
+                return [await cur.fetchall() for cur in cursors]
+        except QueryCanceled as e:
+            logging.error(f"Batched query cancelled by statement_timeout after {self.timeout} seconds.")
+            raise QueryTimeoutError(str(e)) from e
+        except Exception as e:
+            logging.error("Error during batched query execution: %s", e)
+            raise
+        finally:
+            await self.connection_pool.release(conn)
+
+    async def execute_write(self, rows):
+        attributes = self.write_attributes(rows)
+        payload = copy_binary_payload(rows, attributes)
+        conn = await self.connection_pool.acquire()
+        try:
+            async with conn.cursor() as cur:
+                async with cur.copy(self.copy_sql(attributes)) as copy:
+                    await copy.write(payload)
+        except QueryCanceled as e:
+            logging.error(f"COPY cancelled by statement_timeout after {self.timeout} seconds.")
+            raise QueryTimeoutError(str(e)) from e
+        except Exception as e:
+            logging.error("Error during COPY: %s", e)
+            raise
+        finally:
+            await self.connection_pool.release(conn)
+
+
+if __name__ == '__main__':
+    tps = int(os.environ.get("TPS", 10))
+    duration = int(os.environ.get("DURATION", 3))
+    timeout = int(os.environ.get("TIMEOUT", 10))
+    word = os.environ.get("WORD", "サヴォワ地方はどこの国？")
+    schedule = os.environ.get("SCHEDULE", "burst")
+    query_file = os.environ.get("QUERY_FILE")
+    query_order = os.environ.get("QUERY_ORDER", "rotate")
+    ground_truth_dir = os.environ.get("GROUND_TRUTH_DIR")
+    result_file = os.environ.get("RESULT_FILE")
+    metrics_port = int(os.environ["METRICS_PORT"]) if "METRICS_PORT" in os.environ else None
+    write_ratio = float(os.environ.get("WRITE_RATIO", 0))
+    write_batch_size = int(os.environ.get("WRITE_BATCH_SIZE", 100))
+    history_db = os.environ.get("HISTORY_DB")
+    run_label = os.environ.get("RUN_LABEL")
+    profile = os.environ.get("PROFILE")
+    search_batch_size = int(os.environ.get("SEARCH_BATCH_SIZE", 1))
+    trace_file = os.environ.get("TRACE_FILE")
+    trace_speedup = float(os.environ.get("TRACE_SPEEDUP", 1.0))
+    trace_start = os.environ.get("TRACE_START")
+    trace_end = os.environ.get("TRACE_END")
+    trace_window = int(os.environ.get("TRACE_WINDOW", 60))
+    filter_selectivities = ([float(s) for s in os.environ["FILTER_SELECTIVITIES"].split(",")]
+                            if "FILTER_SELECTIVITIES" in os.environ else None)
+    filter_attribute = os.environ.get("FILTER_ATTRIBUTE", "bucket")
+    query_cache = os.environ.get("QUERY_CACHE")
+    cache_threshold = float(os.environ.get("CACHE_THRESHOLD", 0.95))
+    cache_max_entries = int(os.environ.get("CACHE_MAX_ENTRIES", 10000))
+    cache_max_bytes = int(float(os.environ.get("CACHE_MAX_MB", 64)) * 1024 * 1024)
+    cache_ttl = float(os.environ["CACHE_TTL"]) if "CACHE_TTL" in os.environ else None
+    fetch_mode = os.environ.get("FETCH_MODE", "text")
+    vector_binding = os.environ.get("VECTOR_BINDING", "binary")
+
+    tester = OCI_Postgres_AsyncLoadTest(
+        tps=tps,
+        duration=duration,
+        timeout=timeout,
+        word=word,
+        schedule=schedule,
+        query_file=query_file,
+        query_order=query_order,
+        ground_truth_dir=ground_truth_dir,
+        vector_binding=vector_binding,
+        result_file=result_file,
+        metrics_port=metrics_port,
+        write_ratio=write_ratio,
+        write_batch_size=write_batch_size,
+        history_db=history_db,
+        run_label=run_label,
+        profile=profile,
+        search_batch_size=search_batch_size,
+        trace_file=trace_file,
+        trace_speedup=trace_speedup,
+        trace_start=trace_start,
+        trace_end=trace_end,
+        trace_window=trace_window,
+        filter_selectivities=filter_selectivities,
+        filter_attribute=filter_attribute,
+        query_cache=query_cache,
+        cache_threshold=cache_threshold,
+        cache_max_entries=cache_max_entries,
+        cache_max_bytes=cache_max_bytes,
+        cache_ttl=cache_ttl,
+        fetch_mode=fetch_mode
+    )
+    tester.run_test()
+    tester.close_all()
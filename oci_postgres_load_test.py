@@ -1,25 +1,88 @@
 import os
+import io
 import yaml
+import struct
 import psycopg2
+import re
 import logging
+import weakref
+import numpy as np
 from dotenv import load_dotenv
 from psycopg2 import pool
-from abstract_loader_test import AbstractLoaderTest
-from oci.config import from_file
-from oci.generative_ai_inference import GenerativeAiInferenceClient
-from oci.generative_ai_inference.models import EmbedTextDetails, OnDemandServingMode
-import random, time
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from psycopg2.errors import QueryCanceled
+from abstract_loader_test import AbstractLoaderTest, QueryTimeoutError, split_batch_rows
+from connection_pool import InstrumentedPool
+from genai_embedding import embed_texts, embedding_model_id
+
+PREPARED_STATEMENT = "vector_search"
+SETTING_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_.]*$")
+
+
+def setting_statements(params):
+    """RESET ALL followed by one SET per search parameter (e.g. hnsw.ef_search, ivfflat.probes)."""
+    statements = ["RESET ALL"]
+    for name, value in params.items():
+        if not SETTING_NAME.match(name):
+            raise ValueError(f"Invalid PostgreSQL setting name: {name}")
+        value = str(value).replace("'", "''")
+        statements.append(f"SET {name} = '{value}'")
+    return statements
+
+
+def vector_literal(vector):
+    """pgvector text representation; 9 significant digits round-trip float32 exactly."""
+    return "[" + ",".join([f"{x:.9g}" for x in vector]) + "]"
+
+
+def vector_binary(vector):
+    """pgvector binary format (also used by COPY BINARY): dimension, unused, big-endian float4 values."""
+    vector = np.asarray(vector, dtype=">f4")
+    return struct.pack(">HH", len(vector), 0) + vector.tobytes()
+
+
+def prepared_statement(search_filter=None):
+    """Name of the prepared search statement of a filter (or of the unfiltered search)."""
+    return PREPARED_STATEMENT if search_filter is None else f"{PREPARED_STATEMENT}_{search_filter.name}"
+
+
+COPY_BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+
+
+def copy_binary_payload(rows, attributes=None):
+    """
+    COPY ... (FORMAT BINARY) stream of (text, embedding) tuples for a batch of WriteRows, or of
+    (text, embedding, bucket, category) tuples given the filter attributes of the rows (see attribute_values).
+    """
+    parts = [COPY_BINARY_HEADER]
+    fields = 2 if attributes is None else 4
+    for i, row in enumerate(rows):
+        text = row.text.encode("utf-8")
+        vector = vector_binary(row.vector)
+        parts += [struct.pack(">hi", fields, len(text)), text, struct.pack(">i", len(vector)), vector]
+        if attributes is not None:
+            # int4 fields: length 4, then the big-endian value
+            parts.append(struct.pack(">iiii", 4, attributes["bucket"][i], 4, attributes["category"][i]))
+    parts.append(struct.pack(">h", -1))
+    return b"".join(parts)
+
 
 class OCI_Postgres_LoadTest(AbstractLoaderTest):
-    def __init__(self, tps, duration, timeout, word, config=None):
+    TABLE_NAME = "WIKI_JA_EMBEDDINGS_20250401_HNSW"
+    BINARY_BINDING_FALLBACK = "text (prepared)"
+
+    def __init__(self, tps, duration, timeout, word, config=None, **kwargs):
         if config is None:
             AbstractLoaderTest.setup_logging()
             config = self.load_config('config.yaml')
         self.config = config
         self.word = word
+        self.id_column = self.config.get("id_column", "id")
+        super().__init__(tps, duration, timeout, **kwargs)
         self.embedding_vector = self.embed_word(word)
-        super().__init__(tps, duration, timeout)
+        # search_params_version last applied to each pooled connection
+        self._applied_params = weakref.WeakKeyDictionary()
+        # pooled connections on which PREPARED_STATEMENT exists
+        self._prepared = weakref.WeakSet()
 
         # PostgreSQL connection pool
         logging.debug("Creating PostgreSQL connection pool with the following parameters:")
@@ -28,101 +91,271 @@ class OCI_Postgres_LoadTest(AbstractLoaderTest):
         logging.debug(f"  dbname   : {self.config['pgvector_dbname']}")
         logging.debug(f"  user     : {self.config['pgvector_username']}")
         logging.debug(f"  password : {'*' * len(self.config['pgvector_password'])}")
+        logging.debug(f"  statement_timeout : {int(self.timeout * 1000)} ms")
 
-        self.conn_pool = pool.SimpleConnectionPool(
-            minconn=1,
-            maxconn=self.tps * 2,
+        # the server cancels queries running longer than timeout, so no client-side watchdog thread is needed
+        # ThreadedConnectionPool is safe to share between the worker threads; all connections are opened up front
+        self.conn_pool = pool.ThreadedConnectionPool(
+            minconn=self.pool_size,
+            maxconn=self.pool_size,
             host=self.config['pgvector_dbhost'],
             port=5432,
             dbname=self.config['pgvector_dbname'],
             user=self.config['pgvector_username'],
-            password=self.config['pgvector_password']
+            password=self.config['pgvector_password'],
+            options=f"-c statement_timeout={int(self.timeout * 1000)}"
+        )
+        self.connection_pool = InstrumentedPool(
+            self.pool_size,
+            acquire=self.conn_pool.getconn,
+            release=self.conn_pool.putconn,
+            discard=lambda conn: self.conn_pool.putconn(conn, close=True),
+            setup=self.configure_connection,
+            on_wait=self._record_pool_wait
         )
 
+    def embed_batch(self, texts):
+        return embed_texts(self.config, texts, is_echo=True, truncate="NONE")
+
+    def embedding_model(self):
+        return embedding_model_id(self.config)
+
     def embed_word(self, word):
-        oci_config = from_file()
-        endpoint = self.config["service_endpoint"]
-        compartment_id = self.config["compartment_id"]
-        model_id = self.config.get("emb_llm_id", "cohere.embed-multilingual-v3.0")
-
-        client = GenerativeAiInferenceClient(config=oci_config, service_endpoint=endpoint)
-        result = client.embed_text(
-            embed_text_details=EmbedTextDetails(
-                inputs=[word],
-                serving_mode=OnDemandServingMode(model_id=model_id),
-                compartment_id=compartment_id,
-                is_echo=True,
-                truncate="NONE"
-            )
-        )
-        return result.data.embeddings[0]
+        return self.embed_words([word])[0].tolist()
 
     @staticmethod
     def load_config(file_path):
         with open(file_path, 'r', encoding='utf-8') as file:
             return yaml.safe_load(file)
 
+    def search_sql(self, parameter="%s::vector", search_filter=None):
+        where = "" if search_filter is None else f"WHERE {search_filter.sql('w')}"
+        # the distance is ordered by its alias, so that the vector parameter is bound only once
+        columns = self.fetch_columns(f"w.{self.id_column}", f"w.embedding <=> {parameter} AS distance", "w.text")
+        order = "distance" if self.fetch_mode == "distance" else f"embedding <=> {parameter}"
+        return f"""
+        SELECT {columns}
+        FROM {self.TABLE_NAME} w
+        {where}
+        ORDER BY {order}
+        LIMIT {self.recall_k}
+        """
+
     @property
     def BASE_SQL(self):
+        return self.search_sql()
+
+    @property
+    def BATCH_SQL(self):
+        """
+        Searches an array of query vectors in one statement: UNNEST numbers the vectors and a LATERAL
+        subquery runs the usual top-k search for each of them.
+        """
+        text = ", t.text" if self.fetch_mode == "text" else ""
         return f"""
-        SELECT w.text 
-        FROM WIKI_JA_EMBEDDINGS_20250401_HNSW w
-        ORDER BY embedding <=> %s::vector
-        LIMIT 4
+        SELECT q.ord - 1, {self.fetch_columns(f"w.{self.id_column}", "w.distance", "w.text")}
+        FROM unnest(%s::vector[]) WITH ORDINALITY AS q(embedding, ord)
+        CROSS JOIN LATERAL (
+            SELECT t.{self.id_column}{text}, t.embedding <=> q.embedding AS distance
+            FROM {self.TABLE_NAME} t
+            ORDER BY t.embedding <=> q.embedding
+            LIMIT {self.recall_k}
+        ) w
+        ORDER BY q.ord, w.distance
         """
 
+    @property
+    def WRITE_TABLE(self):
+        return self.config.get("write_table", self.TABLE_NAME)
+
+    def copy_sql(self, attributes=None):
+        # the id column is left to its default (identity / serial)
+        columns = "text, embedding" if attributes is None else "text, embedding, bucket, category"
+        return f"COPY {self.WRITE_TABLE} ({columns}) FROM STDIN WITH (FORMAT BINARY)"
+
+    def encode_vector(self, vector, binding):
+        # psycopg2 only sends parameters as text, so both bindings use a pgvector literal built once per query;
+        # "binary" additionally runs the search as a server-side prepared statement (parsed and planned once)
+        return vector_literal(vector)
+
+    def configure_connection(self, conn):
+        """Applies the current search params and prepares the search statement, once per connection."""
+        version = self.search_params_version
+        if version and self._applied_params.get(conn) != version:
+            with conn.cursor() as cur:
+                for statement in setting_statements(self.search_params):
+                    cur.execute(statement)
+            # commit so that the pool's rollback on putconn does not undo the settings
+            conn.commit()
+            self._applied_params[conn] = version
+            logging.debug("Applied search params %s to connection (once per connection)", self.search_params)
+        if self.vector_binding == "binary" and conn not in self._prepared:
+            with conn.cursor() as cur:
+                # one statement per filter, its predicate inlined so that the plan fits its selectivity
+                for search_filter in [None] + [f for f in self.search_filters if f is not None]:
+                    cur.execute(f"PREPARE {prepared_statement(search_filter)}(vector) AS "
+                                f"{self.search_sql('$1', search_filter)}")
+            conn.commit()
+            self._prepared.add(conn)
+
     def get_connection(self):
-        conn = self.conn_pool.getconn()
-        # if not hasattr(conn, '_ef_search_set'):
-        #     with conn.cursor() as cur:
-        #         cur.execute("SET hnsw.ef_search = 10;")
-        #         logging.info("SET hnsw.ef_search = 10 (once per connection);")
-        #     conn._ef_search_set = True  # フラグを立てる
-        return conn
+        return self.connection_pool.acquire()
 
-    def put_connection(self, conn):
-        self.conn_pool.putconn(conn)
+    def put_connection(self, conn, close=False):
+        self.connection_pool.release(conn, discard=close)
 
     def close_all(self):
         self.conn_pool.closeall()
 
-    def execute_query(self):
+    def iter_vectors(self, batch_size=1000):
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SET LOCAL statement_timeout = 0")
+            # named cursor: rows are streamed from the server in batches instead of being fetched at once
+            with conn.cursor(name="vector_export") as cur:
+                cur.itersize = batch_size
+                cur.execute(f"SELECT {self.id_column}, embedding::text FROM {self.TABLE_NAME}")
+                while True:
+                    rows = cur.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield [row[0] for row in rows], [np.array(row[1][1:-1].split(","), dtype=np.float32) for row in rows]
+        finally:
+            self.put_connection(conn)
+
+    def execute_query(self, query=None, search_filter=None):
+        embedding = self.encoded_vector(query)
         conn = self.get_connection()
+        discard = False
         try:
             with conn.cursor() as cur:
-                # dummy_value = random.randint(1, 10000)
-                sql = self.BASE_SQL
-                def run_sql():
-                    start_time = time.time()
-                    cur.execute(sql, (self.embedding_vector,))
-                    result = cur.fetchall()
-                    elapsed_ms = (time.time() - start_time) * 1000
-                    # print(f"Query execution + fetch time: {elapsed_ms:.2f} ms")
-                    return result
-
-                with ThreadPoolExecutor(max_workers=1) as executor:
-                    future = executor.submit(run_sql)
-                    return future.result(timeout=self.timeout)
-
-        except TimeoutError:
-            logging.error(f"Query timed out after {self.timeout} seconds.")
+                if self.vector_binding == "binary":
+                    cur.execute(f"EXECUTE {prepared_statement(search_filter)}(%s)", (embedding,))
+                else:
+                    cur.execute(self.search_sql(search_filter=search_filter), (embedding,))
+                return cur.fetchall()
+        except QueryCanceled as e:
+            # cancelled by statement_timeout; the pool rolls back the aborted transaction on putconn
+            logging.error(f"Query cancelled by statement_timeout after {self.timeout} seconds.")
+            raise QueryTimeoutError(str(e)) from e
+        except psycopg2.OperationalError as e:
+            discard = True
+            logging.error("Connection failed during query execution, discarding it: %s", e)
             raise
         except Exception as e:
             logging.error("Error during query execution: %s", e)
             raise
         finally:
-            self.put_connection(conn)
+            self.put_connection(conn, close=discard)
+
+    def execute_batch(self, queries):
+        # the vector literals travel as one text[] parameter, cast to vector[] by the server
+        embeddings = [self.encoded_vector(query) for query in queries]
+        conn = self.get_connection()
+        discard = False
+        try:
+            with conn.cursor() as cur:
+                cur.execute(self.BATCH_SQL, (embeddings,))
+                return split_batch_rows(cur.fetchall(), len(queries))
+        except QueryCanceled as e:
+            logging.error(f"Batched query cancelled by statement_timeout after {self.timeout} seconds.")
+            raise QueryTimeoutError(str(e)) from e
+        except psycopg2.OperationalError as e:
+            discard = True
+            logging.error("Connection failed during batched query execution, discarding it: %s", e)
+            raise
+        except Exception as e:
+            logging.error("Error during batched query execution: %s", e)
+            raise
+        finally:
+            self.put_connection(conn, close=discard)
+
+    def execute_write(self, rows):
+        attributes = self.write_attributes(rows)
+        payload = copy_binary_payload(rows, attributes)
+        conn = self.get_connection()
+        discard = False
+        try:
+            with conn.cursor() as cur:
+                cur.copy_expert(self.copy_sql(attributes), io.BytesIO(payload))
+            conn.commit()
+        except QueryCanceled as e:
+            logging.error(f"COPY cancelled by statement_timeout after {self.timeout} seconds.")
+            raise QueryTimeoutError(str(e)) from e
+        except psycopg2.OperationalError as e:
+            discard = True
+            logging.error("Connection failed during COPY, discarding it: %s", e)
+            raise
+        except Exception as e:
+            logging.error("Error during COPY: %s", e)
+            raise
+        finally:
+            self.put_connection(conn, close=discard)
 
 if __name__ == '__main__':
     tps = int(os.environ.get("TPS",10))
     duration = int(os.environ.get("DURATION", 3))
     timeout = int(os.environ.get("TIMEOUT", 10))
     word = os.environ.get("WORD", "サヴォワ地方はどこの国？")
+    schedule = os.environ.get("SCHEDULE", "burst")
+    query_file = os.environ.get("QUERY_FILE")
+    query_order = os.environ.get("QUERY_ORDER", "rotate")
+    ground_truth_dir = os.environ.get("GROUND_TRUTH_DIR")
+    result_file = os.environ.get("RESULT_FILE")
+    metrics_port = int(os.environ["METRICS_PORT"]) if "METRICS_PORT" in os.environ else None
+    write_ratio = float(os.environ.get("WRITE_RATIO", 0))
+    write_batch_size = int(os.environ.get("WRITE_BATCH_SIZE", 100))
+    history_db = os.environ.get("HISTORY_DB")
+    run_label = os.environ.get("RUN_LABEL")
+    profile = os.environ.get("PROFILE")
+    search_batch_size = int(os.environ.get("SEARCH_BATCH_SIZE", 1))
+    trace_file = os.environ.get("TRACE_FILE")
+    trace_speedup = float(os.environ.get("TRACE_SPEEDUP", 1.0))
+    trace_start = os.environ.get("TRACE_START")
+    trace_end = os.environ.get("TRACE_END")
+    trace_window = int(os.environ.get("TRACE_WINDOW", 60))
+    filter_selectivities = ([float(s) for s in os.environ["FILTER_SELECTIVITIES"].split(",")]
+                            if "FILTER_SELECTIVITIES" in os.environ else None)
+    filter_attribute = os.environ.get("FILTER_ATTRIBUTE", "bucket")
+    query_cache = os.environ.get("QUERY_CACHE")
+    cache_threshold = float(os.environ.get("CACHE_THRESHOLD", 0.95))
+    cache_max_entries = int(os.environ.get("CACHE_MAX_ENTRIES", 10000))
+    cache_max_bytes = int(float(os.environ.get("CACHE_MAX_MB", 64)) * 1024 * 1024)
+    cache_ttl = float(os.environ["CACHE_TTL"]) if "CACHE_TTL" in os.environ else None
+    fetch_mode = os.environ.get("FETCH_MODE", "text")
+    vector_binding = os.environ.get("VECTOR_BINDING", "binary")
 
     tester = OCI_Postgres_LoadTest(
         tps=tps,
         duration=duration,
         timeout=timeout,
-        word=word
+        word=word,
+        schedule=schedule,
+        query_file=query_file,
+        query_order=query_order,
+        ground_truth_dir=ground_truth_dir,
+        vector_binding=vector_binding,
+        result_file=result_file,
+        metrics_port=metrics_port,
+        write_ratio=write_ratio,
+        write_batch_size=write_batch_size,
+        history_db=history_db,
+        run_label=run_label,
+        profile=profile,
+        search_batch_size=search_batch_size,
+        trace_file=trace_file,
+        trace_speedup=trace_speedup,
+        trace_start=trace_start,
+        trace_end=trace_end,
+        trace_window=trace_window,
+        filter_selectivities=filter_selectivities,
+        filter_attribute=filter_attribute,
+        query_cache=query_cache,
+        cache_threshold=cache_threshold,
+        cache_max_entries=cache_max_entries,
+        cache_max_bytes=cache_max_bytes,
+        cache_ttl=cache_ttl,
+        fetch_mode=fetch_mode
     )
     tester.run_test()
@@ -0,0 +1,121 @@
+import os
+import csv
+import json
+import time
+import logging
+import itertools
+from abstract_loader_test import AbstractLoaderTest, concurrency_for
+
+
+def expand_grid(grid):
+    """
+    Expands {"hnsw.ef_search": [10, 40], "index": ["hnsw"]} into the list of every parameter combination.
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+class ParameterSweep:
+    """
+    Runs a fixed-length load at every point of a grid of search-time parameters and tabulates
+    recall vs QPS vs p99, re-using one tester and its connection pool for all points.
+    """
+
+    def __init__(self, tester, grid, point_duration=30, cooldown=2):
+        """
+        :param tester: AbstractLoaderTest instance; pass query_file and ground_truth_dir to it to measure recall
+        :param grid: Dict of parameter name -> list of values, see AbstractLoaderTest.apply_search_params
+        :param point_duration: Seconds of load at each grid point
+        :param cooldown: Seconds to pause between points
+        """
+        self.tester = tester
+        self.points = expand_grid(grid)
+        self.point_duration = point_duration
+        self.cooldown = cooldown
+        self.results = []
+
+    def run(self):
+        for i, params in enumerate(self.points):
+            if i:
+                time.sleep(self.cooldown)
+            self.tester.apply_search_params(params)
+            self.tester.duration = self.point_duration
+            stats = self.tester.run_load()
+            counters = stats.counters
+            latency = stats.latency
+            row = {
+                "params": params,
+                "qps": counters["success"] / stats.elapsed if stats.elapsed else 0.0,
+                "recall": stats.recall,
+                "p50_ms": latency.percentile(50) * 1000 if latency.count else None,
+                "p99_ms": latency.percentile(99) * 1000 if latency.count else None,
+                "errors": counters["errors"] + counters["timeouts"],
+            }
+            self.results.append(row)
+            logging.info("Sweep point %d/%d %s: %.1f QPS, recall %s, p99 %s ms",
+                         i + 1, len(self.points), params, row["qps"], _format(row["recall"], 4),
+                         _format(row["p99_ms"], 2))
+        self.report_results()
+        return self.results
+
+    def pareto_front(self):
+        """Rows not dominated by another row with both higher (or equal) recall and higher (or equal) QPS."""
+        rows = [r for r in self.results if r["recall"] is not None]
+        return [r for r in rows
+                if not any(o is not r and o["recall"] >= r["recall"] and o["qps"] >= r["qps"]
+                           and (o["recall"] > r["recall"] or o["qps"] > r["qps"]) for o in rows)]
+
+    def report_results(self):
+        front = self.pareto_front()
+        logging.info("=== Parameter Sweep Results ===")
+        logging.info("Params | QPS | Recall@%d | p50 ms | p99 ms | Errors | Pareto", self.tester.recall_k)
+        for row in self.results:
+            logging.info("%s | %.1f | %s | %s | %s | %d | %s", json.dumps(row["params"]), row["qps"],
+                         _format(row["recall"], 4), _format(row["p50_ms"], 2), _format(row["p99_ms"], 2),
+                         row["errors"], "*" if any(row is r for r in front) else "")
+
+    def write_csv(self, path):
+        names = list(self.points[0]) if self.points else []
+        front = self.pareto_front()
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(names + ["qps", "recall", "p50_ms", "p99_ms", "errors", "pareto"])
+            for row in self.results:
+                writer.writerow([row["params"][name] for name in names] +
+                                [row["qps"], row["recall"], row["p50_ms"], row["p99_ms"], row["errors"],
+                                 any(row is r for r in front)])
+
+
+def _format(value, digits):
+    return "-" if value is None else f"{value:.{digits}f}"
+
+
+if __name__ == '__main__':
+    import importlib
+    import inspect
+
+    # SWEEP_GRID='{"hnsw.ef_search": [10, 20, 40, 80, 160]}' for pgvector,
+    # '{"index": ["ivf"], "probes": [2, 4, 8, 16]}' for Oracle, '{"ef": [16, 32, 64]}' for Milvus
+    AbstractLoaderTest.setup_logging()
+    module_name, class_name = os.environ.get("TESTER", "oci_postgres_load_test:OCI_Postgres_LoadTest").split(":")
+    tester_class = getattr(importlib.import_module(module_name), class_name)
+    word = os.environ.get("WORD", "サヴォワ地方はどこの国？")
+    word_arg = "query" if "query" in inspect.signature(tester_class).parameters else "word"
+    point_duration = int(os.environ.get("DURATION", 30))
+    tps = int(os.environ.get("TPS", 10))
+    pool_size = (int(os.environ["POOL_SIZE"]) if "POOL_SIZE" in os.environ else
+                 concurrency_for(tps, float(os.environ.get("EXPECTED_LATENCY_MS", 50)) / 1000))
+
+    tester = tester_class(
+        tps=tps,
+        duration=point_duration,
+        timeout=int(os.environ.get("TIMEOUT", 10)),
+        schedule=os.environ.get("SCHEDULE", "constant"),
+        query_file=os.environ.get("QUERY_FILE"),
+        ground_truth_dir=os.environ.get("GROUND_TRUTH_DIR"),
+        pool_size=pool_size,
+        **{word_arg: word}
+    )
+    sweep = ParameterSweep(tester, json.loads(os.environ["SWEEP_GRID"]), point_duration=point_duration)
+    sweep.run()
+    sweep.write_csv(os.environ.get("SWEEP_CSV", "sweep_results.csv"))
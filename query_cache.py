@@ -0,0 +1,193 @@
+import sys
+import time
+import threading
+from collections import OrderedDict, namedtuple, Counter
+import numpy as np
+
+CacheEntry = namedtuple("CacheEntry", ["result", "size", "created", "slot"])
+# bookkeeping bytes of one entry besides its result: key, OrderedDict node, CacheEntry
+ENTRY_OVERHEAD = 256
+
+
+def approximate_size(value, depth=0):
+    """Approximate bytes held by a query result: rows of tuples, lists of dicts (Milvus hits), strings, numbers."""
+    if isinstance(value, str):
+        return sys.getsizeof(value)
+    if isinstance(value, (bytes, bytearray, int, float)) or value is None:
+        return sys.getsizeof(value)
+    if isinstance(value, np.ndarray):
+        return value.nbytes + 112
+    if depth > 6:
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approximate_size(k, depth + 1) + approximate_size(v, depth + 1)
+                                          for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(approximate_size(v, depth + 1) for v in value)
+    return sys.getsizeof(value)
+
+
+class QueryCache:
+    """
+    Client-side result cache in front of a vector store, measuring what caching repeated and near-duplicate
+    queries would save.
+
+    "exact" returns the cached result of the same query text (and filter). "semantic" additionally returns the
+    result of the most similar recently cached query vector when their cosine similarity reaches threshold:
+    the cached vectors are kept in a matrix scored with one NumPy product per lookup, outside the lock.
+    Entries are evicted least recently used first once max_entries or max_bytes is exceeded, and expire
+    ttl seconds after they were stored. Failed searches are not cached.
+    """
+    MODES = ("exact", "semantic")
+
+    def __init__(self, mode="exact", threshold=0.95, max_entries=10000, max_bytes=64 * 1024 * 1024, ttl=None):
+        """
+        :param mode: "exact" or "semantic"
+        :param threshold: Minimum cosine similarity of a semantic hit
+        :param max_entries: Maximum number of cached results
+        :param max_bytes: Memory cap: approximate bytes of the cached results (and vectors, in semantic mode)
+        :param ttl: Seconds after which an entry expires, None to keep entries until they are evicted
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown cache mode '{mode}', expected one of {self.MODES}")
+        self.mode = mode
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Empties the cache, e.g. at the start of every run, so that runs do not inherit each other's entries."""
+        with self._lock:
+            self._entries = OrderedDict()
+            self.bytes = 0
+            # eviction reason ("capacity", "memory", "ttl") -> entries evicted
+            self.evictions = Counter()
+            # semantic mode: one normalised vector per slot, grown by doubling up to max_entries rows
+            self._matrix = None
+            self._slot_keys = []
+            self._slot_filters = None
+            self._valid = None
+            self._free_slots = []
+            self._used_slots = 0
+            self._filter_ids = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(query, search_filter=None):
+        return (None if query is None else query.text, None if search_filter is None else search_filter.name)
+
+    def _expired(self, entry, now):
+        return self.ttl is not None and now - entry.created > self.ttl
+
+    def lookup(self, query, vector, search_filter=None):
+        """
+        Returns ("exact" or "semantic", cached result) on a hit, None on a miss.
+        :param vector: Query vector, compared with the cached vectors in semantic mode
+        """
+        key = self.key(query, search_filter)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry, now):
+                    self._entries.move_to_end(key)
+                    return "exact", entry.result
+                self._remove(key, "ttl")
+            if self.mode != "semantic" or self._matrix is None:
+                return None
+            matrix, used, valid, slot_filters = self._matrix, self._used_slots, self._valid, self._slot_filters
+            filter_id = self._filter_ids.get(key[1])
+        if filter_id is None:
+            return None
+        vector = _normalize(vector)
+        scores = matrix[:used] @ vector
+        scores[~(valid[:used] & (slot_filters[:used] == filter_id))] = -np.inf
+        slot = int(np.argmax(scores)) if used else 0
+        if not used or scores[slot] < self.threshold:
+            return None
+        with self._lock:
+            # the slot may have been evicted or reused since the snapshot
+            candidate_key = self._slot_keys[slot] if slot < len(self._slot_keys) else None
+            entry = self._entries.get(candidate_key) if candidate_key is not None else None
+            if entry is None or entry.slot != slot or candidate_key[1] != key[1]:
+                return None
+            if self._expired(entry, now):
+                self._remove(candidate_key, "ttl")
+                return None
+            if float(self._matrix[slot] @ vector) < self.threshold:
+                return None
+            self._entries.move_to_end(candidate_key)
+            return "semantic", entry.result
+
+    def store(self, query, vector, result, search_filter=None):
+        """Caches the result of a miss, evicting older entries as needed."""
+        key = self.key(query, search_filter)
+        size = approximate_size(result) + ENTRY_OVERHEAD
+        if self.mode == "semantic":
+            vector = _normalize(vector)
+            size += vector.nbytes
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key, None)
+            slot = self._allocate_slot(key, vector) if self.mode == "semantic" else None
+            self._entries[key] = CacheEntry(result, size, time.monotonic(), slot)
+            self.bytes += size
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)), "capacity")
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)), "memory")
+
+    def _allocate_slot(self, key, vector):
+        if self._matrix is None:
+            capacity = min(256, self.max_entries + 1)
+            self._matrix = np.zeros((capacity, len(vector)), dtype=np.float32)
+            self._valid = np.zeros(capacity, dtype=bool)
+            self._slot_filters = np.full(capacity, -1, dtype=np.int32)
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            if self._used_slots == len(self._matrix):
+                # store() inserts before evicting, so one slot more than max_entries may be in use
+                self._grow(min(2 * len(self._matrix), self.max_entries + 1))
+            slot = self._used_slots
+            self._used_slots += 1
+            self._slot_keys.append(None)
+        filter_id = self._filter_ids.setdefault(key[1], len(self._filter_ids))
+        self._matrix[slot] = vector
+        self._slot_filters[slot] = filter_id
+        self._slot_keys[slot] = key
+        self._valid[slot] = True
+        return slot
+
+    def _grow(self, capacity):
+        # new arrays rather than resizing in place: lookups may be scoring a snapshot of the old ones
+        matrix = np.zeros((capacity, self._matrix.shape[1]), dtype=np.float32)
+        matrix[:len(self._matrix)] = self._matrix
+        valid = np.zeros(capacity, dtype=bool)
+        valid[:len(self._valid)] = self._valid
+        slot_filters = np.full(capacity, -1, dtype=np.int32)
+        slot_filters[:len(self._slot_filters)] = self._slot_filters
+        self._matrix, self._valid, self._slot_filters = matrix, valid, slot_filters
+
+    def _remove(self, key, reason):
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+        if entry.slot is not None:
+            self._valid[entry.slot] = False
+            self._slot_keys[entry.slot] = None
+            self._free_slots.append(entry.slot)
+        if reason:
+            self.evictions[reason] += 1
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
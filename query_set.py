@@ -0,0 +1,169 @@
+import os
+import re
+import json
+import fcntl
+import random
+import hashlib
+import logging
+import itertools
+from collections import namedtuple
+from contextlib import contextmanager
+import numpy as np
+
+Query = namedtuple("Query", ["index", "text", "vector"])
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache for one embedding model.
+
+    Vectors are appended as raw float32 rows to vectors.f32 and read back through a read-only memory map,
+    so every thread (and every process) shares the same pages instead of holding its own copy.
+    index.json maps the SHA-256 of each text to its row.
+    """
+
+    def __init__(self, cache_dir, model_id):
+        """
+        :param cache_dir: Base directory of the cache; one sub-directory is created per model
+        :param model_id: Identifier of the embedding model (and input type) the vectors were produced with
+        """
+        self.model_id = model_id
+        self.directory = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9._-]+", "_", model_id))
+        os.makedirs(self.directory, exist_ok=True)
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.index_path = os.path.join(self.directory, "index.json")
+        self._read_index()
+
+    def _read_index(self):
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            self.dimension = index["dimension"]
+            self.rows = index["rows"]
+        else:
+            self.dimension = None
+            self.rows = {}
+
+    @contextmanager
+    def locked(self):
+        """Serialises writers across threads and processes sharing the cache directory."""
+        with open(os.path.join(self.directory, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._read_index()
+                yield self
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def missing(self, texts):
+        return [t for t in dict.fromkeys(texts) if text_hash(t) not in self.rows]
+
+    def add(self, texts, vectors):
+        """Appends vectors for texts; must be called inside locked()."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dimension is None:
+            self.dimension = int(vectors.shape[1])
+        elif vectors.shape[1] != self.dimension:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match cache ({self.dimension})")
+        first_row = len(self.rows)
+        with open(self.vectors_path, "ab") as f:
+            f.seek(first_row * self.dimension * 4)
+            f.truncate()
+            f.write(vectors.tobytes())
+        for offset, text in enumerate(texts):
+            self.rows[text_hash(text)] = first_row + offset
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model_id": self.model_id, "dimension": self.dimension, "rows": self.rows}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def matrix(self):
+        """Returns all cached vectors as a read-only (rows, dimension) float32 memory map."""
+        return np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.rows), self.dimension))
+
+    def row_indices(self, texts):
+        return np.fromiter((self.rows[text_hash(t)] for t in texts), dtype=np.int64, count=len(texts))
+
+    def embed(self, texts, embed_batch, batch_size=96):
+        """
+        Makes sure every text is cached, calling embed_batch only for the ones that are not.
+        Returns (matrix, rows) where matrix[rows[i]] is the vector of texts[i].
+        """
+        if self.missing(texts):
+            with self.locked():
+                missing = self.missing(texts)
+                for start in range(0, len(missing), batch_size):
+                    batch = missing[start:start + batch_size]
+                    logging.info("Embedding queries %d-%d of %d with %s",
+                                 start + 1, start + len(batch), len(missing), self.model_id)
+                    self.add(batch, embed_batch(batch))
+        return self.matrix(), self.row_indices(texts)
+
+
+class QuerySet:
+    """
+    A corpus of query texts and their embeddings, drawn from by execute_query in rotation or at random.
+    """
+    ORDERS = ("rotate", "random")
+
+    def __init__(self, texts, matrix, rows, order="rotate", seed=None):
+        """
+        :param texts: Query texts
+        :param matrix: float32 matrix (usually a memory map) holding the query vectors
+        :param rows: Row of matrix for each text
+        :param order: "rotate" walks through the queries in file order, "random" draws uniformly
+        """
+        if order not in self.ORDERS:
+            raise ValueError(f"Unknown query order '{order}', expected one of {self.ORDERS}")
+        self.texts = texts
+        self.matrix = matrix
+        self.rows = rows
+        self.order = order
+        self._counter = itertools.count()
+        self._random = random.Random(seed)
+
+    @staticmethod
+    def read_texts(path):
+        """Reads queries from a text file (one per line) or a JSONL file with a "text" or "query" field."""
+        texts = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                if path.endswith(".jsonl"):
+                    record = json.loads(line)
+                    line = record.get("text", record.get("query"))
+                texts.append(line)
+        return texts
+
+    @classmethod
+    def load(cls, path, embed_batch, model_id, cache_dir=".embedding_cache", order="rotate", seed=None):
+        """
+        :param path: Query file (.txt or .jsonl)
+        :param embed_batch: Callable embedding a list of texts, e.g. a backend's embed_batch
+        :param model_id: Embedding model identifier used as the cache key
+        """
+        texts = cls.read_texts(path)
+        if not texts:
+            raise ValueError(f"No queries found in {path}")
+        matrix, rows = EmbeddingCache(cache_dir, model_id).embed(texts, embed_batch)
+        logging.info("Loaded %d queries from %s (dimension %d)", len(texts), path, matrix.shape[1])
+        return cls(texts, matrix, rows, order, seed)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def query(self, index):
+        return Query(index, self.texts[index], self.matrix[self.rows[index]])
+
+    def next_query(self):
+        if self.order == "random":
+            index = self._random.randrange(len(self.texts))
+        else:
+            index = next(self._counter) % len(self.texts)
+        return self.query(index)
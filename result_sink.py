@@ -0,0 +1,129 @@
+import json
+import atexit
+import logging
+import threading
+from collections import deque
+
+RESULT_FIELDS = ("run", "backend", "operation", "query_index", "scheduled", "started", "completed", "latency_ms",
+                 "outcome", "error", "rows", "late", "result_bytes")
+
+
+class ResultSink:
+    """
+    Streams one record per operation to a JSONL or Parquet file.
+
+    Query threads only append a tuple to an in-memory deque (thread-safe without a lock); a background
+    thread drains it every flush_interval seconds and writes the records in batches, so recording adds
+    neither lock contention nor disk I/O to the query path.
+    """
+    FORMATS = ("jsonl", "parquet")
+
+    def __init__(self, path, format=None, batch_size=10000, flush_interval=1.0):
+        """
+        :param path: Output file; records are appended to an existing JSONL file
+        :param format: "jsonl" or "parquet" (defaults to the file extension, then jsonl)
+        :param batch_size: Records per write (and per Parquet row group)
+        :param flush_interval: Seconds between drains of the buffer by the writer thread
+        """
+        if format is None:
+            format = "parquet" if path.endswith(".parquet") else "jsonl"
+        if format not in self.FORMATS:
+            raise ValueError(f"Unknown result format '{format}', expected one of {self.FORMATS}")
+        self.path = path
+        self.format = format
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self._buffer = deque()
+        # serialises the writer thread and flush()/close(); never taken by query threads
+        self._write_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._file = None
+        self._parquet_writer = None
+        self._thread = threading.Thread(target=self._run, name="result-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, record):
+        """Queues one record, a tuple ordered as RESULT_FIELDS; called from query threads."""
+        self._buffer.append(record)
+
+    def _run(self):
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logging.exception("Failed to write results to %s", self.path)
+
+    def flush(self):
+        """Writes every queued record; blocks until they are on disk (or handed to the Parquet writer)."""
+        with self._write_lock:
+            batch = []
+            while True:
+                try:
+                    batch.append(self._buffer.popleft())
+                except IndexError:
+                    break
+                if len(batch) >= self.batch_size:
+                    self._write(batch)
+                    batch = []
+            if batch:
+                self._write(batch)
+            if self._file is not None:
+                self._file.flush()
+
+    def _write(self, batch):
+        if self.format == "jsonl":
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.writelines(json.dumps(dict(zip(RESULT_FIELDS, record)), ensure_ascii=False) + "\n"
+                                  for record in batch)
+        else:
+            self._write_parquet(batch)
+        self.written += len(batch)
+
+    def _write_parquet(self, batch):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("pyarrow is required for Parquet results (pip install pyarrow)") from e
+        columns = {name: [record[i] for record in batch] for i, name in enumerate(RESULT_FIELDS)}
+        if self._parquet_writer is None:
+            table = pa.table(columns, schema=_parquet_schema(pa))
+            self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+        else:
+            table = pa.table(columns, schema=self._parquet_writer.schema)
+        self._parquet_writer.write_table(table)
+
+    def close(self):
+        """Stops the writer thread and writes what is left; Parquet files are only readable once closed."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._thread.join()
+        self.flush()
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+            if self._parquet_writer is not None:
+                self._parquet_writer.close()
+        logging.info("Wrote %d result records to %s", self.written, self.path)
+
+
+def _parquet_schema(pa):
+    return pa.schema([
+        ("run", pa.int32()),
+        ("backend", pa.string()),
+        ("operation", pa.string()),
+        ("query_index", pa.int64()),
+        ("scheduled", pa.float64()),
+        ("started", pa.float64()),
+        ("completed", pa.float64()),
+        ("latency_ms", pa.float64()),
+        ("outcome", pa.string()),
+        ("error", pa.string()),
+        ("rows", pa.int32()),
+        ("late", pa.bool_()),
+        ("result_bytes", pa.int64()),
+    ])
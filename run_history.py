@@ -0,0 +1,238 @@
+import os
+import sys
+import json
+import math
+import socket
+import sqlite3
+import logging
+import platform
+import datetime
+import subprocess
+from load_stats import LoadStats
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recorded TEXT NOT NULL,
+    label TEXT,
+    backend TEXT NOT NULL,
+    git_revision TEXT,
+    config TEXT NOT NULL,
+    environment TEXT NOT NULL,
+    qps REAL,
+    p50_ms REAL,
+    p90_ms REAL,
+    p99_ms REAL,
+    p999_ms REAL,
+    error_rate REAL,
+    recall REAL,
+    stats TEXT NOT NULL
+)
+"""
+# summary columns compared by compare_runs; True if a higher value is better
+METRICS = {"qps": True, "p50_ms": False, "p99_ms": False, "error_rate": False}
+# two-sided 95% critical values of Student's t for 1-30 degrees of freedom
+T_CRITICAL_95 = (12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228, 2.201, 2.179, 2.160, 2.145,
+                 2.131, 2.120, 2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048,
+                 2.045, 2.042)
+
+
+def git_revision(path=None):
+    """Commit of the repository at path (this file's by default), suffixed with -dirty if it has changes."""
+    cwd = path or os.path.dirname(os.path.abspath(__file__))
+    try:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], cwd=cwd, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=cwd,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return revision + ("-dirty" if status.strip() else "")
+
+
+def environment():
+    return {
+        "host": socket.gethostname(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def summarize(stats):
+    """Summary metrics of a LoadStats, as stored in the columns of the runs table."""
+    counters = stats.counters
+    latency = stats.latency
+
+    def ms(p):
+        return latency.percentile(p) * 1000 if latency.count else None
+
+    return {
+        "qps": counters["success"] / stats.elapsed if stats.elapsed else 0.0,
+        "p50_ms": ms(50),
+        "p90_ms": ms(90),
+        "p99_ms": ms(99),
+        "p999_ms": ms(99.9),
+        "error_rate": (counters["errors"] + counters["timeouts"]) / counters["sent"] if counters["sent"] else 0.0,
+        "recall": stats.recall,
+    }
+
+
+class RunHistory:
+    """
+    SQLite store of finished runs: configuration, backend, git revision, environment,
+    summary metrics and the full merged LoadStats (counters and latency histograms).
+    """
+
+    def __init__(self, path="run_history.db"):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute(SCHEMA)
+
+    def save(self, stats, backend, config, label=None):
+        """
+        Stores one run and returns its id.
+        :param backend: Tester class name
+        :param config: JSON-serialisable test configuration (rate, schedule, search params, ...)
+        :param label: Optional name grouping repeated runs of the same setup, e.g. "pg16-hnsw-m16"
+        """
+        summary = summarize(stats)
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO runs (recorded, label, backend, git_revision, config, environment, qps, p50_ms, "
+                "p90_ms, p99_ms, p999_ms, error_rate, recall, stats) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (datetime.datetime.now().isoformat(timespec="seconds"), label, backend, git_revision(),
+                 json.dumps(config, default=str), json.dumps(environment()), summary["qps"], summary["p50_ms"],
+                 summary["p90_ms"], summary["p99_ms"], summary["p999_ms"], summary["error_rate"],
+                 summary["recall"], json.dumps(stats.to_dict()))
+            )
+        logging.info("Saved run %d (%s) to %s", cursor.lastrowid, label or "unlabelled", self.path)
+        return cursor.lastrowid
+
+    def runs(self, selector):
+        """Runs matching selector: a run id, or a label selecting every repeat with that label."""
+        if str(selector).isdigit():
+            rows = self.conn.execute("SELECT * FROM runs WHERE id = ?", (int(selector),)).fetchall()
+        else:
+            rows = self.conn.execute("SELECT * FROM runs WHERE label = ? ORDER BY id", (selector,)).fetchall()
+        if not rows:
+            raise ValueError(f"No runs match '{selector}' in {self.path}")
+        return rows
+
+    def stats(self, run_id):
+        row = self.conn.execute("SELECT stats FROM runs WHERE id = ?", (run_id,)).fetchone()
+        return LoadStats.from_dict(json.loads(row["stats"]))
+
+    def list(self, limit=20):
+        return self.conn.execute("SELECT * FROM runs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+def record_run(path, stats, backend, config, label=None):
+    """Saves a finished run to the RunHistory at path."""
+    history = RunHistory(path)
+    try:
+        return history.save(stats, backend, config, label)
+    finally:
+        history.close()
+
+
+def _t_critical(df):
+    if df < 1:
+        return None
+    if df <= len(T_CRITICAL_95):
+        return T_CRITICAL_95[int(df) - 1]
+    return 2.021 if df <= 40 else 2.000 if df <= 60 else 1.980 if df <= 120 else 1.960
+
+
+def _mean_variance(values):
+    mean = sum(values) / len(values)
+    variance = sum((v - mean) ** 2 for v in values) / (len(values) - 1) if len(values) > 1 else None
+    return mean, variance
+
+
+def difference_interval(baseline, candidate):
+    """
+    95% Welch confidence interval of mean(candidate) - mean(baseline), or None with fewer than two runs on a side.
+    """
+    if len(baseline) < 2 or len(candidate) < 2:
+        return None
+    mean_b, var_b = _mean_variance(baseline)
+    mean_c, var_c = _mean_variance(candidate)
+    se_b, se_c = var_b / len(baseline), var_c / len(candidate)
+    se = math.sqrt(se_b + se_c)
+    if se == 0:
+        return mean_c - mean_b, mean_c - mean_b
+    # Welch-Satterthwaite degrees of freedom, rounded down (conservative)
+    df = (se_b + se_c) ** 2 / (se_b ** 2 / (len(baseline) - 1) + se_c ** 2 / (len(candidate) - 1))
+    half_width = _t_critical(math.floor(df)) * se
+    return mean_c - mean_b - half_width, mean_c - mean_b + half_width
+
+
+def compare_runs(baseline_rows, candidate_rows, min_change=0.0):
+    """
+    Compares the summary metrics of two groups of runs. A metric regresses significantly when the 95% interval
+    of the difference lies entirely on its worse side and the mean moved by more than min_change (a fraction).
+    Returns one dict per metric.
+    """
+    results = []
+    for metric, higher_is_better in METRICS.items():
+        baseline = [row[metric] for row in baseline_rows if row[metric] is not None]
+        candidate = [row[metric] for row in candidate_rows if row[metric] is not None]
+        if not baseline or not candidate:
+            continue
+        mean_b, mean_c = sum(baseline) / len(baseline), sum(candidate) / len(candidate)
+        change = (mean_c - mean_b) / mean_b if mean_b else None
+        interval = difference_interval(baseline, candidate)
+        worse = (mean_c < mean_b) if higher_is_better else (mean_c > mean_b)
+        significant = interval is not None and (interval[1] < 0 if higher_is_better else interval[0] > 0)
+        if change is not None and abs(change) <= min_change:
+            significant = False
+        results.append({
+            "metric": metric,
+            "baseline": mean_b,
+            "candidate": mean_c,
+            "change": change,
+            "interval": interval,
+            "regression": significant and worse,
+            "improvement": significant and not worse,
+        })
+    return results
+
+
+def log_comparison(results, baseline, candidate):
+    logging.info("=== Run Comparison: %s (baseline) vs %s ===", baseline, candidate)
+    logging.info("Metric | Baseline | Candidate | Change | 95% CI of difference | Verdict")
+    for r in results:
+        interval = "-" if r["interval"] is None else f"[{r['interval'][0]:+.3f}, {r['interval'][1]:+.3f}]"
+        change = "-" if r["change"] is None else f"{r['change'] * 100:+.1f}%"
+        verdict = "REGRESSION" if r["regression"] else "improved" if r["improvement"] else (
+            "no significant change" if r["interval"] is not None else "needs >= 2 runs per side")
+        logging.info("%s | %.3f | %.3f | %s | %s | %s", r["metric"], r["baseline"], r["candidate"], change,
+                     interval, verdict)
+
+
+if __name__ == '__main__':
+    # python run_history.py list
+    # BASELINE=pg16 CANDIDATE=pg17 python run_history.py compare   (labels, or single run ids)
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    history = RunHistory(os.environ.get("HISTORY_DB", "run_history.db"))
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if command == "list":
+        for row in history.list(int(os.environ.get("LIMIT", 20))):
+            logging.info("%4d %s %-20s %-28s %s %8.1f QPS, p99 %s ms", row["id"], row["recorded"], row["label"] or "-",
+                         row["backend"], (row["git_revision"] or "-")[:12], row["qps"],
+                         "-" if row["p99_ms"] is None else f"{row['p99_ms']:.2f}")
+    elif command == "compare":
+        baseline, candidate = os.environ["BASELINE"], os.environ["CANDIDATE"]
+        results = compare_runs(history.runs(baseline), history.runs(candidate),
+                               float(os.environ.get("MIN_CHANGE", 0.0)))
+        log_comparison(results, baseline, candidate)
+        if any(r["regression"] for r in results):
+            sys.exit(1)
+    else:
+        sys.exit(f"Unknown command '{command}', expected list or compare")
@@ -0,0 +1,182 @@
+import os
+import csv
+import time
+import logging
+from abstract_loader_test import AbstractLoaderTest, concurrency_for
+
+
+class SaturationSearch:
+    """
+    Finds the highest rate a tester can sustain within an SLO by raising the offered TPS step by step,
+    or by binary search, re-using the tester (and its warm connection pool) for every step.
+    """
+    MODES = ("step", "binary")
+
+    def __init__(self, tester, start_tps, max_tps, step_tps=None, mode="step", step_duration=30,
+                 max_p99_ms=None, max_error_rate=0.01, min_throughput_ratio=0.95, precision_tps=None, cooldown=2):
+        """
+        :param tester: AbstractLoaderTest instance; build it with tps=max_tps and a pool_size for the concurrency
+                       expected at that rate (see concurrency_for)
+        :param start_tps: First (lowest) offered rate
+        :param max_tps: Highest offered rate to try
+        :param step_tps: Increment between steps in "step" mode (defaults to start_tps)
+        :param mode: "step" raises the rate until the SLO breaks, "binary" bisects between start_tps and max_tps
+        :param step_duration: Seconds of load at each rate
+        :param max_p99_ms: SLO on p99 latency in milliseconds (None to ignore)
+        :param max_error_rate: SLO on the fraction of failed or timed-out operations
+        :param min_throughput_ratio: Minimum sustained QPS / offered TPS; below it the store is falling behind
+        :param precision_tps: Binary search stops once the bracket is narrower than this (defaults to 1% of max_tps)
+        :param cooldown: Seconds to pause between steps
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown mode '{mode}', expected one of {self.MODES}")
+        self.tester = tester
+        self.start_tps = start_tps
+        self.max_tps = max_tps
+        self.step_tps = step_tps or start_tps
+        self.mode = mode
+        self.step_duration = step_duration
+        self.max_p99_ms = max_p99_ms
+        self.max_error_rate = max_error_rate
+        self.min_throughput_ratio = min_throughput_ratio
+        self.precision_tps = precision_tps or max(1, max_tps // 100)
+        self.cooldown = cooldown
+        self.curve = []
+        self.best = None
+
+    def run(self):
+        if self.mode == "step":
+            self._search_steps()
+        else:
+            self._search_binary()
+        self.report_results()
+        return self.best
+
+    def _search_steps(self):
+        tps = self.start_tps
+        while tps <= self.max_tps:
+            point = self.measure(tps)
+            if not point["slo_met"]:
+                break
+            self.best = point
+            tps += self.step_tps
+
+    def _search_binary(self):
+        low, high = self.start_tps, self.max_tps
+        point = self.measure(low)
+        if not point["slo_met"]:
+            return
+        self.best = point
+        point = self.measure(high)
+        if point["slo_met"]:
+            self.best = point
+            return
+        while high - low > self.precision_tps:
+            mid = (low + high) // 2
+            point = self.measure(mid)
+            if point["slo_met"]:
+                self.best = point
+                low = mid
+            else:
+                high = mid
+
+    def measure(self, tps):
+        """Runs one step at the given offered rate and returns its point of the latency/throughput curve."""
+        if self.curve:
+            time.sleep(self.cooldown)
+        self.tester.tps = tps
+        self.tester.duration = self.step_duration
+        stats = self.tester.run_load()
+        counters = stats.counters
+        failed = counters["errors"] + counters["timeouts"]
+        latency = stats.latency
+        point = {
+            "offered_tps": tps,
+            "sustained_qps": counters["success"] / stats.elapsed if stats.elapsed else 0.0,
+            "error_rate": failed / counters["sent"] if counters["sent"] else 0.0,
+            "p50_ms": latency.percentile(50) * 1000 if latency.count else None,
+            "p99_ms": latency.percentile(99) * 1000 if latency.count else None,
+            "recall": stats.recall,
+        }
+        point["slo_met"] = self._meets_slo(point)
+        self.curve.append(point)
+        logging.info("Step %d TPS: sustained %.1f QPS, p99 %s ms, error rate %.2f%% -> %s",
+                     tps, point["sustained_qps"], _format_ms(point["p99_ms"]), point["error_rate"] * 100,
+                     "OK" if point["slo_met"] else "SLO broken")
+        return point
+
+    def _meets_slo(self, point):
+        if point["p99_ms"] is None:
+            return False
+        if self.max_p99_ms is not None and point["p99_ms"] > self.max_p99_ms:
+            return False
+        if point["error_rate"] > self.max_error_rate:
+            return False
+        return point["sustained_qps"] >= point["offered_tps"] * self.min_throughput_ratio
+
+    def report_results(self):
+        logging.info("=== Saturation Search Results ===")
+        logging.info("SLO: p99 <= %s ms, error rate <= %.2f%%, sustained >= %.0f%% of offered",
+                     self.max_p99_ms, self.max_error_rate * 100, self.min_throughput_ratio * 100)
+        logging.info("Offered TPS | Sustained QPS | p50 ms | p99 ms | Error rate | SLO")
+        for point in sorted(self.curve, key=lambda p: p["offered_tps"]):
+            logging.info("%11d | %13.1f | %6s | %6s | %9.2f%% | %s",
+                         point["offered_tps"], point["sustained_qps"], _format_ms(point["p50_ms"]),
+                         _format_ms(point["p99_ms"]), point["error_rate"] * 100,
+                         "OK" if point["slo_met"] else "broken")
+        if self.best is None:
+            logging.info("No tested rate met the SLO")
+        else:
+            logging.info("Maximum sustainable rate: %d TPS (%.1f QPS sustained)",
+                         self.best["offered_tps"], self.best["sustained_qps"])
+
+    def write_csv(self, path):
+        fields = ["offered_tps", "sustained_qps", "error_rate", "p50_ms", "p99_ms", "recall", "slo_met"]
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for point in sorted(self.curve, key=lambda p: p["offered_tps"]):
+                writer.writerow(point)
+
+
+def _format_ms(value):
+    return "-" if value is None else f"{value:.2f}"
+
+
+if __name__ == '__main__':
+    import importlib
+    import inspect
+
+    AbstractLoaderTest.setup_logging()
+    module_name, class_name = os.environ.get("TESTER", "oci_postgres_load_test:OCI_Postgres_LoadTest").split(":")
+    tester_class = getattr(importlib.import_module(module_name), class_name)
+    word = os.environ.get("WORD", "サヴォワ地方はどこの国？")
+    word_arg = "query" if "query" in inspect.signature(tester_class).parameters else "word"
+    max_tps = int(os.environ.get("MAX_TPS", 1000))
+    step_duration = int(os.environ.get("STEP_DURATION", 30))
+    # connections for the concurrency expected at max_tps (EXPECTED_LATENCY_MS per search), not 2 x max_tps
+    pool_size = (int(os.environ["POOL_SIZE"]) if "POOL_SIZE" in os.environ else
+                 concurrency_for(max_tps, float(os.environ.get("EXPECTED_LATENCY_MS", 50)) / 1000))
+
+    tester = tester_class(
+        tps=max_tps,
+        duration=step_duration,
+        timeout=int(os.environ.get("TIMEOUT", 10)),
+        schedule=os.environ.get("SCHEDULE", "constant"),
+        query_file=os.environ.get("QUERY_FILE"),
+        pool_size=pool_size,
+        **{word_arg: word}
+    )
+    search = SaturationSearch(
+        tester,
+        start_tps=int(os.environ.get("START_TPS", 10)),
+        max_tps=max_tps,
+        step_tps=int(os.environ["STEP_TPS"]) if "STEP_TPS" in os.environ else None,
+        mode=os.environ.get("MODE", "step"),
+        step_duration=step_duration,
+        max_p99_ms=float(os.environ["MAX_P99_MS"]) if "MAX_P99_MS" in os.environ else None,
+        max_error_rate=float(os.environ.get("MAX_ERROR_RATE", 0.01))
+    )
+    search.run()
+    if "CURVE_CSV" in os.environ:
+        search.write_csv(os.environ["CURVE_CSV"])
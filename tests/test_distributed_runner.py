@@ -0,0 +1,22 @@
+import threading
+from distributed_runner import WorkerAgent, DistributedLoadTest
+
+
+def test_two_agents_on_loopback():
+    agents = [WorkerAgent(port=0).start_server() for _ in range(2)]
+    for agent in agents:
+        threading.Thread(target=agent.serve_forever, daemon=True).start()
+    try:
+        coordinator = DistributedLoadTest("noop_load_test:NoopLoadTest", [f"127.0.0.1:{a.port}" for a in agents],
+                                          tps=40, duration=1, timeout=5, start_delay=0.5, schedule="constant")
+        stats = coordinator.run_load()
+    finally:
+        for agent in agents:
+            agent.stop()
+
+    assert [agent.state for agent in agents] == ["idle", "idle"]
+    for counter in ("sent", "success"):
+        per_agent = [agent.stats.counters[counter] for agent in agents]
+        assert all(per_agent)
+        assert stats.counters[counter] == sum(per_agent)
+    assert stats.counters["success"] == 40
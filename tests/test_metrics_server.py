@@ -0,0 +1,66 @@
+import re
+import threading
+import time
+import urllib.request
+from metrics_server import CONTENT_TYPE, LATENCY_BUCKETS
+from noop_load_test import NoopLoadTest
+
+METADATA = re.compile(r"^# (TYPE|HELP|UNIT) ([a-zA-Z_:][a-zA-Z0-9_:]*) (.+)$")
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{([a-zA-Z_][a-zA-Z0-9_]*="[^"]*"(,[a-zA-Z_][a-zA-Z0-9_]*="[^"]*")*)\})? '
+                    r'(-?[0-9][0-9.e+-]*|\+Inf)$')
+SUFFIXES = {"counter": ("_total",), "gauge": ("",), "histogram": ("_bucket", "_count", "_sum")}
+
+
+def scrape(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+        assert response.headers["Content-Type"] == CONTENT_TYPE
+        return response.read().decode("utf-8")
+
+
+def parse(text):
+    """Checks the exposition line by line and returns {(sample name, labels): value}."""
+    assert text.endswith("# EOF\n")
+    lines = text[:-1].split("\n")
+    assert lines.count("# EOF") == 1
+    families = {}
+    samples = {}
+    for line in lines[:-1]:
+        metadata = METADATA.match(line)
+        if metadata:
+            kind, family, value = metadata.groups()
+            if kind == "TYPE":
+                assert value in SUFFIXES, line
+                families[family] = value
+            continue
+        sample = SAMPLE.match(line)
+        assert sample, f"not an OpenMetrics sample: {line!r}"
+        name, _, labels, _, value = sample.groups()
+        family = next((f for f, kind in families.items() for suffix in SUFFIXES[kind] if name == f + suffix), None)
+        assert family is not None, f"sample without a TYPE line: {line!r}"
+        samples[name, labels] = float(value)
+    return samples
+
+
+def test_scrape_during_run():
+    tester = NoopLoadTest(tps=50, duration=2, timeout=5, latency=0.02, schedule="constant", metrics_port=0)
+    port = tester.metrics_server.port
+    run = threading.Thread(target=tester.run_load)
+    try:
+        run.start()
+        time.sleep(1)
+        live = parse(scrape(port))
+        run.join(timeout=30)
+        final = parse(scrape(port))
+    finally:
+        tester.metrics_server.stop()
+
+    labels = 'backend="NoopLoadTest"'
+    assert 0 < live["vectorbench_sent_total", labels] <= final["vectorbench_sent_total", labels]
+    assert ("vectorbench_in_flight", labels) in live
+    success = final["vectorbench_operations_total", f'{labels},outcome="success"']
+    assert success == tester.stats.counters["success"] > 0
+
+    buckets = [final["vectorbench_latency_seconds_bucket", f'{labels},le="{bound}"'] for bound in LATENCY_BUCKETS]
+    assert buckets == sorted(buckets)
+    count = final["vectorbench_latency_seconds_count", labels]
+    assert final["vectorbench_latency_seconds_bucket", f'{labels},le="+Inf"'] == count == success
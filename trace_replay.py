@@ -0,0 +1,162 @@
+import gzip
+import json
+import logging
+import datetime
+from collections import namedtuple
+from query_set import EmbeddingCache, Query, text_hash
+
+TraceEvent = namedtuple("TraceEvent", ["timestamp", "text"])
+
+
+def parse_timestamp(value):
+    """Epoch seconds from a number (or numeric string) of epoch seconds or an ISO-8601 string."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+def format_timestamp(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class QueryTrace:
+    """
+    A trace of timestamped production queries, one JSON object per line with a "timestamp" (or "ts") in epoch
+    seconds or ISO-8601 and a "text" (or "query"), in time order. Plain or gzip-compressed (.gz).
+
+    The file is streamed, never held in memory: load() reads it once to embed the distinct query texts into
+    the on-disk embedding cache (only texts missing from it reach the embedding model), and every replay
+    reads it again, looking each text up in the cache's memory map.
+    """
+
+    def __init__(self, path, speedup=1.0, start=None, end=None, window=60, shard=0, shards=1):
+        """
+        :param path: Trace file (.jsonl or .jsonl.gz)
+        :param speedup: Replay speed-up factor; 1 keeps the original inter-arrival times, 10 replays ten times faster
+        :param start: Optional first timestamp to replay (epoch seconds or ISO-8601), e.g. the start of last week's peak
+        :param end: Optional timestamp at which the replay stops
+        :param window: Seconds of trace time per reporting window of the latency breakdown
+        :param shard: Share of the trace replayed by this load worker, 0 to shards - 1
+        :param shards: Number of load workers replaying the trace together; each replays the queries whose position
+                       in the trace modulo shards is its shard, on the time axis of the whole trace
+        """
+        if speedup <= 0:
+            raise ValueError(f"speedup must be positive, got {speedup}")
+        if not 0 <= shard < shards:
+            raise ValueError(f"Trace shard must be between 0 and {shards - 1}, got {shard}")
+        self.path = path
+        self.speedup = speedup
+        self.start = None if start is None else parse_timestamp(start)
+        self.end = None if end is None else parse_timestamp(end)
+        self.window = window
+        self.shard = shard
+        self.shards = shards
+        # set by prepare
+        self.cache = None
+        self.matrix = None
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.count = 0
+
+    def _open(self):
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, "rt", encoding="utf-8")
+        return open(self.path, "r", encoding="utf-8")
+
+    def events(self):
+        """Yields the TraceEvents of this shard between start and end."""
+        for position, event in enumerate(self._all_events()):
+            if position % self.shards == self.shard:
+                yield event
+
+    def _all_events(self):
+        """Yields the TraceEvents between start and end, reading the file lazily."""
+        with self._open() as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                timestamp = parse_timestamp(record["timestamp"] if "timestamp" in record else record["ts"])
+                if self.start is not None and timestamp < self.start:
+                    continue
+                if self.end is not None and timestamp >= self.end:
+                    break
+                yield TraceEvent(timestamp, record.get("text", record.get("query")))
+
+    def prepare(self, embed_batch, model_id, cache_dir=".embedding_cache", chunk_size=4096):
+        """
+        Embeds the distinct texts of the trace that the embedding cache does not hold yet, chunk_size at a time,
+        and records the time span of the trace. Only the texts of this shard are embedded, but the span is
+        the whole trace's, so that the shards of all workers replay on the same time axis.
+        """
+        self.cache = EmbeddingCache(cache_dir, model_id)
+        pending = {}
+        self.count = 0
+        self.first_timestamp = self.last_timestamp = None
+        for position, event in enumerate(self._all_events()):
+            if self.first_timestamp is None:
+                self.first_timestamp = event.timestamp
+            self.last_timestamp = event.timestamp
+            if position % self.shards != self.shard:
+                continue
+            self.count += 1
+            key = text_hash(event.text)
+            if key not in self.cache.rows and key not in pending:
+                pending[key] = event.text
+                if len(pending) >= chunk_size:
+                    self.cache.embed(list(pending.values()), embed_batch)
+                    pending = {}
+        if not self.count:
+            raise ValueError(f"No queries found in {self.path}" +
+                             (f" for shard {self.shard} of {self.shards}" if self.shards > 1 else ""))
+        if pending:
+            self.cache.embed(list(pending.values()), embed_batch)
+        self.matrix = self.cache.matrix()
+        logging.info("Trace %s%s: %d queries, %d distinct texts, from %s to %s (%.0f s, replayed in %.0f s at %gx)",
+                     self.path, f" (shard {self.shard} of {self.shards})" if self.shards > 1 else "", self.count,
+                     len(self.cache.rows), format_timestamp(self.first_timestamp),
+                     format_timestamp(self.last_timestamp), self.span, self.replay_seconds, self.speedup)
+        return self
+
+    @classmethod
+    def load(cls, path, embed_batch, model_id, cache_dir=".embedding_cache", speedup=1.0, start=None, end=None,
+             window=60, shard=0, shards=1):
+        """
+        :param embed_batch: Callable embedding a list of texts, e.g. a backend's embed_batch
+        :param model_id: Embedding model identifier used as the cache key
+        """
+        return cls(path, speedup, start, end, window, shard, shards).prepare(embed_batch, model_id, cache_dir)
+
+    @property
+    def span(self):
+        """Seconds of trace time between the first and the last replayed query."""
+        return self.last_timestamp - self.first_timestamp
+
+    @property
+    def replay_seconds(self):
+        return self.span / self.speedup
+
+    def arrivals(self):
+        """
+        Yields (offset, Query) for every query of the trace, offset being its send time in seconds from the start
+        of the replay. Query.index is the row of the text in the embedding cache, the same for repeats of a text.
+        Queries that are out of order are sent as soon as their predecessor.
+        """
+        previous = 0.0
+        for event in self.events():
+            offset = max((event.timestamp - self.first_timestamp) / self.speedup, previous)
+            previous = offset
+            row = self.cache.rows[text_hash(event.text)]
+            yield offset, Query(row, event.text, self.matrix[row])
+
+    def window_of(self, offset):
+        """Reporting window of a send offset of the replay."""
+        return int(offset * self.speedup // self.window)
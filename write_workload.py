@@ -0,0 +1,44 @@
+import uuid
+import random
+import threading
+from collections import namedtuple
+import numpy as np
+
+WriteRow = namedtuple("WriteRow", ["id", "text", "vector"])
+
+
+class SyntheticRows:
+    """
+    Generates batches of rows to insert during a mixed read/write workload.
+
+    Vectors are drawn from the query vectors with Gaussian noise added, so the inserted rows land in the
+    same regions of the index the searches visit. Ids are random positive 63-bit integers; backends whose
+    id column has a default (identity, serial, Milvus auto_id) leave them out.
+    """
+
+    def __init__(self, vectors, batch_size=100, noise=0.05, seed=None):
+        """
+        :param vectors: (n, dimension) matrix of source vectors, usually the query vectors
+        :param batch_size: Rows per write operation
+        :param noise: Standard deviation of the noise, relative to the norm of the source vector
+        """
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.batch_size = batch_size
+        self.noise = noise
+        self._rng = np.random.default_rng(seed)
+        self._random = random.Random(seed)
+        # numpy Generators are not thread-safe
+        self._lock = threading.Lock()
+
+    def next_batch(self):
+        with self._lock:
+            picks = self._rng.integers(len(self.vectors), size=self.batch_size)
+            noise = self._rng.standard_normal((self.batch_size, self.vectors.shape[1]), dtype=np.float32)
+            ids = [self._random.getrandbits(63) for _ in range(self.batch_size)]
+        source = self.vectors[picks]
+        norms = np.linalg.norm(source, axis=1, keepdims=True)
+        vectors = source + noise * (self.noise * norms / np.sqrt(source.shape[1]))
+        vectors *= norms / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        vectors = vectors.astype(np.float32)
+        tag = uuid.uuid4().hex[:8]
+        return [WriteRow(ids[i], f"vectorbench write {tag}-{i}", vectors[i]) for i in range(self.batch_size)]